@@ -0,0 +1,82 @@
+# Tiempo de importación al arrancar un worker, según `python -X importtime`.
+#
+#   python -m benchmarks.arranque
+#   python -m benchmarks.arranque --top 40
+#
+# Arranca un intérprete nuevo que carga la aplicación WSGI y las URLs (lo
+# mismo que hace gunicorn antes de servir la primera petición) y resume el
+# informe de -X importtime: tiempo total, módulos más caros y librerías
+# pesadas que se hayan colado en el arranque.
+import argparse
+import os
+import subprocess
+import sys
+
+from .comun import RAIZ
+
+# Sólo las vistas de análisis y exportación deberían cargarlas
+PESADAS = ('numpy', 'pandas', 'matplotlib', 'plotly', 'openpyxl', 'PIL')
+
+# Presupuesto del arranque. Hoy ronda la mitad: el margen es para máquinas
+# lentas, no para volver a importar librerías pesadas al cargar las URLs
+PRESUPUESTO_MS = 1500
+
+CODIGO_ARRANQUE = (
+    'from django.core.wsgi import get_wsgi_application\n'
+    'get_wsgi_application()\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+)
+
+
+def medir_arranque():
+    # Devuelve {'total_ms', 'modulos': [(modulo, acumulado_ms, propio_ms)]}
+    # con los módulos ordenados por tiempo acumulado descendente
+    entorno = dict(os.environ, DJANGO_SETTINGS_MODULE='ventas_analisis.settings', PYTHONPATH=str(RAIZ))
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODIGO_ARRANQUE],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True,
+    )
+
+    modulos = []
+    total = 0
+    for linea in proceso.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not linea.startswith('import time:') or 'imported package' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        modulo = nombre.strip()
+        # Los módulos de primer nivel no llevan sangría: su acumulado ya
+        # incluye todo lo que importaron
+        if not nombre[1:].startswith(' '):
+            total += int(acumulado)
+        modulos.append((modulo, int(acumulado) / 1000, int(propio) / 1000))
+
+    modulos.sort(key=lambda modulo: modulo[1], reverse=True)
+    return {'total_ms': round(total / 1000, 1), 'modulos': modulos}
+
+
+def pesadas_importadas(informe):
+    return sorted({
+        modulo.split('.')[0] for modulo, _, _ in informe['modulos']
+        if modulo.split('.')[0] in PESADAS
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tiempo de importación al arrancar un worker')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    informe = medir_arranque()
+    print(f'Arranque: {informe["total_ms"]} ms (presupuesto {PRESUPUESTO_MS} ms)')
+    print(f'{"módulo":<50} {"acumulado ms":>12} {"propio ms":>10}')
+    for modulo, acumulado, propio in informe['modulos'][:args.top]:
+        print(f'{modulo:<50} {acumulado:>12.1f} {propio:>10.1f}')
+    pesadas = pesadas_importadas(informe)
+    if pesadas:
+        print(f'Librerías pesadas importadas al arrancar: {", ".join(pesadas)}')
+
+
+if __name__ == '__main__':
+    main()
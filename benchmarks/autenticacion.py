@@ -0,0 +1,126 @@
+# Mide el costo de autenticarse: logins por segundo según las iteraciones
+# de PBKDF2, y peticiones autenticadas por segundo (con sus consultas) para
+# cada motor de sesión, backend y variante de JWT.
+#
+#   python -m benchmarks.autenticacion [--iteraciones 720000 260000 100000] [--peticiones 200]
+import argparse
+import json
+import time
+from unittest import mock
+
+from .comun import configurar_django, guardar_resultados
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-auth'}}
+SESIONES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+BACKENDS = {
+    'model': 'django.contrib.auth.backends.ModelBackend',
+    'cacheado': 'ventas.autenticacion.UsuarioCacheadoBackend',
+}
+
+
+def medir_logins(iteraciones, repeticiones=5):
+    # {iteraciones: logins por segundo} con authenticate(), que es lo que
+    # hace la vista de login
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+
+    resultados = {}
+    for cantidad in iteraciones:
+        with override_settings(PASSWORD_PBKDF2_ITERACIONES=cantidad):
+            usuario, _ = User.objects.get_or_create(username='bench-login')
+            usuario.set_password('clave-bench')
+            usuario.save()
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                if authenticate(username='bench-login', password='clave-bench') is None:
+                    raise RuntimeError('El login del benchmark falló')
+            segundos = time.perf_counter() - inicio
+        resultados[cantidad] = round(repeticiones / segundos, 1)
+    return resultados
+
+
+def _medir_cliente(client, peticiones, **extra):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    url = reverse('api_productos_buscar')
+    client.get(url, {'q': 'Producto'}, **extra)  # calienta cachés
+    with CaptureQueriesContext(connection) as consultas:
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            response = client.get(url, {'q': 'Producto'}, **extra)
+            if response.status_code != 200:
+                raise RuntimeError(f'La petición autenticada devolvió {response.status_code}')
+        segundos = time.perf_counter() - inicio
+    return {
+        'peticiones_por_segundo': round(peticiones / segundos, 1),
+        'consultas_por_peticion': round(len(consultas) / peticiones, 2),
+    }
+
+
+def medir_peticiones(peticiones=200):
+    # Un resultado por combinación de sesión y backend, más JWT con y sin el
+    # LRU de tokens verificados. La búsqueda de productos sale del caché,
+    # así que las consultas que quedan son las de autenticación
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from ventas import autenticacion
+    from ventas.api import ProductosBuscarAPI
+    from ventas.models import Producto
+
+    if not Producto.objects.exists():
+        Producto.objects.bulk_create(Producto(nombre=f'Producto {i:04d}', precio=10) for i in range(100))
+    usuario, _ = User.objects.get_or_create(username='bench-peticiones')
+
+    resultados = {}
+    for nombre_sesion, motor in SESIONES.items():
+        for nombre_backend, backend in BACKENDS.items():
+            with override_settings(CACHES=CACHE_LOCAL, SESSION_ENGINE=motor, AUTHENTICATION_BACKENDS=[backend]):
+                cache.clear()
+                client = Client()
+                client.force_login(usuario, backend=backend)
+                resultados[f'sesion-{nombre_sesion}-{nombre_backend}'] = _medir_cliente(client, peticiones)
+
+    cabecera = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(usuario)}'}
+    variantes = {'jwt': JWTAuthentication, 'jwt-cacheado': autenticacion.JWTCacheadoAuthentication}
+    for nombre, clase in variantes.items():
+        with override_settings(CACHES=CACHE_LOCAL), \
+                mock.patch.object(ProductosBuscarAPI, 'authentication_classes', [clase]):
+            cache.clear()
+            autenticacion.olvidar_tokens()
+            resultados[nombre] = _medir_cliente(Client(), peticiones, **cabecera)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Costo de login y de las peticiones autenticadas')
+    parser.add_argument('--iteraciones', type=int, nargs='+', default=[720_000, 260_000, 100_000])
+    parser.add_argument('--logins', type=int, default=5)
+    parser.add_argument('--peticiones', type=int, default=200)
+    parser.add_argument('--database-url')
+    args = parser.parse_args(argv)
+
+    configurar_django(args.database_url)
+    from django.db import connection
+
+    resultados = {
+        'motor': connection.vendor,
+        'logins_por_segundo': medir_logins(args.iteraciones, args.logins),
+        'peticiones': medir_peticiones(args.peticiones),
+    }
+    guardar_resultados(f'autenticacion-{connection.vendor}', resultados)
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Utilidades compartidas por los scripts de benchmark.
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+RESULTADOS_DIR = RAIZ / 'benchmarks' / 'resultados'
+
+
+def configurar_django(database_url=None):
+    # Tiene que llamarse antes de importar modelos: settings.py lee
+    # DATABASE_URL al cargarse. Sin URL se usa un SQLite temporal, para no
+    # tocar nunca la base de desarrollo.
+    if database_url is None:
+        database_url = f'sqlite:///{tempfile.mkdtemp(prefix="ventas-bench-")}/benchmark.sqlite3'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ventas_analisis.settings')
+    if str(RAIZ) not in sys.path:
+        sys.path.insert(0, str(RAIZ))
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return database_url
+
+
+def medir(funcion, repeticiones=5):
+    # Ejecuta la función varias veces y devuelve mínimo y mediana en ms
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {'min_ms': round(min(tiempos), 3), 'mediana_ms': round(statistics.median(tiempos), 3)}
+
+
+def guardar_resultados(nombre, resultados):
+    RESULTADOS_DIR.mkdir(parents=True, exist_ok=True)
+    ruta = RESULTADOS_DIR / f'{nombre}.json'
+    ruta.write_text(json.dumps(resultados, indent=2, default=str))
+    return ruta
@@ -0,0 +1,55 @@
+# Generador de datos sintéticos y reproducibles (misma semilla, mismos datos).
+#
+# Los productos salen de ProductoFactory (nombres de Faker). Las ventas se
+# generan con NumPy y se insertan con ingesta.insertar_filas: construirlas
+# una por una con VentaFactory no escala a millones de filas.
+from datetime import date, timedelta
+from decimal import Decimal
+
+ESTADOS = ['completada', 'pendiente', 'cancelada']
+FECHA_INICIAL = date(2019, 1, 1)
+DIAS = 5 * 365
+
+
+def generar_datos(num_productos, num_ventas, semilla=42, lote=50000, stdout=None):
+    import factory.random
+    import numpy as np
+    from django.db import transaction
+
+    from ventas import cache_ventas, ingesta, resumen, series
+    from ventas.models import Producto
+
+    from .fabricas import ProductoFactory
+
+    factory.random.reseed_random(semilla)
+    Producto.objects.bulk_create(ProductoFactory.build_batch(num_productos), batch_size=5000)
+    ids, precios = zip(*Producto.objects.order_by('id').values_list('id', 'precio'))
+    ids = np.array(ids, dtype=np.int64)
+    centavos = np.array([int(precio * 100) for precio in precios], dtype=np.int64)
+
+    rng = np.random.default_rng(semilla)
+    for inicio in range(0, num_ventas, lote):
+        n = min(lote, num_ventas - inicio)
+        productos = rng.integers(0, len(ids), n)
+        cantidades = rng.integers(1, 11, n)
+        dias = rng.integers(0, DIAS, n)
+        estados = rng.integers(0, len(ESTADOS), n)
+        totales = centavos[productos] * cantidades
+
+        filas = [
+            (FECHA_INICIAL + timedelta(days=dia), producto_id, ESTADOS[estado], Decimal(total).scaleb(-2), cantidad)
+            for producto_id, cantidad, dia, estado, total in zip(
+                ids[productos].tolist(), cantidades.tolist(), dias.tolist(), estados.tolist(), totales.tolist()
+            )
+        ]
+        with transaction.atomic():
+            ingesta.insertar_filas(filas)
+        if stdout:
+            stdout.write(f'\r{inicio + n} / {num_ventas} ventas')
+    if stdout:
+        stdout.write('\n')
+
+    # El INSERT masivo no dispara señales: resumen, series y caché se rehacen al final
+    resumen.reconstruir()
+    series.marcar()
+    cache_ventas.invalidar()
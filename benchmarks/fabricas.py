@@ -0,0 +1,28 @@
+# Fábricas de factory_boy para generar productos y ventas de prueba.
+from datetime import timedelta
+
+import factory
+from factory import fuzzy
+
+from ventas.models import Producto, Venta
+
+from .datos import DIAS, ESTADOS, FECHA_INICIAL
+
+
+class ProductoFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Producto
+
+    nombre = factory.Faker('catch_phrase', locale='es_ES')
+    precio = fuzzy.FuzzyDecimal(1, 1000)
+
+
+class VentaFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Venta
+
+    producto = factory.SubFactory(ProductoFactory)
+    cantidad = fuzzy.FuzzyInteger(1, 10)
+    fecha = fuzzy.FuzzyDate(FECHA_INICIAL, FECHA_INICIAL + timedelta(days=DIAS - 1))
+    estado = fuzzy.FuzzyChoice(ESTADOS)
+    total = factory.LazyAttribute(lambda venta: venta.producto.precio * venta.cantidad)
@@ -0,0 +1,58 @@
+# Mide el throughput de ventas/ingesta.py (filas por segundo).
+#
+#   python -m benchmarks.ingesta --filas 200000 [--dias 1] [--database-url postgres://...]
+import argparse
+import json
+import random
+import time
+from datetime import timedelta
+
+from .comun import configurar_django, guardar_resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Throughput de la ingesta masiva de ventas')
+    parser.add_argument('--filas', type=int, default=200_000)
+    parser.add_argument('--productos', type=int, default=1000)
+    parser.add_argument('--dias', type=int, default=1, help='Días distintos entre los que se reparten las ventas')
+    parser.add_argument('--database-url')
+    args = parser.parse_args(argv)
+
+    configurar_django(args.database_url)
+    from django.db import connection
+
+    from ventas import ingesta
+    from ventas.models import Producto
+    from .datos import FECHA_INICIAL
+
+    Producto.objects.bulk_create(Producto(nombre=f'Producto {i:06d}', precio=10) for i in range(args.productos))
+    ids = list(Producto.objects.values_list('id', flat=True))
+    rng = random.Random(42)
+    lineas = [
+        json.dumps({
+            'producto': rng.choice(ids),
+            'cantidad': rng.randint(1, 10),
+            'fecha': (FECHA_INICIAL + timedelta(days=rng.randrange(args.dias))).isoformat(),
+            'estado': 'completada',
+        })
+        for _ in range(args.filas)
+    ]
+
+    inicio = time.perf_counter()
+    reporte = ingesta.importar(ingesta.leer_jsonl(lineas))
+    segundos = time.perf_counter() - inicio
+
+    resultados = {
+        'motor': connection.vendor,
+        'filas': args.filas,
+        'dias': args.dias,
+        'creadas': reporte['creadas'],
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(reporte['creadas'] / segundos),
+    }
+    guardar_resultados(f'ingesta-{connection.vendor}', resultados)
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from ventas.models import Producto, Venta, VentaResumenDiario
+
+from .arranque import PRESUPUESTO_MS, medir_arranque, pesadas_importadas
+from .autenticacion import medir_logins, medir_peticiones
+from .datos import generar_datos
+from .vistas import medir_vistas, urls_medibles
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'}},
+    GRAFICOS_PROCESOS=0,
+)
+class HarnessVistasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_generar_datos_es_reproducible(self):
+        generar_datos(5, 200, semilla=7)
+        primera = list(Venta.objects.order_by('id').values_list('producto__nombre', 'cantidad', 'fecha', 'total'))
+        self.assertEqual(len(primera), 200)
+        self.assertTrue(VentaResumenDiario.objects.exists())
+
+        Producto.objects.all().delete()
+        generar_datos(5, 200, semilla=7)
+        segunda = list(Venta.objects.order_by('id').values_list('producto__nombre', 'cantidad', 'fecha', 'total'))
+        self.assertEqual(primera, segunda)
+
+    def test_medir_vistas(self):
+        generar_datos(5, 50)
+        usuario = User.objects.create_user(username='benchmark', is_staff=True)
+        client = Client(raise_request_exception=False)
+        client.force_login(usuario)
+
+        resultados = medir_vistas(client, repeticiones=1)
+        self.assertEqual(set(resultados), {nombre for nombre, _ in urls_medibles()})
+        self.assertEqual(resultados['lista_ventas']['status'], 200)
+        self.assertGreater(resultados['lista_ventas']['consultas'], 0)
+        self.assertIn('mediana_ms', resultados['lista_ventas']['frio'])
+
+
+class ArranqueTest(SimpleTestCase):
+    # Un worker que sólo sirve /health/ o el login no debe cargar numpy,
+    # pandas, matplotlib ni openpyxl: se importan en las vistas que los usan
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.informe = medir_arranque()
+
+    def test_sin_librerias_pesadas(self):
+        self.assertEqual(pesadas_importadas(self.informe), [])
+
+    def test_tiempo_de_arranque(self):
+        self.assertLess(self.informe['total_ms'], PRESUPUESTO_MS)
+
+
+class AutenticacionTest(TestCase):
+    def test_medir_autenticacion(self):
+        self.assertEqual(set(medir_logins([1000, 2000], repeticiones=1)), {1000, 2000})
+        resultados = medir_peticiones(peticiones=2)
+        self.assertEqual(resultados['sesion-db-model']['consultas_por_peticion'], 2)
+        self.assertEqual(resultados['sesion-cached_db-cacheado']['consultas_por_peticion'], 0)
+        self.assertEqual(resultados['jwt-cacheado']['consultas_por_peticion'], 0)
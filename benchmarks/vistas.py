@@ -0,0 +1,180 @@
+# Mide tiempo y cantidad de consultas de cada URL de ventas/urls.py sobre
+# datasets generados de distinto tamaño.
+#
+#   python -m benchmarks.vistas --tamanos 10000 1000000 10000000
+#   python -m benchmarks.vistas --tamanos 10000 --database-url postgres://...
+#   python -m benchmarks.vistas --tamanos 10000 --comparar benchmarks/resultados/anterior.json
+#
+# Para cada tamaño se usa una base SQLite temporal (o la de --database-url) y
+# se guarda benchmarks/resultados/vistas-<motor>-<tamaño>.json con el commit
+# medido, de modo que los archivos de distintos commits se pueden comparar.
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from .comun import RAIZ, configurar_django, guardar_resultados, medir
+
+# Vistas que cierran la sesión o solo aceptan POST no se miden por GET
+EXCLUIDAS = {'logout_usuario', 'token_obtain_pair', 'token_refresh', 'api_ingesta_ventas', 'api_cambiar_estado', 'api_trabajos', 'metricas', 'metricas_prometheus'}
+
+
+def urls_medibles():
+    from django.urls import reverse
+
+    from ventas import urls
+
+    for patron in urls.urlpatterns:
+        if not patron.name or patron.name in EXCLUIDAS or patron.pattern.regex.groups:
+            continue
+        yield patron.name, reverse(patron.name)
+
+
+def medir_vistas(client, repeticiones=5):
+    # Devuelve, por nombre de URL, el status, las consultas por petición y
+    # los tiempos en frío (caché vacío) y en caliente (caché lleno)
+    from django.core.cache import cache
+    from django.db import connection
+
+    resultados = {}
+    for nombre, url in urls_medibles():
+        cache.clear()
+        consultas = []
+        with connection.execute_wrapper(lambda execute, sql, *args: consultas.append(sql) or execute(sql, *args)):
+            response = client.get(url)
+            _consumir(response)
+
+        def pedir_en_frio():
+            cache.clear()
+            _consumir(client.get(url))
+
+        resultados[nombre] = {
+            'url': url,
+            'status': response.status_code,
+            'consultas': len(consultas),
+            'bytes': _tamano(response),
+            'frio': medir(pedir_en_frio, repeticiones),
+            'caliente': medir(lambda: _consumir(client.get(url)), repeticiones),
+        }
+    return resultados
+
+
+def _consumir(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def _tamano(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(resultados):
+    print(f'{resultados["motor"]}, {resultados["ventas"]} ventas, commit {resultados["commit"]}')
+    print(f'{"vista":<28} {"status":>6} {"consultas":>9} {"frío ms":>10} {"caliente ms":>12}')
+    for nombre, datos in resultados['vistas'].items():
+        print(
+            f'{nombre:<28} {datos["status"]:>6} {datos["consultas"]:>9} '
+            f'{datos["frio"]["mediana_ms"]:>10} {datos["caliente"]["mediana_ms"]:>12}'
+        )
+
+
+def comparar(actual, anterior):
+    print(f'{"vista":<28} {"consultas":>14} {"frío ms":>22} {"caliente ms":>22}')
+    for nombre, datos in actual['vistas'].items():
+        previo = anterior['vistas'].get(nombre)
+        if not previo:
+            continue
+        print(
+            f'{nombre:<28} '
+            f'{previo["consultas"]:>6} → {datos["consultas"]:<6} '
+            f'{previo["frio"]["mediana_ms"]:>9} → {datos["frio"]["mediana_ms"]:<9} '
+            f'{previo["caliente"]["mediana_ms"]:>9} → {datos["caliente"]["mediana_ms"]:<9}'
+        )
+
+
+def medir_tamano(tamano, productos, repeticiones):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+
+    from ventas.models import Venta
+
+    from .datos import generar_datos
+
+    faltantes = tamano - Venta.objects.count()
+    if faltantes > 0:
+        generar_datos(productos, faltantes, stdout=sys.stdout)
+
+    usuario, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+    # Un error en una vista queda registrado como status 500, no corta la corrida
+    client = Client(raise_request_exception=False)
+    client.force_login(usuario)
+
+    return {
+        'commit': commit_actual(),
+        'fecha': datetime.now(timezone.utc).isoformat(),
+        'motor': connection.vendor,
+        'ventas': Venta.objects.count(),
+        'repeticiones': repeticiones,
+        'vistas': medir_vistas(client, repeticiones),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tiempos y consultas por vista sobre datasets generados')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10_000])
+    parser.add_argument('--productos', type=int, default=1000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--database-url')
+    parser.add_argument('--comparar', help='Archivo JSON de una corrida anterior')
+    args = parser.parse_args(argv)
+
+    if len(args.tamanos) > 1 and args.database_url is None:
+        # Cada tamaño en su propio proceso y con su propia base temporal
+        for tamano in args.tamanos:
+            subprocess.run([sys.executable, '-m', 'benchmarks.vistas', '--tamanos', str(tamano),
+                            '--productos', str(args.productos), '--repeticiones', str(args.repeticiones)]
+                           + (['--comparar', args.comparar] if args.comparar else []),
+                           cwd=RAIZ, check=True)
+        return
+
+    # Caché y gráficos en directorios temporales para no mezclar corridas
+    os.environ.setdefault('DJANGO_CACHE_DIR', tempfile.mkdtemp(prefix='ventas-bench-cache-'))
+    os.environ.setdefault('GRAFICOS_DIR', tempfile.mkdtemp(prefix='ventas-bench-graficos-'))
+    configurar_django(args.database_url)
+    # Los errores 500 ya quedan en los resultados
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+    anterior = None
+    if args.comparar:
+        # Se lee antes de medir por si la corrida nueva lo sobrescribe
+        with open(args.comparar) as archivo:
+            anterior = json.load(archivo)
+
+    for tamano in args.tamanos:
+        resultados = medir_tamano(tamano, args.productos, args.repeticiones)
+        ruta = guardar_resultados(f'vistas-{resultados["motor"]}-{tamano}', resultados)
+        imprimir(resultados)
+        print(f'Resultados en {ruta}')
+        if anterior:
+            comparar(resultados, anterior)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+# Configuración de gunicorn para servir la aplicación por ASGI con workers
+# de uvicorn:
+#
+#   gunicorn ventas_analisis.asgi:application -c gunicorn.conf.py
+#
+# Cada worker es un event loop: las vistas async (listados, estadísticas,
+# gráficos y exportación) esperan a la base sin ocupar un hilo, y el trabajo
+# de CPU se descarga a hilos o al pool de procesos de los gráficos.
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Las exportaciones grandes pueden tardar: el timeout corta workers colgados,
+# no peticiones lentas, que en un worker async no bloquean a las demás
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers de vez en cuando acota la memoria de matplotlib y pandas
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from .periodos import etiqueta
+from .models import VentaResumenDiario
+
+CENTAVO = Decimal('0.01')
+# El 1970-01-01 (día 0 de datetime64) fue jueves
+_DESPLAZAMIENTO_LUNES = 3
+
+
+def columnas_diarias():
+    # Una sola consulta sobre el resumen diario, cargada en arrays de NumPy.
+    # Los totales se pasan a centavos enteros para sumar sin perder precisión.
+    # Con ANALITICA_FUENTE='instantaneas' se leen los archivos columnares y
+    # la base sólo se consulta si todavía no se generaron
+    if settings.ANALITICA_FUENTE == 'instantaneas':
+        from . import instantaneas
+
+        columnas = instantaneas.columnas_diarias()
+        if columnas is not None:
+            return columnas
+
+    filas = list(
+        VentaResumenDiario.objects.values('fecha')
+        .annotate(suma_total=Sum('total'), suma_ventas=Sum('num_ventas'))
+        .order_by('fecha')
+        .values_list('fecha', 'suma_total', 'suma_ventas')
+    )
+    fechas = np.array([fila[0] for fila in filas], dtype='datetime64[D]')
+    centavos = np.fromiter((int(fila[1] * 100) for fila in filas), dtype=np.int64, count=len(filas))
+    conteos = np.fromiter((fila[2] for fila in filas), dtype=np.int64, count=len(filas))
+    return fechas, centavos, conteos
+
+
+def dataframe_diario():
+    # DataFrame diario armado desde las columnas, para análisis que de verdad
+    # necesiten pandas (no pasa por una lista de diccionarios)
+    import pandas as pd
+
+    fechas, centavos, conteos = columnas_diarias()
+    return pd.DataFrame({
+        'fecha': fechas,
+        'total': centavos / 100,
+        'num_ventas': conteos,
+    })
+
+
+def _inicio_semana(fechas):
+    dias = fechas.astype(np.int64)
+    return (dias - (dias + _DESPLAZAMIENTO_LUNES) % 7).astype('datetime64[D]')
+
+
+def _inicio_trimestre(fechas):
+    meses = fechas.astype('datetime64[M]').astype(np.int64)
+    return (meses - meses % 3).astype('datetime64[M]')
+
+
+def _agrupar(granularidad, claves, centavos, conteos):
+    # Las claves vienen ordenadas, así que cada grupo es un tramo contiguo
+    # y basta con reduceat (sumas enteras, sin pasar por float)
+    if len(claves) == 0:
+        return []
+    inicios = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]])
+    sumas = np.add.reduceat(centavos, inicios)
+    cantidades = np.add.reduceat(conteos, inicios)
+
+    periodos = []
+    for inicio, suma, num_ventas in zip(claves[inicios].astype('datetime64[D]').tolist(), sumas.tolist(), cantidades.tolist()):
+        total = Decimal(suma).scaleb(-2)
+        periodos.append({
+            'periodo': inicio,
+            'etiqueta': etiqueta(granularidad, inicio),
+            'total': total,
+            'num_ventas': num_ventas,
+            'promedio': (total / num_ventas).quantize(CENTAVO) if num_ventas else Decimal('0.00'),
+        })
+    return periodos
+
+
+def resumen_periodos():
+    # Totales, cantidad de ventas y ticket promedio por semana, mes,
+    # trimestre y año, calculados con una sola ida a la base
+    fechas, centavos, conteos = columnas_diarias()
+    return {
+        'semanal': _agrupar('semana', _inicio_semana(fechas), centavos, conteos),
+        'mensual': _agrupar('mes', fechas.astype('datetime64[M]'), centavos, conteos),
+        'trimestral': _agrupar('trimestre', _inicio_trimestre(fechas), centavos, conteos),
+        'anual': _agrupar('anio', fechas.astype('datetime64[Y]'), centavos, conteos),
+    }
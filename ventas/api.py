@@ -0,0 +1,283 @@
+from django.http import FileResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import permissions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import cache_ventas, catalogo, contadores, estados, series, trabajos
+from .autenticacion import JWTCacheadoAuthentication
+from .filtros import FiltroVentas
+from .models import Trabajo, Venta
+from .paginacion import paginar_por_cursor
+
+TOP_MAXIMO = 1000
+PUNTOS_MAXIMO = 10000
+IDS_MAXIMO = 10000
+TAMANO_PAGINA = 50
+ESTADOS = {contadores.TODOS} | {estado for estado, _ in Venta.ESTADO_CHOICES}
+
+
+class DatosVentasAPI(APIView):
+    # Base de los endpoints de datos para gráficos: aceptan la sesión del
+    # navegador (las plantillas hacen fetch) o un token JWT, y devuelven
+    # JSON columnar cacheado por generación con ETag
+    authentication_classes = [SessionAuthentication, JWTCacheadoAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def responder(self, request, nombre, calcular):
+        etag = f'"{cache_ventas.generacion()}-{nombre}"'
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            return no_modificado
+
+        response = Response(cache_ventas.obtener_o_calcular(nombre, calcular))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+# Total vendido por día, semana o mes (?agrupacion=dia|semana|mes), sale
+# de las series materializadas de series.py. Con ?puntos=500 la serie se
+# reduce con LTTB a ese número de puntos
+class SerieVentasAPI(DatosVentasAPI):
+
+    def get(self, request):
+        agrupacion = request.query_params.get('agrupacion', 'dia')
+        if agrupacion not in series.AGRUPACIONES:
+            return Response({'error': f'Agrupación no válida: {agrupacion}'}, status=400)
+        puntos = request.query_params.get('puntos')
+        if puntos is not None:
+            try:
+                puntos = min(max(int(puntos), series.PUNTOS_MINIMO), PUNTOS_MAXIMO)
+            except ValueError:
+                return Response({'error': 'puntos debe ser un número entero'}, status=400)
+
+        # El ETag sigue a la revisión de las series, no a la generación del
+        # caché: editar un producto no cambia los totales
+        etag = f'"{series.revision()}-serie:{agrupacion}:{puntos}"'
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            return no_modificado
+
+        response = Response(series.serie(agrupacion, puntos))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+# Los N productos con más unidades vendidas (?n=10), opcionalmente de un
+# solo estado (?estado=completada). Lee los contadores de contadores.py
+class ProductosTopAPI(DatosVentasAPI):
+
+    def get(self, request):
+        try:
+            n = min(max(int(request.query_params.get('n', 10)), 1), TOP_MAXIMO)
+        except ValueError:
+            return Response({'error': 'n debe ser un número entero'}, status=400)
+        estado = request.query_params.get('estado', contadores.TODOS)
+        if estado not in ESTADOS:
+            return Response({'error': f'Estado no válido: {estado}'}, status=400)
+
+        def calcular():
+            filas = list(contadores.top(n, estado))
+            return {
+                'estado': estado or None,
+                'ids': [fila['producto_id'] for fila in filas],
+                'productos': [fila['producto__nombre'] for fila in filas],
+                'cantidades': [fila['unidades'] for fila in filas],
+                'ingresos': [str(fila['ingresos']) for fila in filas],
+                'ultimas_ventas': [fila['ultima_venta'] and fila['ultima_venta'].isoformat() for fila in filas],
+            }
+
+        return self.responder(request, f'api_top:{estado}:{n}', calcular)
+
+
+# Búsqueda de productos por nombre para el autocompletar (?q=, ?limite=)
+class ProductosBuscarAPI(APIView):
+    authentication_classes = [SessionAuthentication, JWTCacheadoAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limite = int(request.query_params.get('limite', catalogo.BUSQUEDA_LIMITE))
+        except ValueError:
+            return Response({'error': 'limite debe ser un número entero'}, status=400)
+        resultados = catalogo.buscar(request.query_params.get('q', ''), limite)
+        response = Response({'resultados': resultados})
+        patch_cache_control(response, private=True, max_age=60)
+        return response
+
+
+# Ventas filtradas con los mismos parámetros que /ventas_filtradas/, por
+# páginas de cursor (?despues=, ?antes=, ?ultima=1)
+class VentasFiltradasAPI(DatosVentasAPI):
+
+    def get(self, request):
+        filtro = FiltroVentas(request.query_params)
+        if not filtro.es_valido():
+            return Response({'errores': filtro.errores}, status=400)
+        despues = request.query_params.get('despues')
+        antes = request.query_params.get('antes')
+        ultima = bool(request.query_params.get('ultima'))
+
+        def calcular():
+            columnas = ('producto__nombre', 'cantidad', 'total', 'fecha', 'estado')
+            ventas = filtro.filtrar().select_related('producto').only(*columnas)
+            archivadas = filtro.filtrar_archivo()
+            if archivadas is not None:
+                archivadas = archivadas.select_related('producto').only(*columnas)
+            pagina = paginar_por_cursor(
+                ventas, despues=despues, antes=antes, ultima=ultima, por_pagina=TAMANO_PAGINA, archivo=archivadas,
+            )
+            resumen_filtro = filtro.resumen()
+            return {
+                'num_ventas': resumen_filtro['num_ventas'],
+                'total': str(resumen_filtro['total']),
+                'anterior': pagina.cursor_anterior if pagina.has_previous() else None,
+                'siguiente': pagina.cursor_siguiente if pagina.has_next() else None,
+                'resultados': [
+                    {
+                        'id': venta.pk,
+                        'producto': venta.producto.nombre,
+                        'cantidad': venta.cantidad,
+                        'total': str(venta.total),
+                        'fecha': venta.fecha.isoformat(),
+                        'estado': venta.estado,
+                    }
+                    for venta in pagina.object_list
+                ],
+            }
+
+        return self.responder(
+            request, f'filtro:{filtro.clave()}:api:{despues or ""}:{antes or ""}:{int(ultima)}', calcular
+        )
+
+
+# Alta masiva de ventas desde los puntos de venta. El cuerpo se lee como
+# stream, línea por línea: JSON lines (por defecto) o CSV con encabezado
+# (Content-Type: text/csv o ?formato=csv)
+class IngestaVentasAPI(APIView):
+    authentication_classes = [JWTCacheadoAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = []
+
+    def post(self, request):
+        # ingesta usa numpy: se importa con la primera carga, no al arrancar
+        from . import ingesta
+
+        formato = request.query_params.get('formato') or ('csv' if 'csv' in (request.content_type or '') else 'jsonl')
+        if formato not in ingesta.LECTORES:
+            return Response({'error': f'Formato no válido: {formato}'}, status=400)
+
+        lineas = request.stream or []
+        reporte = ingesta.importar(ingesta.LECTORES[formato](lineas))
+        status = 201 if reporte['creadas'] else 400
+        return Response(reporte, status=status)
+
+
+# Cambio de estado en lote. El POST {"estado": "completada", "filtros": {...},
+# "ids": [...]} acepta los mismos filtros que /ventas_filtradas/, una lista
+# de ids o ambos, y devuelve cuántas ventas cambiaron y cuántas se omitieron
+# por no admitir la transición (ver estados.py)
+class CambioEstadoVentasAPI(APIView):
+    authentication_classes = [SessionAuthentication, JWTCacheadoAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        nuevo = request.data.get('estado')
+        if nuevo not in estados.TRANSICIONES:
+            return Response({'error': f'Estado no válido: {nuevo}'}, status=400)
+        filtros = request.data.get('filtros') or {}
+        if not isinstance(filtros, dict):
+            return Response({'error': 'filtros debe ser un objeto'}, status=400)
+        ids = request.data.get('ids') or []
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response({'error': 'ids debe ser una lista de números enteros'}, status=400)
+        if len(ids) > IDS_MAXIMO:
+            return Response({'error': f'Como máximo {IDS_MAXIMO} ids por pedido'}, status=400)
+        filtro = FiltroVentas(filtros)
+        if not filtro.es_valido():
+            return Response({'errores': filtro.errores}, status=400)
+        if not filtro.valores and not ids:
+            # Sin filtros cambiaría todas las ventas: tiene que pedirse explícitamente
+            return Response({'error': 'Indicá filtros o ids'}, status=400)
+
+        ventas = filtro.filtrar()
+        if ids:
+            ventas = ventas.filter(pk__in=ids)
+        return Response(estados.cambiar_estado(ventas, nuevo))
+
+
+def _trabajo_como_dict(request, trabajo):
+    datos = {
+        'id': str(trabajo.pk),
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'creado': trabajo.creado.isoformat(),
+        'terminado': trabajo.terminado.isoformat() if trabajo.terminado else None,
+        'expira': trabajo.expira.isoformat() if trabajo.expira else None,
+        'url': request.build_absolute_uri(reverse('api_trabajo', args=[trabajo.pk])),
+        'descarga': None,
+        'error': trabajo.error or None,
+    }
+    if trabajo.estado == 'completado':
+        datos['descarga'] = request.build_absolute_uri(reverse('api_trabajo_descarga', args=[trabajo.pk]))
+    return datos
+
+
+# Exportaciones e informes en segundo plano (ver trabajos.py). El POST
+# {"tipo": "excel" | "csv" | "grafico", "filtros": {...}} acepta los mismos
+# filtros que /ventas_filtradas/ y responde enseguida con el id del trabajo;
+# un pedido idéntico en curso o ya generado devuelve ese mismo trabajo
+class TrabajosAPI(APIView):
+    authentication_classes = [SessionAuthentication, JWTCacheadoAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        tipo = request.data.get('tipo')
+        if tipo not in trabajos.GENERADORES:
+            return Response({'error': f'Tipo no válido: {tipo}'}, status=400)
+        filtros = request.data.get('filtros') or {}
+        if not isinstance(filtros, dict):
+            return Response({'error': 'filtros debe ser un objeto'}, status=400)
+        filtro = FiltroVentas(filtros)
+        if not filtro.es_valido():
+            return Response({'errores': filtro.errores}, status=400)
+
+        trabajo, _ = trabajos.encolar(tipo, filtro, request.user)
+        datos = _trabajo_como_dict(request, trabajo)
+        status = 200 if trabajo.estado == 'completado' else 202
+        return Response(datos, status=status, headers={'Location': datos['url']})
+
+
+class TrabajoAPI(APIView):
+    authentication_classes = [SessionAuthentication, JWTCacheadoAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        trabajo = Trabajo.objects.filter(pk=pk).first()
+        if trabajo is None:
+            return Response({'error': 'Trabajo inexistente o vencido'}, status=404)
+        return Response(_trabajo_como_dict(request, trabajo))
+
+
+class DescargaTrabajoAPI(APIView):
+    authentication_classes = [SessionAuthentication, JWTCacheadoAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        trabajo = Trabajo.objects.filter(pk=pk).first()
+        if trabajo is None:
+            return Response({'error': 'Trabajo inexistente o vencido'}, status=404)
+        if trabajo.estado != 'completado':
+            return Response({'error': 'El trabajo todavía no terminó', 'estado': trabajo.estado}, status=409)
+        ruta = trabajos.ruta_archivo(trabajo)
+        if not ruta.exists():
+            return Response({'error': 'El archivo ya no está disponible'}, status=404)
+        nombre = f'ventas.{trabajos.EXTENSIONES[trabajo.tipo]}'
+        return FileResponse(
+            open(ruta, 'rb'), as_attachment=trabajo.tipo != 'grafico', filename=nombre,
+            content_type=trabajos.CONTENT_TYPES[trabajo.tipo],
+        )
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class VentasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ventas'
+
+    def ready(self):
+        # Registra los receptores del resumen diario y del caché
+        from . import signals  # noqa: F401
+
+        # El wrapper de consultas de la instrumentación se instala en cada
+        # conexión que se abra, en cualquier hilo (ver middleware.py)
+        from .middleware import instrumentar_consultas
+        instrumentar_consultas()
@@ -0,0 +1,103 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Q
+
+from . import cache_ventas
+from .models import MovimientoStock, Venta, VentaArchivada
+from .replicas import en_primaria
+
+# Retención de ventas: las anteriores al horizonte se mueven de Venta a
+# VentaArchivada, así la tabla caliente (y sus índices) sólo crece con los
+# meses recientes. Cada lote es un INSERT ... SELECT y un DELETE por rango
+# de (fecha, id) en su propia transacción; se borra sólo lo que ya quedó
+# copiado. Al ser SQL directo no pasa por las señales: el resumen diario, los
+# contadores y las series siguen contando las ventas archivadas tal cual,
+# y FiltroVentas las vuelve a sumar cuando el rango de fechas llega hasta ellas.
+TAMANO_LOTE = 5000
+COLUMNAS = 'id, producto_id, cantidad, fecha, total, estado'
+FECHA_MAXIMA_CLAVE = 'archivo:fecha_maxima'
+# Acota cuánto dura un valor desfasado si el archivo cambia por otro camino
+# que archivar() o el borrado de un producto (admin, SQL a mano)
+FECHA_MAXIMA_TIMEOUT = 60 * 15
+
+
+def horizonte(meses=None, hoy=None):
+    # Primer día del mes `meses` meses antes del actual: se archiva lo anterior
+    meses = settings.ARCHIVO_HORIZONTE_MESES if meses is None else meses
+    hoy = hoy or date.today()
+    indice = hoy.year * 12 + hoy.month - 1 - meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _calcular_fecha_maxima():
+    with en_primaria():
+        fecha = VentaArchivada.objects.aggregate(fecha=Max('fecha'))['fecha']
+    # '' con el archivo vacío, para que también quede en el caché
+    valor = fecha.isoformat() if fecha else ''
+    cache.set(FECHA_MAXIMA_CLAVE, valor, FECHA_MAXIMA_TIMEOUT)
+    return valor
+
+
+def fecha_maxima():
+    # La venta archivada más reciente, o None con el archivo vacío. Se
+    # recalcula al archivar y al borrar un producto (ver signals.py)
+    valor = cache.get(FECHA_MAXIMA_CLAVE)
+    if valor is None:
+        valor = _calcular_fecha_maxima()
+    return date.fromisoformat(valor) if valor else None
+
+
+def invalidar_fecha_maxima():
+    cache.delete(FECHA_MAXIMA_CLAVE)
+
+
+def _lote(corte, tamano_lote):
+    # Archiva las `tamano_lote` ventas más viejas anteriores a `corte`.
+    # Devuelve cuántas movió
+    venta = connection.ops.quote_name(Venta._meta.db_table)
+    archivada = connection.ops.quote_name(VentaArchivada._meta.db_table)
+    with transaction.atomic():
+        filas = list(
+            Venta.objects.filter(fecha__lt=corte).order_by('fecha', 'id').select_for_update()
+            .values_list('fecha', 'id')[:tamano_lote]
+        )
+        if not filas:
+            return 0
+        ultima_fecha, ultimo_id = filas[-1]
+        rango = 'fecha < %s AND (fecha < %s OR (fecha = %s AND id <= %s))'
+        parametros = [corte, ultima_fecha, ultima_fecha, ultimo_id]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {archivada} ({COLUMNAS}) SELECT {COLUMNAS} FROM {venta} WHERE {rango}', parametros
+            )
+            movidas = cursor.rowcount
+        # Los movimientos de stock pierden el vínculo, como con on_delete=SET_NULL
+        en_rango = Venta.objects.filter(
+            Q(fecha__lt=ultima_fecha) | Q(fecha=ultima_fecha, id__lte=ultimo_id), fecha__lt=corte
+        )
+        MovimientoStock.objects.filter(venta_id__in=en_rango.values('id')).update(venta=None)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {venta} WHERE {rango} '
+                f'AND EXISTS (SELECT 1 FROM {archivada} a WHERE a.id = {venta}.id)',
+                parametros,
+            )
+    return movidas
+
+
+def archivar(antes_de=None, tamano_lote=TAMANO_LOTE):
+    # Mueve al archivo las ventas con fecha anterior a `antes_de` (por
+    # defecto, horizonte()). Devuelve {'antes_de', 'archivadas'}
+    corte = antes_de or horizonte()
+    archivadas = 0
+    while movidas := _lote(corte, tamano_lote):
+        archivadas += movidas
+    if archivadas:
+        _calcular_fecha_maxima()
+        # Las páginas y resúmenes cacheados se armaron con las ventas en la
+        # tabla caliente; los totales no cambian, así que las series no se tocan
+        cache_ventas.invalidar()
+    return {'antes_de': corte, 'archivadas': archivadas}
@@ -0,0 +1,38 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+
+# Utilidades para las vistas async. Con ASGI (gunicorn + uvicorn, ver
+# gunicorn.conf.py) corren en el event loop; con WSGI Django las ejecuta
+# igual, envueltas en async_to_sync.
+#
+# Regla para descargar trabajo: el ORM siempre por el ORM async o por
+# sync_to_async con thread_sensitive=True (el hilo que tiene la conexión);
+# en_hilo() (thread_sensitive=False) sólo para trabajo de CPU que no toca la
+# base, como dibujar un gráfico o armar un Excel, para que no bloquee ni el
+# event loop ni el hilo compartido de las vistas síncronas.
+
+
+def login_requerido(vista):
+    # login_required de Django 5.0 no sabe envolver vistas async
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        usuario = await request.auser()
+        if not usuario.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # Ya resuelto: así request.user no consulta la base desde el event loop
+        request.user = usuario
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+def en_hilo(funcion):
+    return sync_to_async(funcion, thread_sensitive=False)
+
+
+def es_asgi(request):
+    # Las respuestas en streaming tienen que usar iteradores async con ASGI
+    # y síncronos con WSGI: si no, Django consume el iterador entero en memoria
+    return isinstance(request, ASGIRequest)
@@ -0,0 +1,129 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Camino de autenticación sin consultas en cada petición: el usuario de la
+# sesión o del JWT se guarda en memoria de cada proceso y los JWT ya
+# verificados también. En el caché compartido sólo queda, por usuario, una
+# versión al azar: nunca el usuario ni el hash de su contraseña. Los cambios
+# de usuario (contraseña, is_active) borran la versión desde signals.py y
+# todos los procesos lo vuelven a leer en la petición siguiente.
+USUARIO_TIMEOUT = 60 * 15
+USUARIOS_MAXIMO = 1024
+
+_tokens = OrderedDict()
+_candado_tokens = threading.Lock()
+_usuarios = OrderedDict()
+_candado_usuarios = threading.Lock()
+
+
+def _clave_usuario(pk):
+    return f'auth:usuario:{pk}'
+
+
+def usuario_cacheado(pk):
+    # El usuario con ese pk (activo o no) o None si no existe. Se devuelve
+    # una copia: cada petición puede modificar su request.user
+    clave = _clave_usuario(pk)
+    version = cache.get(clave)
+    with _candado_usuarios:
+        entrada = _usuarios.get(pk)
+        if entrada is not None:
+            _usuarios.move_to_end(pk)
+    if version is not None and entrada is not None and entrada[0] == version:
+        return copy.copy(entrada[1])
+
+    if version is None:
+        # La versión se crea antes de leer: una invalidación que llegue
+        # después de la lectura la borra y el próximo pedido vuelve a leer
+        cache.add(clave, uuid.uuid4().hex, USUARIO_TIMEOUT)
+        version = cache.get(clave)
+    usuario = get_user_model()._default_manager.filter(pk=pk).first()
+    if usuario is None:
+        return None
+    with _candado_usuarios:
+        _usuarios[pk] = (version, usuario)
+        while len(_usuarios) > USUARIOS_MAXIMO:
+            _usuarios.popitem(last=False)
+    return copy.copy(usuario)
+
+
+def invalidar_usuario(pk):
+    cache.delete(_clave_usuario(pk))
+    with _candado_usuarios:
+        _usuarios.pop(pk, None)
+
+
+class UsuarioCacheadoBackend(ModelBackend):
+    # Como ModelBackend, pero get_user, que Django llama en cada petición
+    # con sesión, lee el usuario del caché en vez de consultar auth_user
+    def get_user(self, user_id):
+        usuario = usuario_cacheado(user_id)
+        return usuario if self.user_can_authenticate(usuario) else None
+
+
+class PBKDF2AjustableHasher(PBKDF2PasswordHasher):
+    # El mismo pbkdf2_sha256 de Django con las iteraciones de
+    # PASSWORD_PBKDF2_ITERACIONES. Los hashes guardados con otro número se
+    # siguen verificando y se recalculan en el siguiente login
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERACIONES
+
+
+def olvidar_tokens():
+    with _candado_tokens:
+        _tokens.clear()
+
+
+class JWTCacheadoAuthentication(JWTAuthentication):
+    # JWT para la API: los tokens ya verificados se guardan en un LRU en
+    # memoria del proceso hasta su vencimiento (no se vuelve a decodificar
+    # ni a verificar la firma) y el usuario sale de usuario_cacheado()
+
+    def get_validated_token(self, raw_token):
+        ahora = time.time()
+        with _candado_tokens:
+            entrada = _tokens.get(raw_token)
+            if entrada is not None:
+                _tokens.move_to_end(raw_token)
+        if entrada is not None and entrada[1] > ahora:
+            return entrada[0]
+
+        token = super().get_validated_token(raw_token)
+        with _candado_tokens:
+            _tokens[raw_token] = (token, token.get('exp', ahora))
+            while len(_tokens) > settings.JWT_LRU_TAMANO:
+                _tokens.popitem(last=False)
+        return token
+
+    def get_user(self, validated_token):
+        # Mismas comprobaciones que JWTAuthentication.get_user, sin la consulta
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no identifica a ningún usuario')
+
+        usuario = usuario_cacheado(user_id)
+        if usuario is None:
+            raise AuthenticationFailed('Usuario inexistente', code='user_not_found')
+        if not usuario.is_active:
+            raise AuthenticationFailed('Usuario inactivo', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(usuario.password):
+            raise AuthenticationFailed('La contraseña del usuario cambió', code='password_changed')
+        return usuario
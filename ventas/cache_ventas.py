@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metricas
+from .replicas import en_primaria
+
+# Clave del número de generación. Toda entrada cacheada que dependa de
+# ventas o productos incluye la generación en su clave, de modo que al
+# incrementarla (ver ventas/signals.py) las entradas viejas quedan huérfanas
+# y expiran solas.
+GENERACION_CLAVE = 'ventas:generacion'
+
+
+def generacion():
+    valor = cache.get(GENERACION_CLAVE)
+    if valor is None:
+        # Se parte de la hora actual para no reutilizar generaciones de
+        # entradas que sigan vivas si la clave fue desalojada del caché
+        cache.add(GENERACION_CLAVE, int(time.time() * 1000), timeout=None)
+        valor = cache.get(GENERACION_CLAVE)
+    return valor
+
+
+def invalidar():
+    if settings.CACHE_INCR_ATOMICO:
+        try:
+            cache.incr(GENERACION_CLAVE)
+            return
+        except ValueError:
+            pass
+    # Sin INCR atómico, dos invalidaciones simultáneas podrían dejar un solo
+    # incremento; con el reloj cada una escribe un valor distinto
+    anterior = cache.get(GENERACION_CLAVE) or 0
+    cache.set(GENERACION_CLAVE, max(time.time_ns() // 1000, anterior + 1), timeout=None)
+
+
+def clave(*partes):
+    return ':'.join(['ventas', str(generacion())] + [str(parte) for parte in partes])
+
+
+def obtener_o_calcular(nombre, calcular, timeout=None):
+    # Devuelve el resultado cacheado para la generación actual o lo calcula.
+    # Al estar en el caché compartido, todos los workers reutilizan el mismo
+    clave_resultado = clave(nombre)
+    resultado = cache.get(clave_resultado)
+    metricas.contar_cache(resultado is not None)
+    if resultado is None:
+        with en_primaria():
+            resultado = calcular()
+        cache.set(clave_resultado, resultado, timeout or settings.CACHE_ANALITICA_TIMEOUT)
+    return resultado
+
+
+# Versiones async para las vistas que corren en el event loop (ver
+# asincrono.py). calcular es una corrutina.
+
+async def ageneracion():
+    valor = await cache.aget(GENERACION_CLAVE)
+    if valor is None:
+        await cache.aadd(GENERACION_CLAVE, int(time.time() * 1000), timeout=None)
+        valor = await cache.aget(GENERACION_CLAVE)
+    return valor
+
+
+async def aclave(*partes):
+    return ':'.join(['ventas', str(await ageneracion())] + [str(parte) for parte in partes])
+
+
+async def aobtener_o_calcular(nombre, calcular, timeout=None):
+    clave_resultado = await aclave(nombre)
+    resultado = await cache.aget(clave_resultado)
+    metricas.contar_cache(resultado is not None)
+    if resultado is None:
+        with en_primaria():
+            resultado = await calcular()
+        await cache.aset(clave_resultado, resultado, timeout or settings.CACHE_ANALITICA_TIMEOUT)
+    return resultado
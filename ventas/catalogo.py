@@ -0,0 +1,121 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metricas
+from .replicas import en_primaria
+from .models import Producto
+
+# Catálogo de productos cacheado con su propia versión. A diferencia de la
+# generación de cache_ventas, sólo la cambian las altas, ediciones y bajas
+# de productos (ver signals.py): registrar ventas no lo invalida.
+VERSION_CLAVE = 'catalogo:version'
+CATALOGO_TIMEOUT = 60 * 60
+BUSQUEDA_LIMITE = 20
+BUSQUEDA_MAXIMO = 50
+
+
+def version():
+    valor = cache.get(VERSION_CLAVE)
+    if valor is None:
+        cache.add(VERSION_CLAVE, int(time.time() * 1000), timeout=None)
+        valor = cache.get(VERSION_CLAVE)
+    return valor
+
+
+def invalidar():
+    if settings.CACHE_INCR_ATOMICO:
+        try:
+            cache.incr(VERSION_CLAVE)
+            return
+        except ValueError:
+            pass
+    # Sin INCR atómico, dos invalidaciones simultáneas podrían dejar un solo
+    # incremento; con el reloj cada una escribe un valor distinto
+    anterior = cache.get(VERSION_CLAVE) or 0
+    cache.set(VERSION_CLAVE, max(time.time_ns() // 1000, anterior + 1), timeout=None)
+
+
+def clave(*partes):
+    return ':'.join(['catalogo', str(version())] + [str(parte) for parte in partes])
+
+
+def obtener_o_calcular(nombre, calcular, timeout=None):
+    clave_resultado = clave(nombre)
+    resultado = cache.get(clave_resultado)
+    metricas.contar_cache(resultado is not None)
+    if resultado is None:
+        with en_primaria():
+            resultado = calcular()
+        cache.set(clave_resultado, resultado, timeout or CATALOGO_TIMEOUT)
+    return resultado
+
+
+async def aversion():
+    valor = await cache.aget(VERSION_CLAVE)
+    if valor is None:
+        await cache.aadd(VERSION_CLAVE, int(time.time() * 1000), timeout=None)
+        valor = await cache.aget(VERSION_CLAVE)
+    return valor
+
+
+async def aobtener_o_calcular(nombre, calcular, timeout=None):
+    clave_resultado = f'catalogo:{await aversion()}:{nombre}'
+    resultado = await cache.aget(clave_resultado)
+    metricas.contar_cache(resultado is not None)
+    if resultado is None:
+        with en_primaria():
+            resultado = await calcular()
+        await cache.aset(clave_resultado, resultado, timeout or CATALOGO_TIMEOUT)
+    return resultado
+
+
+def _como_dict(producto):
+    return {'id': producto['id'], 'nombre': producto['nombre'], 'precio': str(producto['precio'])}
+
+
+def productos(ids):
+    # {id: {'id', 'nombre', 'precio'}} desde el caché por producto; los que
+    # falten se leen juntos en una consulta
+    ids = {int(pk) for pk in ids if str(pk).isdigit()}
+    if not ids:
+        return {}
+    claves = {clave('producto', pk): pk for pk in ids}
+    resultado = {claves[k]: datos for k, datos in cache.get_many(list(claves)).items()}
+    faltan = ids - set(resultado)
+    metricas.contar_cache(not faltan)
+    if faltan:
+        with en_primaria():
+            nuevos = {
+                fila['id']: _como_dict(fila)
+                for fila in Producto.objects.filter(pk__in=faltan).values('id', 'nombre', 'precio')
+            }
+        cache.set_many({clave('producto', pk): datos for pk, datos in nuevos.items()}, CATALOGO_TIMEOUT)
+        resultado.update(nuevos)
+    return resultado
+
+
+def buscar(texto, limite=BUSQUEDA_LIMITE):
+    # Productos cuyo nombre empieza con el texto y, si no alcanzan, los que
+    # lo contienen. El prefijo usa los índices de la migración 0006
+    texto = ' '.join(texto.split())
+    if not texto:
+        return []
+    limite = min(max(limite, 1), BUSQUEDA_MAXIMO)
+
+    def calcular():
+        columnas = ('id', 'nombre', 'precio')
+        encontrados = list(
+            Producto.objects.filter(nombre__istartswith=texto).order_by('nombre', 'id').values(*columnas)[:limite]
+        )
+        if len(encontrados) < limite:
+            encontrados += Producto.objects.filter(nombre__icontains=texto).exclude(
+                pk__in=[fila['id'] for fila in encontrados]
+            ).order_by('nombre', 'id').values(*columnas)[:limite - len(encontrados)]
+        return [_como_dict(fila) for fila in encontrados]
+
+    # El texto va hasheado: las claves de memcached no admiten espacios
+    huella = hashlib.sha1(texto.lower().encode()).hexdigest()
+    return obtener_o_calcular(f'buscar:{limite}:{huella}', calcular)
@@ -0,0 +1,23 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from . import tiempo_real
+
+
+class TableroVentasConsumer(AsyncJsonWebsocketConsumer):
+    # WebSocket de los tableros: recibe los deltas de tiempo_real.py y los
+    # reenvía tal cual. Nada se calcula por cliente, así que el costo por
+    # venta no depende de cuántos tableros estén abiertos
+
+    async def connect(self):
+        usuario = self.scope.get('user')
+        if usuario is None or not usuario.is_authenticated:
+            await self.close()
+            return
+        await self.channel_layer.group_add(tiempo_real.GRUPO, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(tiempo_real.GRUPO, self.channel_name)
+
+    async def ventas_delta(self, event):
+        await self.send_json({'deltas': event['deltas']})
@@ -0,0 +1,183 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import ContadorProducto, Venta, VentaArchivada
+
+TODOS = ContadorProducto.TODOS
+TAMANO_LOTE = 2000
+# Motores con INSERT ... ON CONFLICT DO UPDATE (igual que resumen.py)
+UPSERT_VENDORS = {'sqlite', 'postgresql'}
+
+
+def _aplicar_fila(producto_id, estado, total, cantidad, num_ventas, fecha):
+    campos = {
+        'unidades': F('unidades') + cantidad,
+        'ingresos': F('ingresos') + total,
+        'num_ventas': F('num_ventas') + num_ventas,
+    }
+    if fecha is not None and num_ventas > 0:
+        campos['ultima_venta'] = Greatest(Coalesce(F('ultima_venta'), Value(fecha)), Value(fecha))
+    filas = ContadorProducto.objects.filter(producto_id=producto_id, estado=estado)
+    if filas.update(**campos) or num_ventas <= 0:
+        return
+
+    try:
+        with transaction.atomic():
+            ContadorProducto.objects.create(
+                producto_id=producto_id, estado=estado, unidades=cantidad,
+                ingresos=total, num_ventas=num_ventas, ultima_venta=fecha,
+            )
+    except IntegrityError:
+        # Otra escritura creó la fila en paralelo: se vuelve a sumar sobre ella
+        filas.update(**campos)
+
+
+def aplicar_delta(fecha, producto_id, estado, total, cantidad, num_ventas):
+    # Misma firma que resumen.aplicar_delta: suma (o resta) sobre el
+    # contador del estado y sobre el de TODOS
+    total = Decimal(str(total))
+    for estado_fila in (estado, TODOS):
+        _aplicar_fila(producto_id, estado_fila, total, cantidad, num_ventas, fecha)
+
+
+def registrar_filas(filas, signo=1):
+    # Camino masivo con tuplas (fecha, producto_id, estado, total, cantidad),
+    # agrupadas por producto y estado en un único upsert
+    deltas = defaultdict(lambda: [Decimal('0'), 0, 0, None])
+    for fecha, producto_id, estado, total, cantidad in filas:
+        total = total if isinstance(total, Decimal) else Decimal(str(total))
+        for estado_fila in (estado, TODOS):
+            delta = deltas[(producto_id, estado_fila)]
+            delta[0] += total
+            delta[1] += cantidad
+            delta[2] += 1
+            delta[3] = fecha if delta[3] is None else max(delta[3], fecha)
+
+    filas = [
+        (producto_id, estado, signo * total, signo * cantidad, signo * num_ventas, fecha)
+        for (producto_id, estado), (total, cantidad, num_ventas, fecha) in deltas.items()
+    ]
+    if signo > 0 and connection.vendor in UPSERT_VENDORS:
+        _upsert(filas)
+    else:
+        for fila in filas:
+            _aplicar_fila(*fila)
+
+
+def cambiar_estado(filas, nuevo):
+    # Las ventas pasaron al estado `nuevo`: se mueven del contador de su
+    # estado anterior al del nuevo. El de TODOS no cambia
+    restas = defaultdict(lambda: [Decimal('0'), 0, 0])
+    sumas = defaultdict(lambda: [Decimal('0'), 0, 0, None])
+    for fecha, producto_id, estado, total, cantidad in filas:
+        total = total if isinstance(total, Decimal) else Decimal(str(total))
+        for delta in (restas[(producto_id, estado)], sumas[producto_id]):
+            delta[0] += total
+            delta[1] += cantidad
+            delta[2] += 1
+        suma = sumas[producto_id]
+        suma[3] = fecha if suma[3] is None else max(suma[3], fecha)
+
+    nuevas = [
+        (producto_id, nuevo, total, cantidad, num_ventas, fecha)
+        for producto_id, (total, cantidad, num_ventas, fecha) in sumas.items()
+    ]
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert(nuevas)
+    else:
+        for fila in nuevas:
+            _aplicar_fila(*fila)
+    for (producto_id, estado), (total, cantidad, num_ventas) in restas.items():
+        _aplicar_fila(producto_id, estado, -total, -cantidad, -num_ventas, None)
+
+
+def _upsert(filas):
+    tabla = connection.ops.quote_name(ContadorProducto._meta.db_table)
+    mayor = 'MAX' if connection.vendor == 'sqlite' else 'GREATEST'
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabla} (producto_id, estado, ingresos, unidades, num_ventas, ultima_venta) '
+            'VALUES (%s, %s, %s, %s, %s, %s) '
+            'ON CONFLICT (producto_id, estado) DO UPDATE SET '
+            f'ingresos = {tabla}.ingresos + EXCLUDED.ingresos, '
+            f'unidades = {tabla}.unidades + EXCLUDED.unidades, '
+            f'num_ventas = {tabla}.num_ventas + EXCLUDED.num_ventas, '
+            f'ultima_venta = {mayor}(COALESCE({tabla}.ultima_venta, EXCLUDED.ultima_venta), EXCLUDED.ultima_venta)',
+            filas,
+        )
+
+
+def _esperados():
+    # {(producto_id, estado): (unidades, ingresos, num_ventas, ultima_venta)}
+    # recalculado desde la tabla de ventas y el archivo, incluida la fila de TODOS
+    esperados = {}
+    agregados = {'unidades': Sum('cantidad'), 'ingresos': Sum('total'), 'num_ventas': Count('id'), 'ultima': Max('fecha')}
+    for modelo in (Venta, VentaArchivada):
+        por_estado = modelo.objects.values('producto_id', 'estado').annotate(**agregados).order_by()
+        por_producto = modelo.objects.values('producto_id').annotate(**agregados).order_by()
+        for filas, con_estado in ((por_estado, True), (por_producto, False)):
+            for fila in filas.iterator(chunk_size=TAMANO_LOTE):
+                clave = (fila['producto_id'], fila['estado'] if con_estado else TODOS)
+                valores = (fila['unidades'], fila['ingresos'], fila['num_ventas'], fila['ultima'])
+                previos = esperados.get(clave)
+                if previos is not None:
+                    # Ya contado en la otra tabla: se suma y se queda la fecha mayor
+                    valores = (
+                        previos[0] + valores[0], previos[1] + valores[1],
+                        previos[2] + valores[2], max(previos[3], valores[3]),
+                    )
+                esperados[clave] = valores
+    return esperados
+
+
+@transaction.atomic
+def reconciliar():
+    # Compara los contadores con las ventas y corrige sólo lo que difiere.
+    # Devuelve {'creados', 'corregidos', 'borrados'}
+    esperados = _esperados()
+    actuales = {
+        (contador.producto_id, contador.estado): contador
+        for contador in ContadorProducto.objects.select_for_update().iterator(chunk_size=TAMANO_LOTE)
+    }
+
+    corregidos = []
+    for clave, contador in actuales.items():
+        valores = esperados.get(clave)
+        if valores is None:
+            continue
+        if (contador.unidades, contador.ingresos, contador.num_ventas, contador.ultima_venta) != valores:
+            contador.unidades, contador.ingresos, contador.num_ventas, contador.ultima_venta = valores
+            corregidos.append(contador)
+    ContadorProducto.objects.bulk_update(
+        corregidos, ['unidades', 'ingresos', 'num_ventas', 'ultima_venta'], batch_size=TAMANO_LOTE
+    )
+
+    nuevos = ContadorProducto.objects.bulk_create(
+        [
+            ContadorProducto(
+                producto_id=producto_id, estado=estado, unidades=unidades,
+                ingresos=ingresos, num_ventas=num_ventas, ultima_venta=ultima,
+            )
+            for (producto_id, estado), (unidades, ingresos, num_ventas, ultima) in esperados.items()
+            if (producto_id, estado) not in actuales
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+    sobrantes = [contador.pk for clave, contador in actuales.items() if clave not in esperados]
+    for inicio in range(0, len(sobrantes), TAMANO_LOTE):
+        ContadorProducto.objects.filter(pk__in=sobrantes[inicio:inicio + TAMANO_LOTE]).delete()
+    return {'creados': len(nuevos), 'corregidos': len(corregidos), 'borrados': len(sobrantes)}
+
+
+def top(n, estado=TODOS):
+    # Los n productos con más unidades: ORDER BY ... LIMIT sobre contador_ranking_idx
+    return (
+        ContadorProducto.objects.filter(estado=estado, unidades__gt=0)
+        .order_by('-unidades', 'producto_id')
+        .values('producto_id', 'producto__nombre', 'unidades', 'ingresos', 'num_ventas', 'ultima_venta')[:n]
+    )
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import Count
+
+from . import cache_ventas, contadores, inventario, resumen
+from .models import Venta
+
+# Cambios de estado en lote (el cierre del día pasa miles de ventas de
+# pendiente a completada). Sólo se aplican las transiciones permitidas; las
+# ventas en otro estado se informan como omitidas. Cada lote es un UPDATE
+# sobre ids ya bloqueados, y el resumen diario y los contadores se mueven
+# del estado anterior al nuevo con deltas, sin reconstruirlos. Cancelar
+# devuelve las unidades al stock (ver inventario.devolver_lote). Los totales
+# por día no cambian, así que las series de los gráficos no se tocan.
+TRANSICIONES = {
+    'pendiente': {'completada', 'cancelada'},
+    'completada': {'cancelada'},
+    'cancelada': set(),
+}
+TAMANO_LOTE = 1000
+
+
+def origenes(nuevo):
+    # Estados desde los que se puede pasar a `nuevo`
+    return {estado for estado, destinos in TRANSICIONES.items() if nuevo in destinos}
+
+
+def _lote(candidatas, ultimo, tamano_lote, nuevo):
+    # Un lote en su propia transacción. Devuelve (último id, {origen: n})
+    with transaction.atomic():
+        filas = list(
+            candidatas.filter(id__gt=ultimo).order_by('id').select_for_update()
+            .values_list('id', 'fecha', 'producto_id', 'estado', 'total', 'cantidad')[:tamano_lote]
+        )
+        if not filas:
+            return None, {}
+        ids = [fila[0] for fila in filas]
+        Venta.objects.filter(id__in=ids).update(estado=nuevo)
+        movidas = [fila[1:] for fila in filas]
+        resumen.cambiar_estado(movidas, nuevo)
+        contadores.cambiar_estado(movidas, nuevo)
+        if nuevo == 'cancelada':
+            # Las unidades vuelven al stock en la misma transacción
+            inventario.devolver_lote([(fila[0], fila[2], fila[5]) for fila in filas])
+
+    por_origen = {}
+    for fila in filas:
+        por_origen[fila[3]] = por_origen.get(fila[3], 0) + 1
+    return ids[-1], por_origen
+
+
+def cambiar_estado(ventas, nuevo, tamano_lote=TAMANO_LOTE):
+    # Pasa a `nuevo` las ventas del queryset que lo permitan. Devuelve
+    # {'estado', 'actualizadas', 'por_origen', 'omitidas'}, con las omitidas
+    # contadas por su estado actual
+    if nuevo not in TRANSICIONES:
+        raise ValueError(f'Estado no válido: {nuevo}')
+    permitidos = origenes(nuevo)
+    omitidas = dict(
+        ventas.exclude(estado__in=permitidos).order_by().values_list('estado').annotate(n=Count('id'))
+    )
+
+    candidatas = ventas.filter(estado__in=permitidos)
+    por_origen = dict.fromkeys(sorted(permitidos), 0)
+    ultimo = 0
+    while True:
+        ultimo, lote = _lote(candidatas, ultimo, tamano_lote, nuevo)
+        if ultimo is None:
+            break
+        for origen, cantidad in lote.items():
+            por_origen[origen] += cantidad
+
+    actualizadas = sum(por_origen.values())
+    if actualizadas:
+        cache_ventas.invalidar()
+    return {'estado': nuevo, 'actualizadas': actualizadas, 'por_origen': por_origen, 'omitidas': omitidas}
@@ -0,0 +1,51 @@
+import csv
+import heapq
+
+# Filas de la exportación de ventas, compartidas por la descarga directa
+# (vistas_exportacion.py) y los trabajos en segundo plano (trabajos.py)
+
+# Filas que se piden a la base por cada vuelta del cursor
+EXPORTACION_CHUNK_SIZE = 2000
+EXPORTACION_COLUMNAS = ['Producto', 'Cantidad', 'Total', 'Fecha', 'Estado']
+
+
+def _recorrer(ventas):
+    filas = ventas.select_related('producto').only(
+        'producto__nombre', 'cantidad', 'total', 'fecha', 'estado'
+    ).order_by('fecha', 'id')
+    return filas.iterator(chunk_size=EXPORTACION_CHUNK_SIZE)
+
+
+def filas_exportacion(ventas, archivadas=None):
+    # Recorre el queryset por chunks, sin cachear resultados ni hacer N+1.
+    # Con `archivadas` (FiltroVentas.filtrar_archivo) intercala las dos
+    # tablas por (fecha, id)
+    recorrido = _recorrer(ventas)
+    if archivadas is not None:
+        recorrido = heapq.merge(_recorrer(archivadas), recorrido, key=lambda venta: (venta.fecha, venta.pk))
+    for venta in recorrido:
+        yield [venta.producto.nombre, venta.cantidad, venta.total, venta.fecha, venta.estado]
+
+
+def libro_excel():
+    # Libro write_only con la hoja y el encabezado: vuelca las filas a disco
+    # a medida que llegan. openpyxl se importa aquí para no cargarlo al arrancar
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Ventas')
+    ws.append(EXPORTACION_COLUMNAS)
+    return wb, ws
+
+
+def escribir_excel(ventas, archivo, archivadas=None):
+    wb, ws = libro_excel()
+    for fila in filas_exportacion(ventas, archivadas):
+        ws.append(fila)
+    wb.save(archivo)
+
+
+def escribir_csv(ventas, archivo, archivadas=None):
+    writer = csv.writer(archivo)
+    writer.writerow(EXPORTACION_COLUMNAS)
+    writer.writerows(filas_exportacion(ventas, archivadas))
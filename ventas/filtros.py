@@ -0,0 +1,101 @@
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.db.models import Count, Sum
+
+from . import archivo, cache_ventas
+from .forms import FiltroVentasForm
+from .models import Venta, VentaArchivada
+
+CENTAVO = Decimal('0.01')
+
+# Campo del formulario -> lookup sobre Venta (y VentaArchivada)
+LOOKUPS = {
+    'producto': 'producto',
+    'fecha_inicio': 'fecha__gte',
+    'fecha_fin': 'fecha__lte',
+    'precio_minimo': 'total__gte',
+    'precio_maximo': 'total__lte',
+    'estado': 'estado',
+}
+
+
+class FiltroVentas:
+    # Traduce los filtros de ventas (querystring de la vista, la exportación
+    # o la API) a un queryset. Los valores se validan con FiltroVentasForm y
+    # los campos inválidos se ignoran, como hacía la vista original.
+
+    def __init__(self, datos=None):
+        self.form = FiltroVentasForm(datos or None)
+
+    def es_valido(self):
+        return not self.form.is_bound or self.form.is_valid()
+
+    @property
+    def errores(self):
+        return self.form.errors
+
+    @property
+    def valores(self):
+        # Sólo los filtros con valor, ya convertidos a su tipo
+        if not self.form.is_bound:
+            return {}
+        self.form.is_valid()
+        return {
+            campo: valor for campo, valor in self.form.cleaned_data.items()
+            if campo in LOOKUPS and valor not in (None, '')
+        }
+
+    def parametros(self):
+        # Representación normalizada: campos ordenados, producto por id,
+        # fechas ISO y decimales sin ceros de más
+        parametros = {}
+        for campo, valor in sorted(self.valores.items()):
+            if campo == 'producto':
+                valor = valor.pk
+            elif hasattr(valor, 'isoformat'):
+                valor = valor.isoformat()
+            elif hasattr(valor, 'normalize'):
+                valor = format(valor.normalize(), 'f')
+            parametros[campo] = str(valor)
+        return parametros
+
+    def querystring(self):
+        return urlencode(self.parametros())
+
+    def clave(self):
+        # Dos querystrings equivalentes (orden, 10 y 10.00, vacíos) comparten clave
+        return hashlib.sha1(self.querystring().encode()).hexdigest()
+
+    def filtrar(self, queryset=None):
+        if queryset is None:
+            queryset = Venta.objects.all()
+        return queryset.filter(**{LOOKUPS[campo]: valor for campo, valor in self.valores.items()})
+
+    def filtrar_archivo(self, queryset=None):
+        # Las ventas archivadas que cumplen el filtro, o None si el rango de
+        # fechas no llega hasta el archivo (ver ventas/archivo.py)
+        limite = archivo.fecha_maxima()
+        inicio = self.valores.get('fecha_inicio')
+        if limite is None or (inicio is not None and inicio > limite):
+            return None
+        return self.filtrar(VentaArchivada.objects.all() if queryset is None else queryset)
+
+    def resumen(self):
+        # Número de ventas y total en un único aggregate (más el del archivo
+        # si el rango llega hasta él), memoizado por filtro dentro de la
+        # generación actual del caché
+        def calcular():
+            agregados = {'num_ventas': Count('id'), 'total': Sum('total')}
+            resultado = self.filtrar().aggregate(**agregados)
+            total = resultado['total'] or 0
+            archivadas = self.filtrar_archivo()
+            if archivadas is not None:
+                anteriores = archivadas.aggregate(**agregados)
+                resultado['num_ventas'] += anteriores['num_ventas']
+                total += anteriores['total'] or 0
+            # SQLite devuelve la suma sin escala fija; se deja en céntimos
+            resultado['total'] = Decimal(total).quantize(CENTAVO)
+            return resultado
+        return cache_ventas.obtener_o_calcular(f'filtro:{self.clave()}:resumen', calcular)
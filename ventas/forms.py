@@ -1,19 +1,50 @@
 from django import forms
+from django.urls import reverse_lazy
+
+from . import catalogo
 from .models import Producto, Venta
 
+
+class ProductoAutocompletar(forms.Select):
+    # Select que sólo renderiza la opción elegida (leída del catálogo
+    # cacheado) en vez de un <option> por producto. Las demás se buscan en
+    # /api/productos/buscar/ mientras se escribe (autocompletar.js)
+    class Media:
+        js = ['ventas/js/autocompletar.js']
+
+    def __init__(self, attrs=None):
+        super().__init__({'data-autocompletar': reverse_lazy('api_productos_buscar'), **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        elegidos = catalogo.productos(value)
+        opciones = [self.create_option(name, '', '---------', not elegidos, 0)]
+        for indice, producto in enumerate(elegidos.values(), 1):
+            opciones.append(self.create_option(name, producto['id'], producto['nombre'], True, indice))
+        return [(None, opciones, 0)]
+
+
 class ProductoForm(forms.ModelForm):
+    # El stock no se escribe en el producto: entra como ajuste del libro de
+    # movimientos (inventario.ajustar). Vacío = sin control de stock
+    stock_inicial = forms.IntegerField(min_value=0, required=False)
+
     class Meta:
         model = Producto
         fields = ['nombre', 'precio']
 
 class VentaForm(forms.ModelForm):
+    # El modelo admite 0 (PositiveIntegerField), pero una venta sin
+    # unidades no descuenta nada del stock
+    cantidad = forms.IntegerField(min_value=1)
+
     class Meta:
         model = Venta
         fields = ['producto', 'cantidad', 'fecha', 'total']
+        widgets = {'producto': ProductoAutocompletar}
 
 
 class FiltroVentasForm(forms.Form):
-    producto = forms.ModelChoiceField(queryset=Producto.objects.all(), required=False)
+    producto = forms.ModelChoiceField(queryset=Producto.objects.all(), required=False, widget=ProductoAutocompletar)
     fecha_inicio = forms.DateField(widget=forms.TextInput(attrs={'type': 'date'}), required=False)
     fecha_fin = forms.DateField(widget=forms.TextInput(attrs={'type': 'date'}), required=False)
     precio_minimo = forms.DecimalField(max_digits=10, decimal_places=2, required=False)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from . import series
+from .renderizado import renderizar_serie_png
+
+_pool = None
+_en_curso = {}
+_candado = threading.Lock()
+
+
+def serie_diaria():
+    # Serie diaria (fechas, totales) lista para dibujar, de series.py y
+    # reducida a GRAFICOS_PUNTOS: un PNG no muestra más detalle que eso
+    datos = series.serie('dia', settings.GRAFICOS_PUNTOS)
+    return {'fechas': datos['fechas'], 'totales': datos['totales']}
+
+
+def version(serie):
+    # Hash de los datos: mismo hash, mismo PNG
+    contenido = json.dumps(serie, sort_keys=True).encode()
+    return hashlib.sha1(contenido).hexdigest()
+
+
+def ruta_png(version_datos):
+    return Path(settings.GRAFICOS_DIR) / f'ventas_{version_datos}.png'
+
+
+def ultima_modificacion(version_datos):
+    ruta = ruta_png(version_datos)
+    if not ruta.exists():
+        return None
+    return datetime.fromtimestamp(ruta.stat().st_mtime, tz=timezone.utc)
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.GRAFICOS_PROCESOS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _pool
+
+
+def _renderizar(serie, ruta):
+    global _pool
+    if not settings.GRAFICOS_PROCESOS:
+        return renderizar_serie_png(serie['fechas'], serie['totales'], str(ruta))
+
+    # Las peticiones simultáneas de la misma versión comparten el mismo trabajo
+    with _candado:
+        futuro = _en_curso.get(ruta)
+        if futuro is None:
+            futuro = _obtener_pool().submit(renderizar_serie_png, serie['fechas'], serie['totales'], str(ruta))
+            _en_curso[ruta] = futuro
+            futuro.add_done_callback(lambda _: _en_curso.pop(ruta, None))
+    try:
+        return futuro.result(timeout=settings.GRAFICOS_TIMEOUT)
+    except BrokenProcessPool:
+        with _candado:
+            _pool = None
+        return renderizar_serie_png(serie['fechas'], serie['totales'], str(ruta))
+
+
+def _limpiar_antiguos(conservar):
+    archivos = sorted(Path(settings.GRAFICOS_DIR).glob('ventas_*.png'), key=os.path.getmtime, reverse=True)
+    for archivo in archivos[conservar:]:
+        archivo.unlink(missing_ok=True)
+
+
+def obtener_png(serie, version_datos):
+    # Devuelve la ruta del PNG de esta versión, dibujándolo solo si no existe
+    ruta = ruta_png(version_datos)
+    if not ruta.exists():
+        _renderizar(serie, ruta)
+        _limpiar_antiguos(settings.GRAFICOS_CONSERVAR)
+    return ruta
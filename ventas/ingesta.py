@@ -0,0 +1,196 @@
+import csv
+import json
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+from django.db import connection, transaction
+
+from . import cache_ventas, contadores, inventario, resumen, series, tiempo_real
+from .models import Producto, Venta
+
+TAMANO_LOTE = 5000
+MAX_ERRORES_REPORTADOS = 1000
+ESTADOS = {clave for clave, _ in Venta.ESTADO_CHOICES}
+ESTADO_POR_DEFECTO = Venta._meta.get_field('estado').default
+# total es DecimalField(max_digits=10, decimal_places=2)
+MAX_CENTAVOS = 10 ** 10 - 1
+# cantidad es PositiveIntegerField: el rango común a todos los motores
+MAX_CANTIDAD = 2 ** 31 - 1
+INSERT_DIRECTO_VENDORS = {'sqlite', 'postgresql'}
+
+
+def leer_jsonl(lineas):
+    # Una venta por línea: {"producto": 1, "cantidad": 2, "fecha": "2024-05-01", "estado": "completada"}
+    for linea in lineas:
+        if isinstance(linea, bytes):
+            linea = linea.decode('utf-8')
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            yield json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield {'__error__': f'JSON inválido: {e.msg}'}
+
+
+def leer_csv(lineas):
+    # CSV con encabezado producto,cantidad,fecha[,estado]
+    texto = (linea.decode('utf-8') if isinstance(linea, bytes) else linea for linea in lineas)
+    yield from csv.DictReader(texto)
+
+
+LECTORES = {
+    'jsonl': leer_jsonl,
+    'csv': leer_csv,
+}
+
+
+def _validar(fila):
+    # Devuelve (producto_id, cantidad, fecha, estado) y un diccionario de errores
+    if not isinstance(fila, dict):
+        return None, {'fila': 'Se esperaba un objeto'}
+    if '__error__' in fila:
+        return None, {'fila': fila['__error__']}
+
+    errores = {}
+    try:
+        producto_id = int(fila.get('producto'))
+    except (TypeError, ValueError):
+        errores['producto'] = 'Debe ser el id de un producto'
+    try:
+        cantidad = int(fila.get('cantidad'))
+        if not 0 < cantidad <= MAX_CANTIDAD:
+            raise ValueError
+    except (TypeError, ValueError):
+        errores['cantidad'] = f'Debe ser un entero positivo de hasta {MAX_CANTIDAD}'
+    try:
+        fecha = date.fromisoformat(fila.get('fecha'))
+    except (TypeError, ValueError):
+        errores['fecha'] = 'Debe tener formato AAAA-MM-DD'
+    estado = fila.get('estado') or ESTADO_POR_DEFECTO
+    if estado not in ESTADOS:
+        errores['estado'] = f'Estado no válido: {estado}'
+
+    if errores:
+        return None, errores
+    return (producto_id, cantidad, fecha, estado), None
+
+
+def _procesar_lote(numerados, reporte):
+    validas = []
+    numeros = []
+    for numero, fila in numerados:
+        datos, errores = _validar(fila)
+        if errores:
+            _registrar_error(reporte, numero, errores)
+        else:
+            validas.append(datos)
+            numeros.append(numero)
+    if not validas:
+        return
+
+    # Un único SELECT para los precios de todos los productos del lote
+    productos = Producto.objects.only('precio', 'stock').in_bulk({datos[0] for datos in validas})
+
+    encontradas = []
+    for numero, datos in zip(numeros, validas):
+        if datos[0] in productos:
+            encontradas.append((numero, datos))
+        else:
+            _registrar_error(reporte, numero, {'producto': f'No existe el producto {datos[0]}'})
+    if not encontradas:
+        return
+
+    # total = precio * cantidad, en centavos enteros y de forma vectorizada
+    precios = np.fromiter(
+        (int(productos[datos[0]].precio * 100) for _, datos in encontradas), dtype=np.int64, count=len(encontradas)
+    )
+    cantidades = np.fromiter((datos[1] for _, datos in encontradas), dtype=np.int64, count=len(encontradas))
+    # Se compara antes de multiplicar: en int64 el producto daría la vuelta
+    # en silencio y pasaría por un total negativo
+    excedidas = cantidades > MAX_CENTAVOS // np.maximum(precios, 1)
+    totales = precios * np.where(excedidas, 0, cantidades)
+
+    filas = []
+    numeros_filas = []
+    for (numero, (producto_id, cantidad, fecha, estado)), centavos, excedida in zip(
+        encontradas, totales.tolist(), excedidas.tolist()
+    ):
+        if excedida or centavos > MAX_CENTAVOS:
+            _registrar_error(reporte, numero, {'cantidad': 'El total supera el máximo permitido'})
+            continue
+        filas.append((fecha, producto_id, estado, Decimal(centavos).scaleb(-2), cantidad))
+        numeros_filas.append(numero)
+
+    unidades = defaultdict(int)
+    for _, producto_id, estado, _, cantidad in filas:
+        if estado != inventario.CANCELADA:
+            unidades[producto_id] += cantidad
+    controlados = {pk for pk, producto in productos.items() if producto.stock is not None}
+
+    # El INSERT masivo no dispara señales: el stock, el resumen y los
+    # contadores se actualizan con el camino masivo dentro de la misma
+    # transacción. Un producto sin stock para todas sus filas del lote las
+    # rechaza todas, salvo las canceladas, que no descuentan
+    with transaction.atomic():
+        rechazados = inventario.descontar_lote(unidades, controlados)
+        if rechazados:
+            aceptadas = []
+            for numero, fila in zip(numeros_filas, filas):
+                if fila[1] in rechazados and fila[2] != inventario.CANCELADA:
+                    _registrar_error(reporte, numero, {'cantidad': f'No hay stock suficiente del producto {fila[1]}'})
+                else:
+                    aceptadas.append(fila)
+            filas = aceptadas
+        insertar_filas(filas)
+        resumen.registrar_filas(filas)
+        contadores.registrar_filas(filas)
+        if filas:
+            series.marcar(*{fila[0] for fila in filas})
+        tiempo_real.publicar(tiempo_real.deltas_de_filas(filas))
+    reporte['creadas'] += len(filas)
+
+
+def insertar_filas(filas):
+    # En SQLite y Postgres se inserta con executemany directo: bulk_create
+    # arma un objeto Venta y prepara cada campo por separado, y a estos
+    # volúmenes eso es varias veces más lento que la propia escritura
+    if connection.vendor not in INSERT_DIRECTO_VENDORS:
+        Venta.objects.bulk_create(
+            Venta(fecha=fecha, producto_id=producto_id, estado=estado, total=total, cantidad=cantidad)
+            for fecha, producto_id, estado, total, cantidad in filas
+        )
+        return
+
+    tabla = connection.ops.quote_name(Venta._meta.db_table)
+    with connection.cursor() as cursor:
+        # Ambos drivers aceptan date y Decimal tal cual
+        cursor.executemany(
+            f'INSERT INTO {tabla} (fecha, producto_id, estado, total, cantidad) VALUES (%s, %s, %s, %s, %s)',
+            filas,
+        )
+
+
+def _registrar_error(reporte, numero, errores):
+    reporte['num_errores'] += 1
+    if len(reporte['errores']) < MAX_ERRORES_REPORTADOS:
+        reporte['errores'].append({'fila': numero, 'errores': errores})
+
+
+def importar(filas, tamano_lote=TAMANO_LOTE):
+    # Importa un iterable de diccionarios en lotes, cada uno en su propia
+    # transacción. Las filas inválidas no frenan al resto: se informan en
+    # el reporte con su número (empezando en 1)
+    reporte = {'creadas': 0, 'num_errores': 0, 'errores': []}
+    numeradas = enumerate(filas, start=1)
+    while True:
+        lote = list(islice(numeradas, tamano_lote))
+        if not lote:
+            break
+        _procesar_lote(lote, reporte)
+    if reporte['creadas']:
+        cache_ventas.invalidar()
+    return reporte
@@ -0,0 +1,242 @@
+import json
+import os
+import shutil
+import uuid
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from . import cache_ventas, series
+from .models import Venta, VentaArchivada, VentaResumenDiario
+
+# Instantáneas columnares de las ventas para la analítica, fuera de la base
+# transaccional. Un directorio por mes con un .npy por columna y un
+# manifiesto que dice qué directorio vale para cada mes; las columnas se
+# abren con mmap, así que leer un año entero sólo toca las columnas pedidas.
+# Dentro de cada mes las filas van ordenadas por (fecha, id).
+#
+#   python manage.py actualizar_instantaneas             # incremental
+#   python manage.py actualizar_instantaneas --completo  # desde cero
+COLUMNAS = {
+    'id': np.int64,
+    'fecha': 'datetime64[D]',
+    'producto_id': np.int64,
+    'estado': np.int8,  # índice en ESTADOS
+    'centavos': np.int64,
+    'cantidad': np.int64,
+}
+ESTADOS = [estado for estado, _ in Venta.ESTADO_CHOICES]
+MANIFIESTO = 'manifiesto.json'
+TAMANO_LOTE = 5000
+
+
+def _directorio():
+    return Path(settings.INSTANTANEAS_DIR)
+
+
+def leer_manifiesto():
+    try:
+        with open(_directorio() / MANIFIESTO, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def _escribir_manifiesto(manifiesto):
+    # Se reemplaza de una vez: los lectores ven el manifiesto viejo o el nuevo
+    ruta = _directorio() / MANIFIESTO
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, sort_keys=True)
+    os.replace(temporal, ruta)
+
+
+def _vacias():
+    return {columna: np.empty(0, dtype=tipo) for columna, tipo in COLUMNAS.items()}
+
+
+def _columnas(*consultas):
+    # Columnas de las ventas de uno o más querysets (Venta y VentaArchivada)
+    codigos = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+    filas = chain.from_iterable(
+        consulta.order_by('id').values_list('id', 'fecha', 'producto_id', 'estado', 'total', 'cantidad')
+        .iterator(chunk_size=TAMANO_LOTE)
+        for consulta in consultas
+    )
+    valores = {columna: [] for columna in COLUMNAS}
+    for id_venta, fecha, producto_id, estado, total, cantidad in filas:
+        valores['id'].append(id_venta)
+        valores['fecha'].append(fecha)
+        valores['producto_id'].append(producto_id)
+        valores['estado'].append(codigos[estado])
+        valores['centavos'].append(int(total * 100))
+        valores['cantidad'].append(cantidad)
+    if not valores['id']:
+        return _vacias()
+    return {columna: np.array(valores[columna], dtype=tipo) for columna, tipo in COLUMNAS.items()}
+
+
+def _ordenar(columnas):
+    orden = np.lexsort((columnas['id'], columnas['fecha']))
+    return {columna: valores[orden] for columna, valores in columnas.items()}
+
+
+def _por_mes(columnas):
+    meses = columnas['fecha'].astype('datetime64[M]')
+    for mes in np.unique(meses):
+        mascara = meses == mes
+        yield str(mes), {columna: valores[mascara] for columna, valores in columnas.items()}
+
+
+def _limites_mes(mes):
+    inicio = np.datetime64(mes, 'M')
+    return inicio.astype('datetime64[D]').item(), (inicio + 1).astype('datetime64[D]').item()
+
+
+def _cargar_mes(entrada, columnas):
+    ruta = _directorio() / entrada['directorio']
+    return {columna: np.load(ruta / f'{columna}.npy', mmap_mode='r') for columna in columnas}
+
+
+def _por_estado(columnas):
+    # {estado: [filas, centavos]} de un mes, para compararlo con el resumen
+    resultado = {}
+    for codigo in np.unique(columnas['estado']):
+        mascara = columnas['estado'] == codigo
+        resultado[ESTADOS[codigo]] = [int(mascara.sum()), int(columnas['centavos'][mascara].sum())]
+    return resultado
+
+
+def _escribir_mes(mes, columnas):
+    # Cada versión de un mes va a un directorio nuevo: quien esté leyendo el
+    # anterior por mmap no ve archivos a medio escribir
+    nombre = f'mes={mes}.{uuid.uuid4().hex[:8]}'
+    ruta = _directorio() / nombre
+    ruta.mkdir(parents=True)
+    for columna, valores in columnas.items():
+        np.save(ruta / f'{columna}.npy', valores)
+    return {
+        'directorio': nombre,
+        'filas': int(len(columnas['id'])),
+        'centavos': int(columnas['centavos'].sum()),
+        'estados': _por_estado(columnas),
+    }
+
+
+def _meses_desfasados(esperados):
+    # Meses cuyo número de ventas o total por estado no coincide con el
+    # resumen diario: ediciones, cambios de estado y borrados de ventas ya
+    # copiadas, o ids que se confirmaron después de otros mayores. Es una
+    # consulta chica sobre VentaResumenDiario
+    reales = {}
+    for fila in (
+        VentaResumenDiario.objects.annotate(mes=TruncMonth('fecha')).values('mes', 'estado')
+        .annotate(filas=Sum('num_ventas'), total=Sum('total'))
+    ):
+        if fila['filas']:
+            estados = reales.setdefault(fila['mes'].strftime('%Y-%m'), {})
+            estados[fila['estado']] = [fila['filas'], int(fila['total'] * 100)]
+    return sorted(mes for mes in set(reales) | set(esperados) if reales.get(mes) != esperados.get(mes))
+
+
+def actualizar(completo=False):
+    # Copia las ventas con id mayor al último copiado y reescribe los meses
+    # desfasados. Devuelve {'nuevas', 'meses'} con los meses reescritos
+    manifiesto = None if completo else leer_manifiesto()
+    if manifiesto is None:
+        manifiesto = {'max_id': 0, 'meses': {}}
+    anteriores = dict(manifiesto['meses'])
+
+    nuevas = _columnas(Venta.objects.filter(id__gt=manifiesto['max_id']))
+    max_id = max(manifiesto['max_id'], int(nuevas['id'].max()) if len(nuevas['id']) else 0)
+    cambios = {}
+    for mes, columnas in _por_mes(nuevas):
+        if mes in anteriores:
+            previas = _cargar_mes(anteriores[mes], COLUMNAS)
+            columnas = {columna: np.concatenate([previas[columna], columnas[columna]]) for columna in COLUMNAS}
+        cambios[mes] = columnas
+
+    # Los manifiestos anteriores a 'estados' se reescriben una vez
+    esperados = {mes: entrada.get('estados') for mes, entrada in anteriores.items()}
+    for mes, columnas in cambios.items():
+        esperados[mes] = _por_estado(columnas)
+    for mes in _meses_desfasados(esperados):
+        inicio, fin = _limites_mes(mes)
+        # Las archivadas no vuelven a aparecer como nuevas: entran todas
+        cambios[mes] = _columnas(
+            Venta.objects.filter(fecha__gte=inicio, fecha__lt=fin, id__lte=max_id),
+            VentaArchivada.objects.filter(fecha__gte=inicio, fecha__lt=fin),
+        )
+
+    meses = dict(anteriores)
+    for mes, columnas in sorted(cambios.items()):
+        if len(columnas['id']):
+            meses[mes] = _escribir_mes(mes, _ordenar(columnas))
+        else:
+            meses.pop(mes, None)
+    _escribir_manifiesto({'max_id': max_id, 'meses': meses})
+
+    # Directorios que ya no figuran en el manifiesto. Un lector que los
+    # tenga abiertos por mmap sigue leyendo hasta cerrarlos
+    vigentes = {entrada['directorio'] for entrada in meses.values()}
+    for ruta in _directorio().glob('mes=*'):
+        if ruta.name not in vigentes:
+            shutil.rmtree(ruta, ignore_errors=True)
+
+    if cambios and settings.ANALITICA_FUENTE == 'instantaneas':
+        # Los resultados cacheados se calcularon con la instantánea anterior
+        cache_ventas.invalidar()
+        series.marcar(_limites_mes(min(cambios))[0])
+    return {'nuevas': int(len(nuevas['id'])), 'meses': sorted(cambios)}
+
+
+def cargar(columnas=('fecha', 'centavos'), desde=None, hasta=None):
+    # Las columnas pedidas, en orden de fecha, de los meses entre `desde` y
+    # `hasta` (date, inclusive). Con un solo mes se devuelven los arrays
+    # mapeados tal cual. None si todavía no hay instantánea
+    manifiesto = leer_manifiesto()
+    if manifiesto is None:
+        return None
+    meses = sorted(manifiesto['meses'])
+    if desde is not None:
+        meses = [mes for mes in meses if mes >= desde.strftime('%Y-%m')]
+    if hasta is not None:
+        meses = [mes for mes in meses if mes <= hasta.strftime('%Y-%m')]
+
+    pedidas = set(columnas) | ({'fecha'} if desde or hasta else set())
+    partes = [_cargar_mes(manifiesto['meses'][mes], pedidas) for mes in meses]
+    if not partes:
+        vacias = _vacias()
+        return {columna: vacias[columna] for columna in columnas}
+    datos = partes[0] if len(partes) == 1 else {
+        columna: np.concatenate([parte[columna] for parte in partes]) for columna in pedidas
+    }
+
+    if desde or hasta:
+        fechas = datos['fecha']
+        mascara = np.ones(len(fechas), dtype=bool)
+        if desde is not None:
+            mascara &= fechas >= np.datetime64(desde, 'D')
+        if hasta is not None:
+            mascara &= fechas <= np.datetime64(hasta, 'D')
+        if not mascara.all():
+            datos = {columna: valores[mascara] for columna, valores in datos.items()}
+    return {columna: datos[columna] for columna in columnas}
+
+
+def columnas_diarias(desde=None, hasta=None):
+    # Mismo formato que agregaciones.columnas_diarias: (fechas, centavos,
+    # conteos) por día. Las filas ya vienen ordenadas por fecha
+    datos = cargar(('fecha', 'centavos'), desde, hasta)
+    if datos is None:
+        return None
+    fechas = datos['fecha']
+    if len(fechas) == 0:
+        return fechas, datos['centavos'], np.empty(0, dtype=np.int64)
+    inicios = np.flatnonzero(np.r_[True, fechas[1:] != fechas[:-1]])
+    conteos = np.diff(np.r_[inicios, len(fechas)]).astype(np.int64)
+    return fechas[inicios], np.add.reduceat(datos['centavos'], inicios), conteos
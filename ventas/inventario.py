@@ -0,0 +1,121 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+
+from .models import MovimientoStock, Producto, Venta
+
+# Stock de productos. Nunca se lee el stock para decidir y después se
+# guarda: cada salida es un único UPDATE ... WHERE stock >= cantidad, que la
+# base aplica de forma atómica sobre la fila. Dos ventas concurrentes del
+# último artículo no pueden pasar las dos, y no hace falta bloquear la tabla.
+# Los productos con stock vacío no llevan control y siempre se venden.
+# Todo cambio de stock pasa por aquí y deja su MovimientoStock: la suma de
+# los movimientos de un producto explica su stock.
+
+# Cancelar devuelve las unidades (devolver_lote) y desde 'cancelada' no hay
+# transiciones: una venta que ya llega cancelada no se las lleva
+CANCELADA = 'cancelada'
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto_id, cantidad):
+        super().__init__(f'No hay stock suficiente del producto {producto_id} para {cantidad} unidades')
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+
+
+def _descontar(producto_id, cantidad):
+    # True si se descontó (o el producto no controla stock)
+    return bool(
+        Producto.objects.filter(pk=producto_id)
+        .filter(Q(stock__isnull=True) | Q(stock__gte=cantidad))
+        .update(stock=F('stock') - cantidad)
+    )
+
+
+@transaction.atomic
+def registrar_venta(producto_id, cantidad, fecha, estado=None):
+    # Descuenta el stock y crea la venta con el precio vigente, todo en la
+    # misma transacción. Lanza StockInsuficiente o Producto.DoesNotExist.
+    # Una venta que ya nace cancelada no toca el stock (ver CANCELADA)
+    if cantidad <= 0:
+        raise ValueError('La cantidad debe ser positiva')
+    cancelada = estado == CANCELADA
+    if not cancelada and not _descontar(producto_id, cantidad):
+        if not Producto.objects.filter(pk=producto_id).exists():
+            raise Producto.DoesNotExist(f'No existe el producto {producto_id}')
+        raise StockInsuficiente(producto_id, cantidad)
+
+    # La fila ya quedó bloqueada por el UPDATE: el precio no puede cambiar
+    # entre esta lectura y el alta
+    precio, stock = Producto.objects.values_list('precio', 'stock').get(pk=producto_id)
+    venta = Venta.objects.create(
+        producto_id=producto_id, cantidad=cantidad, fecha=fecha, total=precio * cantidad,
+        **({'estado': estado} if estado else {}),
+    )
+    if stock is not None and not cancelada:
+        MovimientoStock.objects.create(producto_id=producto_id, cantidad=-cantidad, tipo='venta', venta=venta)
+    return venta
+
+
+def descontar_lote(cantidades, controlados):
+    # Camino masivo de la ingesta: `cantidades` es {producto_id: unidades}
+    # y `controlados` los ids con stock. Debe llamarse dentro de la
+    # transacción del lote. Devuelve los ids sin stock suficiente: sus filas
+    # no se deben insertar. Se actualiza en orden de id para que dos lotes
+    # concurrentes en Postgres no se bloqueen mutuamente
+    rechazados = set()
+    movimientos = []
+    for producto_id in sorted(cantidades):
+        if not _descontar(producto_id, cantidades[producto_id]):
+            rechazados.add(producto_id)
+        elif producto_id in controlados:
+            movimientos.append(MovimientoStock(producto_id=producto_id, cantidad=-cantidades[producto_id], tipo='venta'))
+    MovimientoStock.objects.bulk_create(movimientos)
+    return rechazados
+
+
+@transaction.atomic
+def reponer(producto_id, cantidad, tipo='reposicion', venta=None):
+    # Entrada de stock. En un producto sin control empieza a contarse desde 0
+    if cantidad <= 0:
+        raise ValueError('La cantidad debe ser positiva')
+    if not Producto.objects.filter(pk=producto_id).update(stock=Coalesce(F('stock'), 0) + cantidad):
+        raise Producto.DoesNotExist(f'No existe el producto {producto_id}')
+    return MovimientoStock.objects.create(producto_id=producto_id, cantidad=cantidad, tipo=tipo, venta=venta)
+
+
+def devolver_lote(filas):
+    # Ventas canceladas: `filas` son (venta_id, producto_id, cantidad). Sus
+    # unidades vuelven al stock de los productos con control, con un
+    # movimiento 'cancelacion' por venta. Debe llamarse dentro de la
+    # transacción del cambio de estado; en orden de id, como descontar_lote
+    unidades = defaultdict(int)
+    for _, producto_id, cantidad in filas:
+        unidades[producto_id] += cantidad
+    controlados = {
+        producto_id for producto_id in sorted(unidades)
+        if Producto.objects.filter(pk=producto_id, stock__isnull=False).update(stock=F('stock') + unidades[producto_id])
+    }
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=producto_id, cantidad=cantidad, tipo='cancelacion', venta_id=venta_id)
+        for venta_id, producto_id, cantidad in filas
+        if producto_id in controlados
+    ])
+
+
+@transaction.atomic
+def ajustar(producto_id, stock):
+    # Fija el stock contado (alta del producto, inventario físico) y deja
+    # un movimiento 'ajuste' por la diferencia. Con None el producto deja de
+    # controlar stock. Es el único caso en que se lee antes de escribir, con
+    # la fila bloqueada
+    if stock is not None and stock < 0:
+        raise ValueError('El stock no puede ser negativo')
+    actual = Producto.objects.select_for_update().values_list('stock', flat=True).get(pk=producto_id)
+    Producto.objects.filter(pk=producto_id).update(stock=stock)
+    diferencia = (stock or 0) - (actual or 0)
+    if diferencia:
+        MovimientoStock.objects.create(producto_id=producto_id, cantidad=diferencia, tipo='ajuste')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ventas import instantaneas
+
+
+class Command(BaseCommand):
+    help = 'Copia las ventas nuevas o modificadas a las instantáneas columnares por mes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Regenerar todos los meses desde cero')
+
+    def handle(self, *args, **options):
+        reporte = instantaneas.actualizar(completo=options['completo'])
+        meses = ', '.join(reporte['meses']) or 'ninguno'
+        self.stdout.write(self.style.SUCCESS(
+            f"Ventas nuevas: {reporte['nuevas']}. Meses reescritos: {meses}"
+        ))
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas import archivo
+
+
+class Command(BaseCommand):
+    help = 'Mueve a VentaArchivada, en lotes, las ventas anteriores al horizonte de retención'
+
+    def add_arguments(self, parser):
+        horizonte = parser.add_mutually_exclusive_group()
+        horizonte.add_argument('--antes-de', dest='antes_de', help='Fecha ISO: se archivan las ventas anteriores')
+        horizonte.add_argument('--meses', type=int, help='Meses a conservar (por defecto ARCHIVO_HORIZONTE_MESES)')
+        parser.add_argument('--lote', type=int, default=archivo.TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        if options['antes_de']:
+            try:
+                corte = date.fromisoformat(options['antes_de'])
+            except ValueError:
+                raise CommandError('Indicá --antes-de como AAAA-MM-DD')
+        else:
+            corte = archivo.horizonte(meses=options['meses'])
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+
+        reporte = archivo.archivar(antes_de=corte, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Ventas archivadas anteriores a {reporte['antes_de'].isoformat()}: {reporte['archivadas']}"
+        ))
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas import estados
+from ventas.filtros import LOOKUPS, FiltroVentas
+
+
+class Command(BaseCommand):
+    help = 'Cambia el estado de las ventas que cumplen los filtros (o de una lista de ids) en lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('estado', choices=sorted(estados.TRANSICIONES))
+        parser.add_argument('--ids', type=int, nargs='+', default=[])
+        # Los mismos filtros que /ventas_filtradas/; --estado-actual filtra por el estado de partida
+        for campo in LOOKUPS:
+            if campo != 'estado':
+                parser.add_argument(f"--{campo.replace('_', '-')}", dest=campo)
+        parser.add_argument('--estado-actual', dest='filtro_estado')
+        parser.add_argument('--lote', type=int, default=estados.TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        filtros = {campo: options[campo] for campo in LOOKUPS if campo != 'estado' and options[campo]}
+        if options['filtro_estado']:
+            filtros['estado'] = options['filtro_estado']
+        filtro = FiltroVentas(filtros)
+        if not filtro.es_valido():
+            raise CommandError(json.dumps(filtro.errores, ensure_ascii=False))
+        if not filtro.valores and not options['ids']:
+            raise CommandError('Indicá algún filtro o --ids: sin ellos cambiarían todas las ventas')
+
+        ventas = filtro.filtrar()
+        if options['ids']:
+            ventas = ventas.filter(pk__in=options['ids'])
+        reporte = estados.cambiar_estado(ventas, options['estado'], tamano_lote=options['lote'])
+
+        for estado, cantidad in sorted(reporte['omitidas'].items()):
+            self.stderr.write(f"Omitidas {cantidad} ventas en estado {estado}: no pueden pasar a {reporte['estado']}")
+        self.stdout.write(self.style.SUCCESS(f"Ventas pasadas a {reporte['estado']}: {reporte['actualizadas']}"))
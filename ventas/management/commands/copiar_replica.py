@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Copia la base primaria SQLite sobre la réplica, para probar ventas/replicas.py en local'
+
+    def handle(self, *args, **options):
+        if settings.REPLICA_ALIAS not in connections.databases:
+            raise CommandError('No hay réplica configurada: definí DATABASE_REPLICA_URL')
+        primaria = connections[DEFAULT_DB_ALIAS]
+        replica = connections[settings.REPLICA_ALIAS]
+        if primaria.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            # En Postgres la réplica se alimenta por replicación, no desde aquí
+            raise CommandError('Sólo para dos bases SQLite')
+
+        primaria.ensure_connection()
+        replica.ensure_connection()
+        # API de backup de sqlite3: copia consistente aunque la primaria esté en uso
+        primaria.connection.backup(replica.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Réplica {replica.settings_dict['NAME']} copiada desde {primaria.settings_dict['NAME']}"
+        ))
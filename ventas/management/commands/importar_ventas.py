@@ -0,0 +1,34 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas import ingesta
+
+
+class Command(BaseCommand):
+    help = 'Importa ventas en lote desde un archivo CSV o JSON lines ("-" para stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=sorted(ingesta.LECTORES), help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=ingesta.TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        formato = options['formato'] or ('csv' if archivo.endswith('.csv') else 'jsonl')
+        if archivo == '-' and not options['formato']:
+            raise CommandError('Indicá --formato al leer desde stdin')
+
+        entrada = sys.stdin if archivo == '-' else open(archivo, encoding='utf-8', newline='')
+        try:
+            reporte = ingesta.importar(ingesta.LECTORES[formato](entrada), tamano_lote=options['lote'])
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+
+        for error in reporte['errores']:
+            self.stderr.write(f"Fila {error['fila']}: {json.dumps(error['errores'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Ventas creadas: {reporte['creadas']}. Filas con errores: {reporte['num_errores']}"
+        ))
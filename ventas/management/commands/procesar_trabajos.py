@@ -0,0 +1,117 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ventas import trabajador, trabajos
+
+# Cada cuánto se reencolan los trabajos atascados y se borran los vencidos
+MANTENIMIENTO_SEGUNDOS = 60
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de exportaciones e informes en un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=settings.TRABAJOS_PROCESOS,
+            help='Procesos del pool (0 = ejecutar en este proceso)',
+        )
+        parser.add_argument('--una-vez', action='store_true', help='Salir cuando la cola quede vacía')
+
+    def handle(self, *args, **options):
+        procesos = options['procesos']
+        if procesos == 0:
+            self._en_linea(options['una_vez'])
+            return
+        # Si un hijo muere el pool queda roto: se crea otro y se sigue
+        while not self._con_pool(procesos, options['una_vez']):
+            self.stderr.write(self.style.WARNING('El pool de procesos se rompió: se crea uno nuevo'))
+
+    def _nuevo_pool(self, procesos):
+        # 'spawn': los hijos no heredan conexiones a la base ni hilos del padre
+        return ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=trabajador.inicializar,
+        )
+
+    def _mantenimiento(self):
+        reencolados = trabajos.reencolar_atascados()
+        vencidos = trabajos.limpiar_vencidos()
+        if reencolados or vencidos:
+            self.stdout.write(f'Reencolados: {reencolados}, vencidos borrados: {vencidos}')
+
+    def _en_linea(self, una_vez):
+        ultimo_mantenimiento = 0
+        while True:
+            if time.monotonic() - ultimo_mantenimiento > MANTENIMIENTO_SEGUNDOS:
+                self._mantenimiento()
+                ultimo_mantenimiento = time.monotonic()
+            reclamados = trabajos.reclamar(1)
+            for trabajo_id in reclamados:
+                self._informar(trabajo_id, trabajos.ejecutar(trabajo_id))
+            if not reclamados:
+                if una_vez:
+                    return
+                time.sleep(settings.TRABAJOS_INTERVALO)
+
+    def _con_pool(self, procesos, una_vez):
+        # Devuelve True al vaciarse la cola con --una-vez y False si el pool
+        # se rompió
+        with self._nuevo_pool(procesos) as pool:
+            en_curso = {}
+            ultimo_mantenimiento = 0
+            while True:
+                if time.monotonic() - ultimo_mantenimiento > MANTENIMIENTO_SEGUNDOS:
+                    self._mantenimiento()
+                    ultimo_mantenimiento = time.monotonic()
+                # Sólo se reclama lo que el pool puede empezar ya: lo demás
+                # queda pendiente para otros procesadores
+                libres = procesos - len(en_curso)
+                reclamados = trabajos.reclamar(libres) if libres else []
+                roto = False
+                for indice, trabajo_id in enumerate(reclamados):
+                    try:
+                        en_curso[pool.submit(trabajador.ejecutar, trabajo_id)] = trabajo_id
+                    except BrokenProcessPool:
+                        # Nunca llegaron a empezar: vuelven a la cola
+                        trabajos.reencolar(reclamados[indice:])
+                        roto = True
+                        break
+
+                if not en_curso and not roto:
+                    if una_vez:
+                        return True
+                    time.sleep(settings.TRABAJOS_INTERVALO)
+                    continue
+
+                terminados, _ = wait(en_curso, timeout=settings.TRABAJOS_INTERVALO, return_when=FIRST_COMPLETED)
+                roto = self._recoger(terminados, en_curso) or roto
+                if roto:
+                    # Con el pool roto los futuros que quedan terminan enseguida
+                    self._recoger(wait(en_curso)[0], en_curso)
+                    return False
+
+    def _recoger(self, terminados, en_curso):
+        # Informa los futuros terminados; devuelve True si el pool se rompió
+        roto = False
+        for futuro in terminados:
+            trabajo_id = en_curso.pop(futuro)
+            try:
+                estado = futuro.result()
+            except Exception as e:
+                # El proceso hijo murió (BrokenProcessPool) o no pudo
+                # arrancar Django: el trabajo no se reintenta en bucle
+                trabajos.fallar(trabajo_id, e)
+                estado = 'fallido'
+                roto = roto or isinstance(e, BrokenProcessPool)
+            self._informar(trabajo_id, estado)
+        return roto
+
+    def _informar(self, trabajo_id, estado):
+        estilo = self.style.SUCCESS if estado == 'completado' else self.style.ERROR
+        self.stdout.write(estilo(f'Trabajo {trabajo_id}: {estado}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ventas import cache_ventas, contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de ventas por producto y corrige los que no coinciden'
+
+    def handle(self, *args, **options):
+        reporte = contadores.reconciliar()
+        if any(reporte.values()):
+            cache_ventas.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Contadores creados: {reporte['creados']}, corregidos: {reporte['corregidos']}, "
+            f"borrados: {reporte['borrados']}"
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from ventas import resumen, series
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla VentaResumenDiario a partir de todas las ventas'
+
+    def handle(self, *args, **options):
+        filas = resumen.reconstruir()
+        series.marcar()
+        self.stdout.write(self.style.SUCCESS(f'Resumen diario reconstruido: {filas} filas'))
@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Métricas por petición, en memoria del proceso. Con varios workers cada uno
+# lleva las suyas: Prometheus las agrega al hacer scrape de todos ellos.
+
+# Límites superiores (en segundos) de los buckets del histograma de duración
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PERCENTILES = (50, 95, 99)
+
+_registro_actual = ContextVar('ventas_registro_actual', default=None)
+
+
+class RegistroPeticion:
+    # Lo que se va midiendo durante una petición; el middleware lo crea y lo
+    # publica en el ContextVar para que el caché y las plantillas lo encuentren
+
+    def __init__(self, metodo, ruta):
+        self.metodo = metodo
+        self.ruta = ruta
+        self.vista = None
+        self.status = None
+        self.duracion = 0.0
+        self.consultas = 0
+        self.tiempo_consultas = 0.0
+        self.tiempo_plantillas = 0.0
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+        self.sql = Counter()
+        self.n_mas_1 = []
+        self.perfil = None
+
+    def envolver_consulta(self, execute, sql, params, many, context):
+        # Se instala con connection.execute_wrapper() alrededor de la vista
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_consultas += time.perf_counter() - inicio
+            self.consultas += 1
+            # Django pasa el SQL con marcadores y los parámetros aparte, así
+            # que el mismo texto repetido es la misma consulta con otros valores
+            self.sql[sql] += 1
+
+    def detectar_n_mas_1(self, umbral):
+        self.n_mas_1 = [
+            {'sql': sql, 'repeticiones': veces}
+            for sql, veces in self.sql.most_common()
+            if veces > umbral
+        ]
+        return self.n_mas_1
+
+    def como_dict(self):
+        return {
+            'vista': self.vista,
+            'metodo': self.metodo,
+            'ruta': self.ruta,
+            'status': self.status,
+            'duracion_ms': round(self.duracion * 1000, 3),
+            'consultas': self.consultas,
+            'tiempo_consultas_ms': round(self.tiempo_consultas * 1000, 3),
+            'tiempo_plantillas_ms': round(self.tiempo_plantillas * 1000, 3),
+            'cache_aciertos': self.cache_aciertos,
+            'cache_fallos': self.cache_fallos,
+            'n_mas_1': self.n_mas_1,
+            'perfilada': self.perfil is not None,
+        }
+
+
+def registro_actual():
+    return _registro_actual.get()
+
+
+def activar(registro):
+    return _registro_actual.set(registro)
+
+
+def desactivar(token):
+    _registro_actual.reset(token)
+
+
+def contar_cache(acierto):
+    registro = _registro_actual.get()
+    if registro is None:
+        return
+    if acierto:
+        registro.cache_aciertos += 1
+    else:
+        registro.cache_fallos += 1
+
+
+def sumar_plantilla(segundos):
+    registro = _registro_actual.get()
+    if registro is not None:
+        registro.tiempo_plantillas += segundos
+
+
+class _MetricasVista:
+
+    def __init__(self, tamano):
+        self.duraciones = deque(maxlen=tamano)
+        self.buckets = [0] * len(BUCKETS)
+        self.peticiones = 0
+        self.errores = 0
+        self.suma_duracion = 0.0
+        self.consultas = 0
+        self.tiempo_consultas = 0.0
+        self.tiempo_plantillas = 0.0
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+        self.n_mas_1 = 0
+
+    def agregar(self, registro):
+        self.duraciones.append(registro.duracion)
+        for i, limite in enumerate(BUCKETS):
+            if registro.duracion <= limite:
+                self.buckets[i] += 1
+        self.peticiones += 1
+        if registro.status is not None and registro.status >= 500:
+            self.errores += 1
+        self.suma_duracion += registro.duracion
+        self.consultas += registro.consultas
+        self.tiempo_consultas += registro.tiempo_consultas
+        self.tiempo_plantillas += registro.tiempo_plantillas
+        self.cache_aciertos += registro.cache_aciertos
+        self.cache_fallos += registro.cache_fallos
+        if registro.n_mas_1:
+            self.n_mas_1 += 1
+
+    def percentiles(self):
+        # Sobre la ventana de las últimas peticiones, no sobre todo el histórico
+        muestras = sorted(self.duraciones)
+        if not muestras:
+            return {f'p{p}': None for p in PERCENTILES}
+        return {
+            f'p{p}': round(muestras[min(len(muestras) - 1, (len(muestras) * p) // 100)] * 1000, 3)
+            for p in PERCENTILES
+        }
+
+
+class Metricas:
+
+    def __init__(self, tamano_buffer=None, tamano_muestras=None):
+        self.tamano_buffer = tamano_buffer or settings.INSTRUMENTACION_BUFFER
+        self.tamano_muestras = tamano_muestras or settings.INSTRUMENTACION_MUESTRAS
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._candado = threading.Lock()
+        self.recientes = deque(maxlen=self.tamano_buffer)
+        self.perfiles = deque(maxlen=20)
+        self.vistas = defaultdict(lambda: _MetricasVista(self.tamano_muestras))
+
+    def registrar(self, registro):
+        with self._candado:
+            self.recientes.append(registro.como_dict())
+            self.vistas[registro.vista].agregar(registro)
+            if registro.perfil is not None:
+                self.perfiles.append({
+                    'vista': registro.vista,
+                    'ruta': registro.ruta,
+                    'duracion_ms': round(registro.duracion * 1000, 3),
+                    'perfil': registro.perfil,
+                })
+
+    def resumen(self):
+        with self._candado:
+            vistas = {}
+            for nombre, datos in sorted(self.vistas.items()):
+                vistas[nombre] = {
+                    'peticiones': datos.peticiones,
+                    'errores': datos.errores,
+                    'duracion_media_ms': round(datos.suma_duracion / datos.peticiones * 1000, 3),
+                    **datos.percentiles(),
+                    'consultas_media': round(datos.consultas / datos.peticiones, 2),
+                    'tiempo_consultas_ms': round(datos.tiempo_consultas * 1000, 3),
+                    'tiempo_plantillas_ms': round(datos.tiempo_plantillas * 1000, 3),
+                    'cache_aciertos': datos.cache_aciertos,
+                    'cache_fallos': datos.cache_fallos,
+                    'peticiones_n_mas_1': datos.n_mas_1,
+                }
+            return {
+                'vistas': vistas,
+                'recientes': list(self.recientes),
+                'perfiles': list(self.perfiles),
+            }
+
+    def prometheus(self):
+        # Formato de exposición de texto de Prometheus (version 0.0.4)
+        lineas = []
+
+        def cabecera(nombre, tipo, ayuda):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+
+        with self._candado:
+            vistas = sorted(self.vistas.items())
+
+            cabecera('ventas_peticion_duracion_segundos', 'histogram', 'Duración de las peticiones por vista.')
+            for nombre, datos in vistas:
+                etiqueta = _etiqueta(nombre)
+                for limite, cuenta in zip(BUCKETS, datos.buckets):
+                    lineas.append(f'ventas_peticion_duracion_segundos_bucket{{vista="{etiqueta}",le="{limite}"}} {cuenta}')
+                lineas.append(f'ventas_peticion_duracion_segundos_bucket{{vista="{etiqueta}",le="+Inf"}} {datos.peticiones}')
+                lineas.append(f'ventas_peticion_duracion_segundos_sum{{vista="{etiqueta}"}} {datos.suma_duracion:.6f}')
+                lineas.append(f'ventas_peticion_duracion_segundos_count{{vista="{etiqueta}"}} {datos.peticiones}')
+
+            cabecera('ventas_peticion_duracion_percentil_segundos', 'gauge',
+                     'Percentiles de duración sobre las últimas peticiones de cada vista.')
+            for nombre, datos in vistas:
+                etiqueta = _etiqueta(nombre)
+                for clave, valor in datos.percentiles().items():
+                    if valor is not None:
+                        lineas.append(f'ventas_peticion_duracion_percentil_segundos{{vista="{etiqueta}",percentil="{clave[1:]}"}} {valor / 1000:.6f}')
+
+            contadores = [
+                ('ventas_peticiones_errores_total', 'Respuestas 5xx por vista.', lambda d: d.errores),
+                ('ventas_consultas_total', 'Consultas SQL ejecutadas por vista.', lambda d: d.consultas),
+                ('ventas_consultas_segundos_total', 'Tiempo en la base de datos por vista.', lambda d: f'{d.tiempo_consultas:.6f}'),
+                ('ventas_plantillas_segundos_total', 'Tiempo renderizando plantillas por vista.', lambda d: f'{d.tiempo_plantillas:.6f}'),
+                ('ventas_cache_aciertos_total', 'Aciertos del caché de análisis por vista.', lambda d: d.cache_aciertos),
+                ('ventas_cache_fallos_total', 'Fallos del caché de análisis por vista.', lambda d: d.cache_fallos),
+                ('ventas_n_mas_1_total', 'Peticiones con consultas repetidas (posible N+1).', lambda d: d.n_mas_1),
+            ]
+            for nombre_metrica, ayuda, valor in contadores:
+                cabecera(nombre_metrica, 'counter', ayuda)
+                for nombre, datos in vistas:
+                    lineas.append(f'{nombre_metrica}{{vista="{_etiqueta(nombre)}"}} {valor(datos)}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_metricas = None
+
+
+def metricas():
+    global _metricas
+    if _metricas is None:
+        _metricas = Metricas()
+    return _metricas
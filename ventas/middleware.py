@@ -0,0 +1,158 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+from . import metricas
+
+logger = logging.getLogger('ventas.instrumentacion')
+
+# Funciones que se muestran del perfil de cProfile, ordenadas por tiempo acumulado
+PERFIL_LINEAS = 40
+
+
+def _instrumentar_plantillas():
+    # Se envuelve una sola vez el render del backend de Django: cubre
+    # render() y render_to_string(), y como {% extends %} e {% include %} no
+    # pasan por aquí el tiempo de las plantillas anidadas no se cuenta dos veces
+    if getattr(Template.render, '_instrumentado', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, context=None, request=None):
+        inicio = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            metricas.sumar_plantilla(time.perf_counter() - inicio)
+
+    render._instrumentado = True
+    Template.render = render
+
+
+def _envolver_consulta(execute, sql, params, many, context):
+    registro = metricas.registro_actual()
+    if registro is None:
+        return execute(sql, params, many, context)
+    return registro.envolver_consulta(execute, sql, params, many, context)
+
+
+def _instalar_en_conexion(connection, **kwargs):
+    if _envolver_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_envolver_consulta)
+
+
+def instrumentar_consultas():
+    # Las conexiones son locales a cada hilo y, con vistas async, el ORM corre
+    # en otro hilo que el middleware. Por eso el wrapper queda instalado en
+    # todas las conexiones y busca la petición en curso en el ContextVar,
+    # que asgiref propaga a los hilos de sync_to_async
+    connection_created.connect(_instalar_en_conexion, dispatch_uid='ventas_instrumentacion')
+    for connection in connections.all(initialized_only=True):
+        _instalar_en_conexion(connection)
+
+
+class InstrumentacionMiddleware:
+    # Mide cada petición: tiempo total, número y tiempo de consultas SQL,
+    # tiempo de plantillas y aciertos/fallos del caché de análisis. Las
+    # consultas que se ejecutan al iterar una StreamingHttpResponse (las
+    # exportaciones) ocurren después de salir de aquí y no se cuentan.
+    # Admite WSGI y ASGI sin que Django tenga que adaptar la cadena.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+        _instrumentar_plantillas()
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        if not settings.INSTRUMENTACION_ACTIVA:
+            return self.get_response(request)
+
+        registro = metricas.RegistroPeticion(request.method, request.path)
+        token = metricas.activar(registro)
+        perfil = cProfile.Profile() if self._perfilar(request) else None
+        inicio = time.perf_counter()
+        try:
+            if perfil is not None:
+                perfil.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+        finally:
+            registro.duracion = time.perf_counter() - inicio
+            metricas.desactivar(token)
+
+        return self._completar(request, response, registro, perfil)
+
+    async def __acall__(self, request):
+        # Sin cProfile: en el event loop mediría también a las demás peticiones
+        if not settings.INSTRUMENTACION_ACTIVA:
+            return await self.get_response(request)
+
+        registro = metricas.RegistroPeticion(request.method, request.path)
+        token = metricas.activar(registro)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            registro.duracion = time.perf_counter() - inicio
+            metricas.desactivar(token)
+
+        return self._completar(request, response, registro, None)
+
+    def _completar(self, request, response, registro, perfil):
+        match = request.resolver_match
+        registro.vista = match.view_name if match else 'sin_ruta'
+        registro.status = response.status_code
+        if perfil is not None:
+            registro.perfil = self._formatear_perfil(perfil)
+
+        if registro.detectar_n_mas_1(settings.INSTRUMENTACION_UMBRAL_N_MAS_1):
+            peor = registro.n_mas_1[0]
+            logger.warning(
+                'Posible N+1 en %s: %d consultas, la más repetida %d veces: %s',
+                registro.vista, registro.consultas, peor['repeticiones'], peor['sql'],
+            )
+
+        metricas.metricas().registrar(registro)
+        if settings.INSTRUMENTACION_CABECERAS:
+            response['Server-Timing'] = (
+                f'total;dur={registro.duracion * 1000:.1f}, '
+                f'db;dur={registro.tiempo_consultas * 1000:.1f};desc="{registro.consultas} consultas", '
+                f'plantillas;dur={registro.tiempo_plantillas * 1000:.1f}'
+            )
+        return response
+
+    def _perfilar(self, request):
+        # cProfile sólo bajo demanda: ?perfil=1 de un usuario staff o una
+        # fracción aleatoria de las peticiones, y nunca si no está habilitado
+        if not settings.INSTRUMENTACION_PERFIL:
+            return False
+        if request.GET.get('perfil') == '1':
+            usuario = getattr(request, 'user', None)
+            return bool(usuario and usuario.is_staff)
+        muestreo = settings.INSTRUMENTACION_PERFIL_MUESTREO
+        return muestreo > 0 and random.random() < muestreo
+
+    def _formatear_perfil(self, perfil):
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(PERFIL_LINEAS)
+        return salida.getvalue()
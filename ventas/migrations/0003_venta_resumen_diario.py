@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def poblar_resumen(apps, schema_editor):
+    Venta = apps.get_model('ventas', 'Venta')
+    VentaResumenDiario = apps.get_model('ventas', 'VentaResumenDiario')
+    agregados = (
+        Venta.objects.values('fecha', 'producto_id', 'estado')
+        .annotate(suma_total=Sum('total'), suma_cantidad=Sum('cantidad'), conteo=Count('id'))
+        .order_by()
+    )
+    VentaResumenDiario.objects.bulk_create(
+        (
+            VentaResumenDiario(
+                fecha=fila['fecha'], producto_id=fila['producto_id'], estado=fila['estado'],
+                total=fila['suma_total'], cantidad=fila['suma_cantidad'], num_ventas=fila['conteo'],
+            )
+            for fila in agregados.iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0002_venta_estado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('completada', 'Completada'), ('pendiente', 'Pendiente'), ('cancelada', 'Cancelada')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('num_ventas', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ventas.producto')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ventaresumendiario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'producto', 'estado'), name='resumen_diario_unico'),
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
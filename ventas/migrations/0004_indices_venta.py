@@ -0,0 +1,53 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Índice cubriente para sumas de total/cantidad por rango de fechas sin leer
+# la tabla (index-only scan). INCLUDE solo existe en Postgres.
+INDICE_CUBRIENTE = 'venta_fecha_cubriente_idx'
+
+
+def crear_indice_cubriente(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDICE_CUBRIENTE} ON ventas_venta (fecha) '
+            'INCLUDE (total, cantidad, producto_id, estado)'
+        )
+
+
+def borrar_indice_cubriente(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_CUBRIENTE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0003_venta_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venta',
+            name='producto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ventas.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['producto', 'fecha'], name='venta_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['fecha'], name='venta_pendiente_fecha_idx'),
+        ),
+        migrations.RunPython(crear_indice_cubriente, borrar_indice_cubriente),
+    ]
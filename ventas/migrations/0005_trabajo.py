@@ -0,0 +1,41 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:04
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_indices_venta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('excel', 'Exportación a Excel'), ('csv', 'Exportación a CSV'), ('grafico', 'Gráfico PNG')], max_length=20)),
+                ('parametros', models.JSONField(default=dict)),
+                ('huella', models.CharField(max_length=40)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('expira', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx'), models.Index(fields=['huella', 'estado'], name='trabajo_huella_estado_idx'), models.Index(fields=['expira'], name='trabajo_expira_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trabajo',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'en_proceso'])), fields=('huella',), name='trabajo_en_curso_unico'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:11
+
+from django.db import DatabaseError, migrations, models, transaction
+
+# Índices para buscar productos por nombre sin distinguir mayúsculas
+# (catalogo.buscar). istartswith se traduce distinto en cada motor:
+#   SQLite:   nombre LIKE 'abc%'            -> índice con COLLATE NOCASE
+#   Postgres: UPPER(nombre) LIKE UPPER('abc%') -> índice sobre UPPER con
+#             text_pattern_ops, y trigramas para icontains si pg_trgm está
+#             disponible (crear la extensión requiere permisos)
+INDICE_PREFIJO = 'producto_nombre_prefijo_idx'
+INDICE_TRIGRAMAS = 'producto_nombre_trgm_idx'
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDICE_PREFIJO} ON ventas_producto (nombre COLLATE NOCASE)'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDICE_PREFIJO} ON ventas_producto (UPPER(nombre::text) text_pattern_ops)'
+        )
+        try:
+            # En un savepoint: si falta la extensión o los permisos, la
+            # búsqueda por subcadena sigue funcionando sin índice
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {INDICE_TRIGRAMAS} ON ventas_producto '
+                    'USING gin (UPPER(nombre::text) gin_trgm_ops)'
+                )
+        except DatabaseError:
+            pass
+
+
+def borrar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_PREFIJO}')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_TRIGRAMAS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0005_trabajo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+        ),
+        migrations.RunPython(crear_indices_busqueda, borrar_indices_busqueda),
+    ]
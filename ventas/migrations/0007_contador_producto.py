@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def llenar_contadores(apps, schema_editor):
+    # Contadores iniciales a partir de las ventas existentes; después los
+    # mantienen las señales y reconciliar_contadores
+    Venta = apps.get_model('ventas', 'Venta')
+    ContadorProducto = apps.get_model('ventas', 'ContadorProducto')
+    agregados = {'unidades': Sum('cantidad'), 'ingresos': Sum('total'), 'num_ventas': Count('id'), 'ultima_venta': Max('fecha')}
+    contadores = [
+        ContadorProducto(producto_id=fila.pop('producto_id'), estado=fila.pop('estado'), **fila)
+        for fila in Venta.objects.values('producto_id', 'estado').annotate(**agregados).order_by()
+    ] + [
+        ContadorProducto(producto_id=fila.pop('producto_id'), estado='', **fila)
+        for fila in Venta.objects.values('producto_id').annotate(**agregados).order_by()
+    ]
+    ContadorProducto.objects.bulk_create(contadores, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0006_indices_producto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(blank=True, max_length=20)),
+                ('unidades', models.BigIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_ventas', models.IntegerField(default=0)),
+                ('ultima_venta', models.DateField(blank=True, null=True)),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ventas.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', '-unidades', 'producto'], name='contador_ranking_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='contadorproducto',
+            constraint=models.UniqueConstraint(fields=('producto', 'estado'), name='contador_producto_unico'),
+        ),
+        migrations.RunPython(llenar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0007_contador_producto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('reposicion', 'Reposición'), ('cancelacion', 'Cancelación de venta'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.CheckConstraint(check=models.Q(('stock__gte', 0), ('stock__isnull', True), _connector='OR'), name='producto_stock_no_negativo'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='producto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ventas.producto'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='venta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ventas.venta'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', 'creado'], name='movimiento_producto_idx'),
+        ),
+    ]
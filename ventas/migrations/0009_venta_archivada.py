@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0008_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('fecha', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('estado', models.CharField(choices=[('completada', 'Completada'), ('pendiente', 'Pendiente'), ('cancelada', 'Cancelada')], max_length=20)),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ventas.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'id'], name='archivada_fecha_idx'), models.Index(fields=['producto', 'fecha'], name='archivada_producto_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0009_venta_archivada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajo',
+            name='generacion',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
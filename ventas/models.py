@@ -1,8 +1,24 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
 class Producto(models.Model):
     nombre = models.CharField(max_length=100)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
+    # Unidades disponibles; vacío = producto sin control de stock. Sólo lo
+    # modifica ventas/inventario.py, con UPDATE condicionados
+    stock = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        # Orden de lista_productos. La búsqueda por prefijo sin distinguir
+        # mayúsculas usa los índices propios de cada motor (migración 0006)
+        indexes = [
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(stock__gte=0) | models.Q(stock__isnull=True), name='producto_stock_no_negativo'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -14,11 +30,172 @@ class Venta(models.Model):
         ('cancelada', 'Cancelada'),
     ]
 
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    # El índice (producto, fecha) ya sirve para las búsquedas por producto
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)
     cantidad = models.PositiveIntegerField()
     fecha = models.DateField()
     total = models.DecimalField(max_digits=10, decimal_places=2)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
 
+    class Meta:
+        # Índices pensados para los filtros de ventas_filtradas, la
+        # paginación por (fecha, id) y los agrupamientos por fecha. En
+        # Postgres la migración 0004 agrega además un índice cubriente.
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+            models.Index(fields=['producto', 'fecha'], name='venta_producto_fecha_idx'),
+            models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+            models.Index(fields=['fecha'], name='venta_pendiente_fecha_idx', condition=models.Q(estado='pendiente')),
+        ]
+
+    def __str__(self):
+        return f'{self.producto.nombre} - {self.fecha}'
+
+
+class VentaArchivada(models.Model):
+    # Ventas viejas que archivar_ventas movió fuera de Venta (ver
+    # ventas/archivo.py). Conservan el id original y son de sólo lectura: el
+    # resumen diario y los contadores ya las cuentan, así que moverlas no
+    # dispara señales ni cambia los tableros
+    id = models.BigIntegerField(primary_key=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)
+    cantidad = models.PositiveIntegerField()
+    fecha = models.DateField()
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    estado = models.CharField(max_length=20, choices=Venta.ESTADO_CHOICES)
+
+    class Meta:
+        # Los mismos recorridos que en Venta: por (fecha, id) y por producto
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='archivada_fecha_idx'),
+            models.Index(fields=['producto', 'fecha'], name='archivada_producto_fecha_idx'),
+        ]
+
     def __str__(self):
         return f'{self.producto.nombre} - {self.fecha}'
+
+
+class VentaResumenDiario(models.Model):
+    # Acumulado de ventas por día, producto y estado. Se mantiene de forma
+    # incremental desde ventas/signals.py y ventas/resumen.py
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    estado = models.CharField(max_length=20, choices=Venta.ESTADO_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad = models.BigIntegerField(default=0)
+    num_ventas = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'estado'], name='resumen_diario_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.fecha} - {self.producto_id} - {self.estado}'
+
+
+class MovimientoStock(models.Model):
+    # Libro de movimientos de stock: la suma de `cantidad` de un producto
+    # explica su stock actual (ver ventas/inventario.py)
+    TIPO_CHOICES = [
+        ('venta', 'Venta'),
+        ('reposicion', 'Reposición'),
+        ('cancelacion', 'Cancelación de venta'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    # El índice (producto, creado) ya sirve para las búsquedas por producto
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)
+    cantidad = models.IntegerField()  # negativa para las salidas
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'creado'], name='movimiento_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.producto_id} {self.tipo} {self.cantidad:+d}'
+
+
+class ContadorProducto(models.Model):
+    # Totales acumulados por producto y estado para el ranking de más
+    # vendidos, mantenidos con F() desde ventas/signals.py y ventas/contadores.py.
+    # La fila con estado '' (TODOS) suma todos los estados, así el ranking sin
+    # filtro también es un ORDER BY ... LIMIT sobre contador_ranking_idx
+    TODOS = ''
+
+    # La restricción (producto, estado) ya sirve para buscar por producto
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)
+    estado = models.CharField(max_length=20, blank=True)
+    unidades = models.BigIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_ventas = models.IntegerField(default=0)
+    # Sólo avanza: un borrado no la retrocede hasta reconciliar_contadores
+    ultima_venta = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'estado'], name='contador_producto_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', '-unidades', 'producto'], name='contador_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.producto_id} - {self.estado or "todos"}: {self.unidades}'
+
+
+class Trabajo(models.Model):
+    # Exportaciones e informes que se generan fuera de la petición (ver
+    # ventas/trabajos.py y el comando procesar_trabajos)
+    TIPO_CHOICES = [
+        ('excel', 'Exportación a Excel'),
+        ('csv', 'Exportación a CSV'),
+        ('grafico', 'Gráfico PNG'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    # UUID: el id se devuelve al cliente y no debe poder adivinarse
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict)
+    # Hash de tipo + filtros normalizados
+    huella = models.CharField(max_length=40)
+    # Generación del caché con la que se generó el archivo: un completado
+    # sólo se reutiliza mientras no cambien las ventas
+    generacion = models.BigIntegerField(null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Un solo trabajo en curso por huella: dos pedidos iguales
+            # simultáneos comparten el mismo
+            models.UniqueConstraint(
+                fields=['huella'],
+                condition=models.Q(estado__in=['pendiente', 'en_proceso']),
+                name='trabajo_en_curso_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx'),
+            models.Index(fields=['huella', 'estado'], name='trabajo_huella_estado_idx'),
+            models.Index(fields=['expira'], name='trabajo_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.tipo} {self.id} ({self.estado})'
@@ -0,0 +1,96 @@
+from datetime import date
+
+from django.db.models import Q
+
+
+class PaginaCursor:
+    # Página obtenida por keyset sobre (fecha, id) descendente. A diferencia
+    # de Paginator no hace COUNT(*) ni OFFSET: cada página cuesta lo mismo
+    def __init__(self, object_list, hay_anteriores, hay_siguientes):
+        self.object_list = object_list
+        self.hay_anteriores = hay_anteriores
+        self.hay_siguientes = hay_siguientes
+
+    def has_previous(self):
+        return self.hay_anteriores
+
+    def has_next(self):
+        return self.hay_siguientes
+
+    @property
+    def cursor_anterior(self):
+        return codificar_cursor(self.object_list[0]) if self.object_list else ''
+
+    @property
+    def cursor_siguiente(self):
+        return codificar_cursor(self.object_list[-1]) if self.object_list else ''
+
+
+def codificar_cursor(venta):
+    return f'{venta.fecha.isoformat()}_{venta.pk}'
+
+
+def decodificar_cursor(cursor):
+    # Devuelve (fecha, id) o None si el cursor no es válido
+    try:
+        fecha, pk = cursor.split('_')
+        return date.fromisoformat(fecha), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _consulta_pagina(queryset, despues, antes, ultima, por_pagina):
+    # Devuelve el slice a evaluar (una fila de más para saber si hay otra
+    # página) y una función que arma la PaginaCursor con las filas obtenidas
+    despues = decodificar_cursor(despues)
+    antes = decodificar_cursor(antes)
+
+    if antes or ultima:
+        # Se recorre en orden ascendente y se invierte el resultado
+        if antes:
+            fecha, pk = antes
+            queryset = queryset.filter(Q(fecha__gt=fecha) | Q(fecha=fecha, pk__gt=pk))
+
+        def armar(filas):
+            hay_anteriores = len(filas) > por_pagina
+            return PaginaCursor(filas[:por_pagina][::-1], hay_anteriores, hay_siguientes=bool(antes))
+
+        return queryset.order_by('fecha', 'pk')[:por_pagina + 1], armar
+
+    if despues:
+        fecha, pk = despues
+        queryset = queryset.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, pk__lt=pk))
+
+    def armar(filas):
+        hay_siguientes = len(filas) > por_pagina
+        return PaginaCursor(filas[:por_pagina], hay_anteriores=bool(despues), hay_siguientes=hay_siguientes)
+
+    return queryset.order_by('-fecha', '-pk')[:por_pagina + 1], armar
+
+
+def _mezclar(filas, archivadas, despues, antes, ultima, por_pagina):
+    # Las dos páginas vienen en el mismo orden de recorrido: se quedan las
+    # primeras por_pagina + 1 de la unión, que es lo que espera armar()
+    descendente = not (decodificar_cursor(antes) or ultima)
+    filas = sorted(filas + archivadas, key=lambda venta: (venta.fecha, venta.pk), reverse=descendente)
+    return filas[:por_pagina + 1]
+
+
+def paginar_por_cursor(queryset, despues=None, antes=None, ultima=False, por_pagina=10, archivo=None):
+    # `archivo`: las ventas archivadas del mismo filtro (ver
+    # FiltroVentas.filtrar_archivo); se pagina sobre las dos tablas a la vez
+    consulta, armar = _consulta_pagina(queryset, despues, antes, ultima, por_pagina)
+    filas = list(consulta)
+    if archivo is not None:
+        consulta_archivo, _ = _consulta_pagina(archivo, despues, antes, ultima, por_pagina)
+        filas = _mezclar(filas, list(consulta_archivo), despues, antes, ultima, por_pagina)
+    return armar(filas)
+
+
+async def apaginar_por_cursor(queryset, despues=None, antes=None, ultima=False, por_pagina=10, archivo=None):
+    consulta, armar = _consulta_pagina(queryset, despues, antes, ultima, por_pagina)
+    filas = [fila async for fila in consulta]
+    if archivo is not None:
+        consulta_archivo, _ = _consulta_pagina(archivo, despues, antes, ultima, por_pagina)
+        filas = _mezclar(filas, [fila async for fila in consulta_archivo], despues, antes, ultima, por_pagina)
+    return armar(filas)
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+# Etiquetas de los períodos de las estadísticas. Las usan agregaciones.py
+# (sobre arrays de NumPy) y los deltas en tiempo real (sobre una sola
+# fecha), así que este módulo no importa NumPy.
+GRANULARIDADES = ('semana', 'mes', 'trimestre', 'anio')
+
+
+def etiqueta(granularidad, inicio):
+    if granularidad == 'semana':
+        anio, semana, _ = inicio.isocalendar()
+        return f'{anio}-W{semana:02d}'
+    if granularidad == 'mes':
+        return f'{inicio.year}-{inicio.month:02d}'
+    if granularidad == 'trimestre':
+        return f'{inicio.year}-Q{(inicio.month - 1) // 3 + 1}'
+    return str(inicio.year)
+
+
+def inicio_periodo(granularidad, fecha):
+    if granularidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    if granularidad == 'trimestre':
+        return fecha.replace(month=(fecha.month - 1) // 3 * 3 + 1, day=1)
+    return fecha.replace(month=1, day=1)
+
+
+def etiquetas(fecha):
+    # {'semana': '2024-W18', 'mes': '2024-05', 'trimestre': '2024-Q2', 'anio': '2024'}
+    return {granularidad: etiqueta(granularidad, inicio_periodo(granularidad, fecha)) for granularidad in GRANULARIDADES}
+
+
+def inicios(fecha):
+    # Inicio de cada período en ISO, como lo devuelve /api/ventas/serie/
+    return {granularidad: inicio_periodo(granularidad, fecha).isoformat() for granularidad in GRANULARIDADES}
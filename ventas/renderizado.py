@@ -0,0 +1,32 @@
+# Funciones de dibujo que se ejecutan en los procesos del pool de gráficos.
+# Este módulo no importa Django: los procesos hijos se crean con 'spawn' y
+# solo necesitan matplotlib para rasterizar.
+import os
+import tempfile
+from datetime import date
+
+
+def renderizar_serie_png(fechas, totales, ruta, titulo='Ventas Totales por Fecha'):
+    import matplotlib
+    matplotlib.use('Agg')  # Backend sin GUI
+    from matplotlib.figure import Figure
+
+    # Se usa la API orientada a objetos (Figure) y no el estado global de
+    # pyplot, que no es seguro entre hilos
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot([date.fromisoformat(fecha) for fecha in fechas], totales, marker='o', linestyle='-', color='b')
+    ax.set_title(titulo)
+    ax.set_xlabel('Fecha')
+    ax.set_ylabel('Total')
+    fig.autofmt_xdate()
+
+    # Se escribe en un temporal y se renombra, para que nunca se sirva un
+    # PNG a medio escribir
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        fig.savefig(archivo, format='png')
+    os.replace(temporal, ruta)
+    return ruta
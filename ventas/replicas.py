@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Lecturas de análisis y listados contra una réplica (DATABASE_REPLICA_URL)
+# y todo lo demás contra la primaria. El middleware marca en un ContextVar
+# las peticiones GET de las vistas de REPLICA_VISTAS y el router sólo manda
+# a la réplica las lecturas de esas peticiones. Quien acaba de escribir
+# (POST, PUT, ...) recibe una cookie que lo deja leyendo de la primaria
+# durante REPLICA_PEGAJOSA_SEGUNDOS, para que vea sus propios cambios
+# aunque la réplica vaya atrasada.
+COOKIE = 'ventas_primaria'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+_en_replica = ContextVar('ventas_lectura_replica', default=False)
+
+
+def hay_replica():
+    return settings.REPLICA_ALIAS in connections.databases
+
+
+def usar_replica(activa):
+    # Devuelve el token para restaurar con restaurar(); sirve también fuera
+    # de una petición (comandos, tareas)
+    return _en_replica.set(activa and hay_replica())
+
+
+def restaurar(token):
+    _en_replica.reset(token)
+
+
+@contextmanager
+def en_primaria():
+    # Para lo que se guarda en el caché compartido: se guarda bajo la
+    # generación (o revisión) que ya ve la primaria, así que calcularlo con
+    # la réplica atrasada dejaría datos viejos cacheados como nuevos, también
+    # para quien tiene la cookie de COOKIE. Sirve en corrutinas: sync_to_async
+    # copia el contexto
+    token = _en_replica.set(False)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get() or model._meta.app_label != 'ventas':
+            # Usuarios y sesiones siempre de la primaria: un login recién
+            # hecho todavía puede no estar en la réplica
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Dentro de una transacción se lee lo que ella misma escribió
+            return None
+        return settings.REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Después de escribir, el resto de la petición lee de la primaria
+        _en_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Son los mismos datos: una venta leída en la réplica puede apuntar
+        # a un producto leído en la primaria
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación (o por copia, ver
+        # copiar_replica), nunca por migrate
+        return db != settings.REPLICA_ALIAS
+
+
+class ReplicaMiddleware:
+    # Va después de AuthenticationMiddleware. La vista se conoce recién en
+    # process_view, así que ahí se activa la réplica y en __call__ se
+    # restaura. Lo que una StreamingHttpResponse consulte al iterarse
+    # (exportaciones) ocurre después y va a la primaria.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        token = _en_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _en_replica.reset(token)
+        return self._despues(request, response)
+
+    async def __acall__(self, request):
+        token = _en_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _en_replica.reset(token)
+        return self._despues(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in METODOS_SEGUROS
+            and COOKIE not in request.COOKIES
+            and request.resolver_match.view_name in settings.REPLICA_VISTAS
+        ):
+            usar_replica(True)
+        return None
+
+    def _despues(self, request, response):
+        if request.method not in METODOS_SEGUROS and response.status_code < 400 and hay_replica():
+            response.set_cookie(
+                COOKIE, '1', max_age=settings.REPLICA_PEGAJOSA_SEGUNDOS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Venta, VentaArchivada, VentaResumenDiario
+
+TAMANO_LOTE = 2000
+# Motores con INSERT ... ON CONFLICT DO UPDATE
+UPSERT_VENDORS = {'sqlite', 'postgresql'}
+
+
+def aplicar_delta(fecha, producto_id, estado, total, cantidad, num_ventas):
+    # Suma (o resta, con valores negativos) un delta sobre la fila del día
+    total = Decimal(str(total))
+    filas = VentaResumenDiario.objects.filter(fecha=fecha, producto_id=producto_id, estado=estado)
+    actualizadas = filas.update(
+        total=F('total') + total,
+        cantidad=F('cantidad') + cantidad,
+        num_ventas=F('num_ventas') + num_ventas,
+    )
+    if actualizadas or num_ventas <= 0:
+        # Un delta negativo sin fila previa no tiene nada que descontar
+        # (por ejemplo, cuando el producto se está borrando en cascada)
+        return
+
+    try:
+        with transaction.atomic():
+            VentaResumenDiario.objects.create(
+                fecha=fecha, producto_id=producto_id, estado=estado,
+                total=total, cantidad=cantidad, num_ventas=num_ventas,
+            )
+    except IntegrityError:
+        # Otra escritura creó la fila en paralelo: se vuelve a sumar sobre ella
+        filas.update(
+            total=F('total') + total,
+            cantidad=F('cantidad') + cantidad,
+            num_ventas=F('num_ventas') + num_ventas,
+        )
+
+
+def registrar_ventas(ventas, signo=1):
+    # Camino para escrituras masivas (bulk_create, borrados en lote)
+    registrar_filas(
+        ((venta.fecha, venta.producto_id, venta.estado, venta.total, venta.cantidad) for venta in ventas),
+        signo,
+    )
+
+
+def registrar_filas(filas, signo=1):
+    # Igual que registrar_ventas pero con tuplas (fecha, producto_id, estado,
+    # total, cantidad). Agrupa los deltas por clave y los aplica con un único
+    # upsert incremental
+    deltas = defaultdict(lambda: [Decimal('0'), 0, 0])
+    for fecha, producto_id, estado, total, cantidad in filas:
+        delta = deltas[(fecha, producto_id, estado)]
+        delta[0] += total if isinstance(total, Decimal) else Decimal(str(total))
+        delta[1] += cantidad
+        delta[2] += 1
+
+    _sumar([
+        (fecha, producto_id, estado, signo * total, signo * cantidad, signo * num_ventas)
+        for (fecha, producto_id, estado), (total, cantidad, num_ventas) in deltas.items()
+    ])
+
+
+def _sumar(filas):
+    # Aplica filas (fecha, producto_id, estado, total, cantidad, num_ventas)
+    # sumándolas sobre las existentes
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert(filas)
+    else:
+        for fila in filas:
+            aplicar_delta(*fila)
+
+
+def cambiar_estado(filas, nuevo):
+    # Las ventas (fecha, producto_id, estado, total, cantidad) pasaron al
+    # estado `nuevo`: se restan de la fila de su estado y se suman a la del nuevo
+    filas = list(filas)
+    registrar_filas(filas, -1)
+    registrar_filas((fecha, producto_id, nuevo, total, cantidad) for fecha, producto_id, _, total, cantidad in filas)
+
+
+def _upsert(filas):
+    # INSERT ... ON CONFLICT DO UPDATE sumando sobre la fila existente: es
+    # atómico y no necesita bloqueos (misma sintaxis en SQLite y Postgres).
+    # Los deltas negativos sin fila previa no tienen nada que descontar.
+    # Ambos drivers aceptan date y Decimal tal cual
+    tabla = connection.ops.quote_name(VentaResumenDiario._meta.db_table)
+    positivas = [fila for fila in filas if fila[5] > 0]
+    negativas = [fila for fila in filas if fila[5] <= 0]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabla} (fecha, producto_id, estado, total, cantidad, num_ventas) '
+            'VALUES (%s, %s, %s, %s, %s, %s) '
+            'ON CONFLICT (fecha, producto_id, estado) DO UPDATE SET '
+            f'total = {tabla}.total + EXCLUDED.total, '
+            f'cantidad = {tabla}.cantidad + EXCLUDED.cantidad, '
+            f'num_ventas = {tabla}.num_ventas + EXCLUDED.num_ventas',
+            positivas,
+        )
+    for fila in negativas:
+        aplicar_delta(*fila)
+
+
+def _agregados(modelo):
+    return (
+        modelo.objects.values('fecha', 'producto_id', 'estado')
+        .annotate(suma_total=Sum('total'), suma_cantidad=Sum('cantidad'), conteo=Count('id'))
+        .order_by()
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+
+
+@transaction.atomic
+def reconstruir():
+    # Recalcula el resumen completo a partir de la tabla de ventas y del
+    # archivo (ver ventas/archivo.py)
+    VentaResumenDiario.objects.all().delete()
+    lote = []
+    for fila in _agregados(Venta):
+        lote.append(VentaResumenDiario(
+            fecha=fila['fecha'], producto_id=fila['producto_id'], estado=fila['estado'],
+            total=fila['suma_total'], cantidad=fila['suma_cantidad'], num_ventas=fila['conteo'],
+        ))
+        if len(lote) >= TAMANO_LOTE:
+            VentaResumenDiario.objects.bulk_create(lote)
+            lote = []
+    VentaResumenDiario.objects.bulk_create(lote)
+
+    # Un día puede tener ventas en las dos tablas (una venta cargada con
+    # fecha vieja después de archivar): las archivadas se suman encima
+    lote = []
+    for fila in _agregados(VentaArchivada):
+        lote.append((
+            fila['fecha'], fila['producto_id'], fila['estado'],
+            fila['suma_total'], fila['suma_cantidad'], fila['conteo'],
+        ))
+        if len(lote) >= TAMANO_LOTE:
+            _sumar(lote)
+            lote = []
+    _sumar(lote)
+    return VentaResumenDiario.objects.count()
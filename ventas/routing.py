@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/ventas/', consumers.TableroVentasConsumer.as_asgi(), name='ws_ventas'),
+]
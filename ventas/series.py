@@ -0,0 +1,240 @@
+import time
+from bisect import bisect_left
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import VentaResumenDiario
+from .periodos import inicio_periodo
+from .replicas import en_primaria
+
+# Series de tiempo materializadas para los gráficos: total vendido por día,
+# semana y mes, en centavos enteros. Se guardan en el caché compartido (y
+# en memoria de cada proceso) junto con la revisión con la que se
+# calcularon. Cada escritura del resumen diario deja una marca con el primer
+# día afectado; al leer, sólo se recalculan los buckets desde la marca más
+# antigua pendiente, no la serie entera.
+AGRUPACIONES = ('dia', 'semana', 'mes')
+REVISION_CLAVE = 'series:revision'
+MARCAS_TIMEOUT = 60 * 60 * 24
+# Con más marcas pendientes que esto se recalcula todo: es más barato que
+# leerlas
+MARCAS_MAXIMO = 500
+PUNTOS_MINIMO = 3
+REDUCIDAS_MAXIMO = 64
+
+_memoria = {}
+_reducidas = {}
+
+
+def _clave_marca(revision):
+    return f'series:marca:{revision}'
+
+
+def _clave_materializada():
+    return f'series:{settings.ANALITICA_FUENTE}:materializada'
+
+
+def revision():
+    valor = cache.get(REVISION_CLAVE)
+    if valor is None:
+        # Como en cache_ventas: partir de la hora actual para no reutilizar
+        # revisiones de series que sigan en el caché
+        cache.add(REVISION_CLAVE, int(time.time() * 1000), timeout=None)
+        valor = cache.get(REVISION_CLAVE)
+    return valor
+
+
+def _registrar(desde):
+    if not settings.CACHE_INCR_ATOMICO:
+        # En disco dos incrementos simultáneos pueden quedar en uno: la
+        # revisión sale del reloj y el salto, sin marcas, recalcula todo
+        anterior = cache.get(REVISION_CLAVE) or 0
+        cache.set(REVISION_CLAVE, max(time.time_ns() // 1000, anterior + MARCAS_MAXIMO + 1), timeout=None)
+        return
+    try:
+        numero = cache.incr(REVISION_CLAVE)
+    except ValueError:
+        # Sin revisión no hay serie que refrescar: la próxima lectura recalcula todo
+        revision()
+        return
+    cache.set(_clave_marca(numero), desde.isoformat() if desde else '', MARCAS_TIMEOUT)
+
+
+def marcar(*fechas):
+    # Cambiaron los totales de esos días (date o ISO): se refresca desde el
+    # más antiguo. Sin fechas, toda la serie. Dentro de una transacción se
+    # marca ahora (para esta misma conexión) y otra vez al confirmar, porque
+    # otro proceso pudo refrescar entre medio sin ver todavía el cambio
+    desde = min(
+        (date.fromisoformat(fecha) if isinstance(fecha, str) else fecha for fecha in fechas), default=None
+    )
+    _registrar(desde)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _registrar(desde))
+
+
+def _diaria(desde=None):
+    # (fechas, centavos) por día desde `desde`, de la fuente de la analítica
+    if settings.ANALITICA_FUENTE == 'instantaneas':
+        # numpy sólo se carga si la analítica sale de las instantáneas
+        from . import instantaneas
+
+        columnas = instantaneas.columnas_diarias(desde=desde)
+        if columnas is not None:
+            fechas, centavos, _ = columnas
+            return fechas.tolist(), centavos.tolist()
+
+    filas = VentaResumenDiario.objects.all()
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+    filas = filas.values('fecha').annotate(total=Sum('total')).order_by('fecha').values_list('fecha', 'total')
+    fechas, centavos = [], []
+    for fecha, total in filas:
+        fechas.append(fecha)
+        centavos.append(round(total * 100))
+    return fechas, centavos
+
+
+def _agrupar(agrupacion, fechas, centavos):
+    if agrupacion == 'dia':
+        return list(fechas), list(centavos)
+    inicios, sumas = [], []
+    for fecha, valor in zip(fechas, centavos):
+        inicio = inicio_periodo(agrupacion, fecha)
+        if inicios and inicios[-1] == inicio:
+            sumas[-1] += valor
+        else:
+            inicios.append(inicio)
+            sumas.append(valor)
+    return inicios, sumas
+
+
+def _calcular(numero):
+    fechas, centavos = _diaria()
+    datos = {'revision': numero}
+    for agrupacion in AGRUPACIONES:
+        datos[agrupacion] = _agrupar(agrupacion, fechas, centavos)
+    return datos
+
+
+def _refrescar_cola(datos, numero, desde):
+    # Reemplaza los días desde `desde` y los buckets de semana y mes que los
+    # contienen; lo anterior se reutiliza tal cual
+    fechas_cola, centavos_cola = _diaria(desde)
+    fechas, centavos = datos['dia']
+    corte = bisect_left(fechas, desde)
+    fechas = fechas[:corte] + fechas_cola
+    centavos = centavos[:corte] + centavos_cola
+
+    nuevos = {'revision': numero, 'dia': (fechas, centavos)}
+    for agrupacion in ('semana', 'mes'):
+        inicio = inicio_periodo(agrupacion, desde)
+        inicios, sumas = datos[agrupacion]
+        corte_grupo = bisect_left(inicios, inicio)
+        corte_dia = bisect_left(fechas, inicio)
+        inicios_cola, sumas_cola = _agrupar(agrupacion, fechas[corte_dia:], centavos[corte_dia:])
+        nuevos[agrupacion] = (inicios[:corte_grupo] + inicios_cola, sumas[:corte_grupo] + sumas_cola)
+    return nuevos
+
+
+def _desde_marcas(anterior, actual):
+    # El primer día afectado por las escrituras entre las dos revisiones, o
+    # None si hay que recalcular todo (demasiadas marcas o alguna perdida)
+    if actual - anterior > MARCAS_MAXIMO:
+        return None
+    claves = [_clave_marca(numero) for numero in range(anterior + 1, actual + 1)]
+    marcas = cache.get_many(claves)
+    if len(marcas) < len(claves) or '' in marcas.values():
+        return None
+    return date.fromisoformat(min(marcas.values()))
+
+
+def materializada():
+    # {'revision', 'dia', 'semana', 'mes'}, cada agrupación como listas
+    # (inicios, centavos) en orden de fecha, al día con la revisión actual
+    clave = _clave_materializada()
+    actual = revision()
+    datos = _memoria.get(clave)
+    if datos is not None and datos['revision'] == actual:
+        return datos
+
+    compartida = cache.get(clave)
+    if compartida is not None and (datos is None or compartida['revision'] > datos['revision']):
+        datos = compartida
+    if datos is not None and datos['revision'] == actual:
+        _memoria[clave] = datos
+        return datos
+    with en_primaria():
+        if datos is None or datos['revision'] > actual:
+            datos = _calcular(actual)
+        else:
+            desde = _desde_marcas(datos['revision'], actual)
+            datos = _calcular(actual) if desde is None else _refrescar_cola(datos, actual, desde)
+
+    cache.set(clave, datos, timeout=None)
+    _memoria[clave] = datos
+    return datos
+
+
+def lttb(xs, ys, puntos):
+    # Largest-Triangle-Three-Buckets: se queda con `puntos` puntos de la
+    # serie eligiendo en cada bucket el que forma el triángulo más grande
+    # con el elegido antes y el promedio del bucket siguiente. Conserva
+    # picos y valles, a diferencia de promediar. Devuelve los índices elegidos
+    total = len(xs)
+    if puntos >= total or puntos < PUNTOS_MINIMO:
+        return list(range(total))
+
+    ancho = (total - 2) / (puntos - 2)
+    elegidos = [0]
+    anterior = 0
+    for bucket in range(puntos - 2):
+        inicio = int(bucket * ancho) + 1
+        fin = int((bucket + 1) * ancho) + 1
+        # El promedio del bucket siguiente; para el último es el punto final
+        siguiente_inicio, siguiente_fin = fin, min(int((bucket + 2) * ancho) + 1, total)
+        cantidad = siguiente_fin - siguiente_inicio
+        promedio_x = sum(xs[siguiente_inicio:siguiente_fin]) / cantidad
+        promedio_y = sum(ys[siguiente_inicio:siguiente_fin]) / cantidad
+
+        ax, ay = xs[anterior], ys[anterior]
+        mejor, mejor_area = inicio, -1
+        for indice in range(inicio, fin):
+            area = abs((ax - promedio_x) * (ys[indice] - ay) - (ax - xs[indice]) * (promedio_y - ay))
+            if area > mejor_area:
+                mejor, mejor_area = indice, area
+        elegidos.append(mejor)
+        anterior = mejor
+    elegidos.append(total - 1)
+    return elegidos
+
+
+def serie(agrupacion='dia', puntos=None):
+    # {'agrupacion', 'fechas', 'totales'} lista para JSON, reducida con LTTB
+    # a `puntos` puntos si se pide. Cada proceso recuerda las series ya
+    # reducidas de la revisión actual
+    datos = materializada()
+    clave = (_clave_materializada(), datos['revision'], agrupacion, puntos)
+    resultado = _reducidas.get(clave)
+    if resultado is not None:
+        return resultado
+
+    inicios, centavos = datos[agrupacion]
+    if puntos:
+        indices = lttb([inicio.toordinal() for inicio in inicios], centavos, puntos)
+        if len(indices) < len(inicios):
+            inicios = [inicios[indice] for indice in indices]
+            centavos = [centavos[indice] for indice in indices]
+    resultado = {
+        'agrupacion': agrupacion,
+        'fechas': [inicio.isoformat() for inicio in inicios],
+        'totales': [valor / 100 for valor in centavos],
+    }
+    if len(_reducidas) >= REDUCIDAS_MAXIMO or any(vieja[1] != datos['revision'] for vieja in _reducidas):
+        _reducidas.clear()
+    _reducidas[clave] = resultado
+    return resultado
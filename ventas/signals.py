@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import archivo, autenticacion, cache_ventas, catalogo, contadores, resumen, series, tiempo_real
+from .models import Producto, Venta, VentaArchivada
+
+
+def _clave_y_valores(venta):
+    return (venta.fecha, venta.producto_id, venta.estado), (venta.total, venta.cantidad)
+
+
+def _nombre_producto(venta):
+    return venta.producto.nombre if Venta.producto.is_cached(venta) else None
+
+
+# Guarda los valores que tenía la venta en la base antes de editarla, para
+# poder descontarlos del resumen diario en post_save
+@receiver(pre_save, sender=Venta)
+def recordar_venta_anterior(sender, instance, raw, **kwargs):
+    instance._venta_anterior = None
+    if raw or instance.pk is None:
+        return
+    instance._venta_anterior = (
+        Venta.objects.filter(pk=instance.pk)
+        .values_list('fecha', 'producto_id', 'estado', 'total', 'cantidad')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Venta)
+def actualizar_resumen_al_guardar(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_venta_anterior', None)
+    deltas = []
+    fechas = [instance.fecha]
+    if anterior is not None:
+        fecha, producto_id, estado, total, cantidad = anterior
+        if ((fecha, producto_id, estado), (total, cantidad)) == _clave_y_valores(instance):
+            return
+        resumen.aplicar_delta(fecha, producto_id, estado, -total, -cantidad, -1)
+        contadores.aplicar_delta(fecha, producto_id, estado, -total, -cantidad, -1)
+        deltas.append(tiempo_real.delta(fecha, producto_id, -total, -cantidad, -1))
+        fechas.append(fecha)
+    resumen.aplicar_delta(instance.fecha, instance.producto_id, instance.estado, instance.total, instance.cantidad, 1)
+    contadores.aplicar_delta(instance.fecha, instance.producto_id, instance.estado, instance.total, instance.cantidad, 1)
+    deltas.append(tiempo_real.delta(
+        instance.fecha, instance.producto_id, instance.total, instance.cantidad, 1, _nombre_producto(instance)
+    ))
+    series.marcar(*fechas)
+    tiempo_real.publicar(deltas)
+
+
+@receiver(post_delete, sender=Venta)
+def actualizar_resumen_al_borrar(sender, instance, **kwargs):
+    resumen.aplicar_delta(instance.fecha, instance.producto_id, instance.estado, -instance.total, -instance.cantidad, -1)
+    contadores.aplicar_delta(instance.fecha, instance.producto_id, instance.estado, -instance.total, -instance.cantidad, -1)
+    series.marcar(instance.fecha)
+    tiempo_real.publicar([tiempo_real.delta(instance.fecha, instance.producto_id, -instance.total, -instance.cantidad, -1)])
+
+
+# Cualquier escritura de ventas o productos invalida las páginas cacheadas
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_cache(sender, **kwargs):
+    cache_ventas.invalidar()
+
+
+# El catálogo tiene su propia versión: sólo los productos la cambian
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_catalogo(sender, **kwargs):
+    catalogo.invalidar()
+
+
+# Borrar un producto se lleva sus ventas archivadas en cascada. No se
+# escucha el post_delete de VentaArchivada: eso le quitaría al borrado en
+# cascada el DELETE directo y cargaría cada fila archivada
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=VentaArchivada)
+def invalidar_fecha_maxima(sender, **kwargs):
+    archivo.invalidar_fecha_maxima()
+
+
+# El usuario cacheado por sesión o JWT (autenticacion.py) se descarta al
+# cambiar: contraseña, is_active o last_login
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidar_usuario(sender, instance, **kwargs):
+    autenticacion.invalidar_usuario(instance.pk)
@@ -0,0 +1,62 @@
+// Autocompletar para los <select data-autocompletar> de ProductoAutocompletar
+// (forms.py): el servidor sólo manda la opción elegida y las demás se piden
+// a /api/productos/buscar/ a medida que se escribe.
+const AUTOCOMPLETAR_ESPERA_MS = 250;
+const AUTOCOMPLETAR_MINIMO = 2;
+
+function reemplazarOpciones(select, productos) {
+    const elegida = select.selectedOptions[0];
+    const vacia = select.querySelector('option[value=""]');
+    select.replaceChildren();
+    if (vacia) {
+        select.appendChild(vacia);
+    }
+    if (elegida && elegida.value && !productos.some(p => String(p.id) === elegida.value)) {
+        select.appendChild(elegida);
+    }
+    productos.forEach(function (producto) {
+        const opcion = new Option(producto.nombre, producto.id);
+        opcion.selected = elegida && String(producto.id) === elegida.value;
+        select.appendChild(opcion);
+    });
+}
+
+function prepararAutocompletar(select) {
+    const buscador = document.createElement('input');
+    buscador.type = 'search';
+    buscador.placeholder = 'Buscar producto…';
+    buscador.className = 'form-control mb-1';
+    select.before(buscador);
+
+    let espera = null;
+    let pedido = null;
+    buscador.addEventListener('input', function () {
+        clearTimeout(espera);
+        const texto = buscador.value.trim();
+        if (texto.length < AUTOCOMPLETAR_MINIMO) {
+            return;
+        }
+        espera = setTimeout(async function () {
+            // Sólo cuenta la respuesta de la última búsqueda
+            if (pedido) {
+                pedido.abort();
+            }
+            pedido = new AbortController();
+            try {
+                const url = `${select.dataset.autocompletar}?q=${encodeURIComponent(texto)}`;
+                const respuesta = await fetch(url, {credentials: 'same-origin', signal: pedido.signal});
+                if (respuesta.ok) {
+                    reemplazarOpciones(select, (await respuesta.json()).resultados);
+                }
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    throw error;
+                }
+            }
+        }, AUTOCOMPLETAR_ESPERA_MS);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocompletar]').forEach(prepararAutocompletar);
+});
@@ -0,0 +1,29 @@
+// Dibuja con Plotly los gráficos declarados con data-grafico, pidiendo los
+// datos agregados a la API. Los gráficos quedan en window.graficosVentas
+// para poder actualizarlos después sin volver a pedir la página.
+window.graficosVentas = window.graficosVentas || {};
+
+function trazaGrafico(tipo, datos) {
+    if (tipo === 'barras') {
+        return {x: datos.productos, y: datos.cantidades, type: 'bar'};
+    }
+    return {x: datos.fechas, y: datos.totales, type: 'scatter', mode: 'lines+markers'};
+}
+
+async function cargarGrafico(elemento) {
+    const respuesta = await fetch(elemento.dataset.url, {credentials: 'same-origin'});
+    if (!respuesta.ok) {
+        elemento.textContent = 'No se pudieron cargar los datos del gráfico.';
+        return;
+    }
+    const datos = await respuesta.json();
+    const layout = {title: elemento.dataset.titulo};
+    Plotly.newPlot(elemento, [trazaGrafico(elemento.dataset.grafico, datos)], layout, {responsive: true});
+    // tiempo_real.js identifica las barras por id de producto
+    elemento.idsProductos = datos.ids || [];
+    window.graficosVentas[elemento.id] = elemento;
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-grafico]').forEach(cargarGrafico);
+});
@@ -0,0 +1,112 @@
+// Tablero en vivo: recibe por /ws/ventas/ los deltas de cada venta guardada
+// o borrada y los suma a los gráficos (window.graficosVentas, ver
+// graficos.js) y a las tablas marcadas con data-periodo, sin recargar la
+// página ni volver a pedir los agregados.
+(function () {
+    function numero(valor) {
+        return Number.parseFloat(valor) || 0;
+    }
+
+    function aplicarSerie(elemento, delta) {
+        const agrupacion = elemento.dataset.agrupacion || 'dia';
+        const clave = agrupacion === 'dia' ? delta.fecha : delta.inicios[agrupacion];
+        const traza = elemento.data[0];
+        const x = Array.from(traza.x);
+        const y = Array.from(traza.y);
+        const indice = x.indexOf(clave);
+        if (indice >= 0) {
+            y[indice] += numero(delta.total);
+        } else {
+            // Las fechas ISO se ordenan como texto
+            let posicion = x.findIndex(function (fecha) { return fecha > clave; });
+            if (posicion < 0) {
+                posicion = x.length;
+            }
+            x.splice(posicion, 0, clave);
+            y.splice(posicion, 0, numero(delta.total));
+        }
+        Plotly.restyle(elemento, {x: [x], y: [y]}, [0]);
+    }
+
+    function aplicarBarras(elemento, delta) {
+        const ids = elemento.idsProductos || [];
+        const traza = elemento.data[0];
+        const x = Array.from(traza.x);
+        const y = Array.from(traza.y);
+        const indice = ids.indexOf(delta.producto_id);
+        if (indice >= 0) {
+            y[indice] += delta.cantidad;
+        } else if (delta.producto && delta.cantidad > 0) {
+            ids.push(delta.producto_id);
+            x.push(delta.producto);
+            y.push(delta.cantidad);
+            elemento.idsProductos = ids;
+        } else {
+            return;
+        }
+        Plotly.restyle(elemento, {x: [x], y: [y]}, [0]);
+    }
+
+    function actualizarCelda(fila, campo, valor) {
+        const celda = fila.querySelector('[data-campo="' + campo + '"]');
+        if (!celda) {
+            return;
+        }
+        celda.dataset.valor = valor;
+        const texto = campo === 'num_ventas' ? String(valor) : valor.toFixed(2);
+        celda.textContent = (celda.dataset.prefijo || '') + texto;
+    }
+
+    function aplicarTabla(cuerpo, delta) {
+        const etiqueta = delta.etiquetas[cuerpo.dataset.periodo];
+        let fila = cuerpo.querySelector('tr[data-etiqueta="' + etiqueta + '"]');
+        if (!fila) {
+            // Período nuevo: se arma la fila con las mismas columnas
+            const modelo = cuerpo.querySelector('tr[data-etiqueta]');
+            if (!modelo) {
+                return;
+            }
+            fila = modelo.cloneNode(true);
+            fila.dataset.etiqueta = etiqueta;
+            fila.querySelector('[data-campo="etiqueta"]').textContent = etiqueta;
+            fila.querySelectorAll('[data-valor]').forEach(function (celda) { celda.dataset.valor = '0'; });
+            cuerpo.appendChild(fila);
+        }
+        const celda = function (campo) {
+            const elemento = fila.querySelector('[data-campo="' + campo + '"]');
+            return elemento ? numero(elemento.dataset.valor) : 0;
+        };
+        const total = celda('total') + numero(delta.total);
+        const cantidad = celda('num_ventas') + delta.num_ventas;
+        actualizarCelda(fila, 'total', total);
+        actualizarCelda(fila, 'num_ventas', cantidad);
+        actualizarCelda(fila, 'promedio', cantidad ? total / cantidad : 0);
+    }
+
+    function aplicarDelta(delta) {
+        Object.values(window.graficosVentas || {}).forEach(function (elemento) {
+            if (elemento.dataset.grafico === 'barras') {
+                aplicarBarras(elemento, delta);
+            } else {
+                aplicarSerie(elemento, delta);
+            }
+        });
+        document.querySelectorAll('tbody[data-periodo]').forEach(function (cuerpo) {
+            aplicarTabla(cuerpo, delta);
+        });
+    }
+
+    function conectar() {
+        const protocolo = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        const socket = new WebSocket(protocolo + window.location.host + '/ws/ventas/');
+        socket.onmessage = function (evento) {
+            JSON.parse(evento.data).deltas.forEach(aplicarDelta);
+        };
+        // Si se corta (deploy, red), se reintenta sin recargar la página
+        socket.onclose = function () {
+            window.setTimeout(conectar, 5000);
+        };
+    }
+
+    document.addEventListener('DOMContentLoaded', conectar);
+})();
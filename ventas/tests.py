@@ -1,9 +1,51 @@
-from django.test import TestCase, Client
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import User
-from .models import Producto, Venta
+from django.contrib.auth.models import AnonymousUser, User
+from .models import ContadorProducto, MovimientoStock, Producto, Trabajo, Venta, VentaArchivada, VentaResumenDiario
 from .forms import ProductoForm, VentaForm, FiltroVentasForm
+from . import (
+    agregaciones, archivo, autenticacion, catalogo, contadores, estados, graficos, ingesta, instantaneas, inventario, metricas,
+    replicas, series, trabajos,
+)
+from .consumers import TableroVentasConsumer
+from .filtros import FiltroVentas
+from .paginacion import paginar_por_cursor
+
+
+# Base de casi todas las pruebas: el caché vacío (con `manage.py test` es
+# uno en memoria, ver PRUEBAS en settings.py) y un usuario con sesión
+class ConSesion:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_login(self.user)
+
+
+class VentasTestCase(ConSesion, TestCase):
+    pass
+
+
+class VentasTransactionTestCase(ConSesion, TransactionTestCase):
+    pass
+
 
 class VistasTest(TestCase):
     def setUp(self):
@@ -119,3 +161,1583 @@ class VistasTest(TestCase):
         response = self.client.get(reverse('exportar_ventas_excel'))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+class ExportacionVentasTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto_a = Producto.objects.create(nombre='Producto A', precio=10)
+        self.producto_b = Producto.objects.create(nombre='Producto B', precio=20)
+        Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha='2024-01-10', estado='completada')
+        Venta.objects.create(producto=self.producto_b, cantidad=2, total=40, fecha='2024-02-10', estado='pendiente')
+
+    def test_exportar_excel_en_streaming(self):
+        response = self.client.get(reverse('exportar_ventas_excel'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+        import openpyxl
+        from io import BytesIO
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        filas = list(wb['Ventas'].values)
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[1][0], 'Producto A')
+
+    def test_exportar_csv_respeta_filtros(self):
+        response = self.client.get(reverse('exportar_ventas_excel'), {'formato': 'csv', 'estado': 'pendiente'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode()
+        lineas = contenido.strip().splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('Producto B', lineas[1])
+
+    def test_exportar_sin_consultas_por_fila(self):
+        for _ in range(20):
+            Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha='2024-03-01')
+        # Usuario (la sesión sale del caché) + una única consulta con JOIN
+        # para todas las filas. La fecha máxima del archivo sale del caché
+        archivo.fecha_maxima()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('exportar_ventas_excel'), {'formato': 'csv'})
+            b''.join(response.streaming_content)
+
+
+class ResumenDiarioTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=50)
+
+    def resumen(self, **filtros):
+        return VentaResumenDiario.objects.filter(producto=self.producto, **filtros).get()
+
+    def test_alta_edicion_y_baja_actualizan_resumen(self):
+        venta = Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01', estado='pendiente')
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-01', estado='pendiente')
+        fila = self.resumen(fecha='2024-05-01', estado='pendiente')
+        self.assertEqual((fila.total, fila.cantidad, fila.num_ventas), (150, 3, 2))
+
+        venta.estado = 'completada'
+        venta.save()
+        self.assertEqual(self.resumen(estado='pendiente').num_ventas, 1)
+        self.assertEqual(self.resumen(estado='completada').total, 100)
+
+        venta.delete()
+        self.assertEqual(self.resumen(estado='completada').num_ventas, 0)
+
+    def test_agregar_venta_actualiza_resumen(self):
+        self.client.post(reverse('agregar_venta'), {
+            'producto': self.producto.id, 'cantidad': 3, 'fecha': '2024-05-02', 'total': 0,
+        })
+        self.assertEqual(self.resumen(fecha='2024-05-02').total, 150)
+
+    def test_reconstruir_resumen(self):
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+        VentaResumenDiario.objects.all().delete()
+        call_command('reconstruir_resumen', stdout=StringIO())
+        self.assertEqual(self.resumen(fecha='2024-05-01').total, 100)
+
+    def test_borrado_en_cascada_del_producto(self):
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+        self.producto.delete()
+        self.assertFalse(VentaResumenDiario.objects.exists())
+
+    def test_estadisticas_leen_del_resumen(self):
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-20')
+        response = self.client.get(reverse('estadisticas_ventas'))
+        self.assertEqual([fila['total'] for fila in response.context['total_mensual']], [150])
+
+    def test_graficos_leen_del_resumen(self):
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+        for nombre in ['graficos_ventas', 'graficos_interactivos', 'estadisticas_avanzadas', 'productos_mas_vendidos']:
+            response = self.client.get(reverse(nombre))
+            self.assertEqual(response.status_code, 200, nombre)
+
+
+class ListaVentasTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=5)
+        for dia in range(1, 26):
+            Venta.objects.create(producto=self.producto, cantidad=1, total=5, fecha=f'2024-01-{dia:02d}')
+
+    def test_paginacion_por_cursor(self):
+        ventas = Venta.objects.select_related('producto')
+        primera = paginar_por_cursor(ventas, por_pagina=10)
+        self.assertEqual(str(primera.object_list[0].fecha), '2024-01-25')
+        self.assertFalse(primera.has_previous())
+        self.assertTrue(primera.has_next())
+
+        segunda = paginar_por_cursor(ventas, despues=primera.cursor_siguiente, por_pagina=10)
+        self.assertEqual(str(segunda.object_list[0].fecha), '2024-01-15')
+
+        anterior = paginar_por_cursor(ventas, antes=segunda.cursor_anterior, por_pagina=10)
+        self.assertEqual(anterior.object_list, primera.object_list)
+
+        ultima = paginar_por_cursor(ventas, ultima=True, por_pagina=10)
+        self.assertEqual(len(ultima.object_list), 10)
+        self.assertEqual(str(ultima.object_list[-1].fecha), '2024-01-01')
+        self.assertFalse(ultima.has_next())
+
+    def test_pagina_cacheada_hasta_que_cambian_las_ventas(self):
+        response = self.client.get(reverse('lista_ventas'))
+        self.assertContains(response, '25 sales.')
+
+        # Segunda visita: sesión, usuario y tabla salen del caché
+        with self.assertNumQueries(0):
+            self.client.get(reverse('lista_ventas'))
+
+        Venta.objects.create(producto=self.producto, cantidad=1, total=5, fecha='2024-02-01')
+        response = self.client.get(reverse('lista_ventas'))
+        self.assertContains(response, '26 sales.')
+
+    def test_editar_producto_invalida_la_pagina(self):
+        self.client.get(reverse('lista_ventas'))
+        self.producto.nombre = 'Renombrado'
+        self.producto.save()
+        self.assertContains(self.client.get(reverse('lista_ventas')), 'Renombrado')
+
+
+class CacheAnaliticaTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=50)
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+
+    def test_vistas_de_analisis_cacheadas(self):
+        nombres = ['estadisticas_ventas', 'estadisticas_avanzadas', 'graficos_ventas',
+                   'graficos_interactivos', 'productos_mas_vendidos']
+        for nombre in nombres:
+            self.client.get(reverse(nombre))
+        for nombre in nombres:
+            # Sin consultas: sesión, usuario y resultado salen del caché
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse(nombre))
+            self.assertEqual(response.status_code, 200, nombre)
+
+    def test_escritura_de_venta_invalida_resultados(self):
+        self.client.get(reverse('estadisticas_ventas'))
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-02')
+        response = self.client.get(reverse('estadisticas_ventas'))
+        self.assertEqual(response.context['total_mensual'][0]['total'], 150)
+
+    @override_settings(CACHE_INCR_ATOMICO=False)
+    def test_escritura_invalida_sin_incr_atomico(self):
+        # Caché en disco: la generación nueva sale del reloj, no de incr
+        self.client.get(reverse('estadisticas_ventas'))
+        with mock.patch.object(cache, 'incr', side_effect=AssertionError('incr no atómico')):
+            Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-02')
+        response = self.client.get(reverse('estadisticas_ventas'))
+        self.assertEqual(response.context['total_mensual'][0]['total'], 150)
+
+
+class GraficoVentasTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajustes = override_settings(GRAFICOS_DIR=self.directorio.name, GRAFICOS_PROCESOS=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=50)
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+
+    def test_png_en_disco_con_etag(self):
+        response = self.client.get(reverse('graficos_ventas'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(len(list(Path(self.directorio.name).glob('*.png'))), 1)
+
+        response = self.client.get(reverse('graficos_ventas'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Una venta nueva cambia la versión de los datos y el ETag
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-02')
+        response = self.client.get(reverse('graficos_ventas'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_render_en_pool_de_procesos(self):
+        with override_settings(GRAFICOS_PROCESOS=1):
+            response = self.client.get(reverse('graficos_ventas'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\x89PNG'))
+
+
+class DatosGraficosAPITest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto_a = Producto.objects.create(nombre='Producto A', precio=10)
+        self.producto_b = Producto.objects.create(nombre='Producto B', precio=10)
+        Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha='2024-05-01')
+        Venta.objects.create(producto=self.producto_a, cantidad=2, total=20, fecha='2024-05-01')
+        Venta.objects.create(producto=self.producto_b, cantidad=5, total=50, fecha='2024-06-03')
+
+    def test_serie_por_dia_y_mes(self):
+        datos = self.client.get(reverse('api_serie_ventas')).json()
+        self.assertEqual(datos['fechas'], ['2024-05-01', '2024-06-03'])
+        self.assertEqual(datos['totales'], [30.0, 50.0])
+
+        datos = self.client.get(reverse('api_serie_ventas'), {'agrupacion': 'mes'}).json()
+        self.assertEqual(datos['fechas'], ['2024-05-01', '2024-06-01'])
+
+        response = self.client.get(reverse('api_serie_ventas'), {'agrupacion': 'hora'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_serie_con_etag(self):
+        response = self.client.get(reverse('api_serie_ventas'))
+        response = self.client.get(reverse('api_serie_ventas'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_top_productos(self):
+        datos = self.client.get(reverse('api_productos_top'), {'n': 1}).json()
+        self.assertEqual(datos, {
+            'estado': None, 'ids': [self.producto_b.pk], 'productos': ['Producto B'], 'cantidades': [5],
+            'ingresos': ['50.00'], 'ultimas_ventas': ['2024-06-03'],
+        })
+
+    def test_requiere_autenticacion(self):
+        self.client.logout()
+        self.assertIn(self.client.get(reverse('api_serie_ventas')).status_code, (401, 403))
+
+    def test_plantillas_sin_plotly_embebido(self):
+        response = self.client.get(reverse('graficos_interactivos'))
+        self.assertContains(response, reverse('api_serie_ventas'))
+        self.assertLess(len(response.content), 20000)
+
+
+class AgregacionesTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=10)
+
+    def test_periodos_en_una_consulta(self):
+        Venta.objects.create(producto=self.producto, cantidad=1, total='10.10', fecha='2024-03-31')
+        Venta.objects.create(producto=self.producto, cantidad=2, total='20.20', fecha='2024-04-01')
+        Venta.objects.create(producto=self.producto, cantidad=3, total='30.30', fecha='2024-04-02')
+        Venta.objects.create(producto=self.producto, cantidad=1, total='5.00', fecha='2025-01-01')
+
+        with self.assertNumQueries(1):
+            periodos = agregaciones.resumen_periodos()
+
+        self.assertEqual(
+            [(p['etiqueta'], p['total'], p['num_ventas']) for p in periodos['mensual']],
+            [('2024-03', Decimal('10.10'), 1), ('2024-04', Decimal('50.50'), 2), ('2025-01', Decimal('5.00'), 1)],
+        )
+        self.assertEqual([p['etiqueta'] for p in periodos['trimestral']], ['2024-Q1', '2024-Q2', '2025-Q1'])
+        self.assertEqual([p['etiqueta'] for p in periodos['semanal']], ['2024-W13', '2024-W14', '2025-W01'])
+        self.assertEqual(periodos['semanal'][1]['periodo'], date(2024, 4, 1))
+        self.assertEqual(periodos['anual'][0]['promedio'], Decimal('20.20'))
+
+    def test_tabla_vacia(self):
+        self.assertEqual(agregaciones.resumen_periodos()['mensual'], [])
+        response = self.client.get(reverse('estadisticas_avanzadas'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No data available.')
+
+    def test_dataframe_diario(self):
+        Venta.objects.create(producto=self.producto, cantidad=1, total='10.10', fecha='2024-03-31')
+        df = agregaciones.dataframe_diario()
+        self.assertEqual(list(df.columns), ['fecha', 'total', 'num_ventas'])
+        self.assertEqual(df['total'].tolist(), [10.10])
+
+
+class IngestaVentasTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio='12.50')
+
+    def test_importar_jsonl_con_errores_por_fila(self):
+        lineas = [
+            json.dumps({'producto': self.producto.id, 'cantidad': 2, 'fecha': '2024-05-01', 'estado': 'completada'}),
+            json.dumps({'producto': 9999, 'cantidad': 1, 'fecha': '2024-05-01'}),
+            json.dumps({'producto': self.producto.id, 'cantidad': 0, 'fecha': '01/05/2024'}),
+            '{no es json',
+            json.dumps({'producto': self.producto.id, 'cantidad': 3, 'fecha': '2024-05-01'}),
+        ]
+        reporte = ingesta.importar(ingesta.leer_jsonl(lineas), tamano_lote=2)
+
+        self.assertEqual(reporte['creadas'], 2)
+        self.assertEqual([error['fila'] for error in reporte['errores']], [2, 3, 4])
+        self.assertEqual(set(reporte['errores'][1]['errores']), {'cantidad', 'fecha'})
+        self.assertEqual(Venta.objects.get(cantidad=2).total, Decimal('25.00'))
+        self.assertEqual(Venta.objects.get(cantidad=3).estado, 'pendiente')
+        self.assertEqual(VentaResumenDiario.objects.aggregate(total=Sum('total'))['total'], Decimal('62.50'))
+
+    def test_cantidades_enormes_son_errores_por_fila(self):
+        caro = Producto.objects.create(nombre='Producto Caro', precio='99999999.99')
+        lineas = [
+            # Mayor que 2**63: no entra en int64
+            json.dumps({'producto': self.producto.id, 'cantidad': 2 ** 64, 'fecha': '2024-05-01'}),
+            # Entra en la columna, pero precio * cantidad desborda int64
+            json.dumps({'producto': caro.id, 'cantidad': 2_000_000_000, 'fecha': '2024-05-01'}),
+            json.dumps({'producto': caro.id, 'cantidad': 1, 'fecha': '2024-05-01'}),
+        ]
+        reporte = ingesta.importar(ingesta.leer_jsonl(lineas))
+
+        self.assertEqual(reporte['creadas'], 1)
+        self.assertEqual([error['fila'] for error in reporte['errores']], [1, 2])
+        self.assertEqual([set(error['errores']) for error in reporte['errores']], [{'cantidad'}, {'cantidad'}])
+        self.assertEqual(Venta.objects.get().total, Decimal('99999999.99'))
+
+    def test_endpoint_csv(self):
+        cuerpo = f'producto,cantidad,fecha,estado\n{self.producto.id},4,2024-05-02,completada\n'
+        response = self.client.post(reverse('api_ingesta_ventas'), cuerpo, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['creadas'], 1)
+        self.assertEqual(Venta.objects.get().total, Decimal('50.00'))
+
+        # Un segundo envío del mismo día se suma a la fila existente del resumen
+        self.client.post(reverse('api_ingesta_ventas'), cuerpo, content_type='text/csv')
+        fila = VentaResumenDiario.objects.get()
+        self.assertEqual((fila.total, fila.cantidad, fila.num_ventas), (Decimal('100.00'), 8, 2))
+
+    def test_comando_importar_ventas(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as archivo:
+            archivo.write('producto,cantidad,fecha\n')
+            for dia in range(1, 11):
+                archivo.write(f'{self.producto.id},1,2024-06-{dia:02d}\n')
+        self.addCleanup(os.unlink, archivo.name)
+
+        salida = StringIO()
+        call_command('importar_ventas', archivo.name, '--lote', '3', stdout=salida, stderr=StringIO())
+        self.assertIn('Ventas creadas: 10', salida.getvalue())
+        self.assertEqual(Venta.objects.count(), 10)
+
+
+class InstrumentacionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metricas.metricas().reiniciar()
+        self.staff = User.objects.create_user(username='staff', password='testpass', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client = Client()
+        producto = Producto.objects.create(nombre='Producto Test', precio=50)
+        Venta.objects.create(producto=producto, cantidad=2, total=100, fecha='2024-05-01')
+
+    def test_registra_consultas_plantillas_y_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('estadisticas_ventas'))
+        self.client.get(reverse('estadisticas_ventas'))
+
+        resumen = metricas.metricas().resumen()
+        vista = resumen['vistas']['estadisticas_ventas']
+        self.assertEqual(vista['peticiones'], 2)
+        self.assertEqual((vista['cache_fallos'], vista['cache_aciertos']), (1, 1))
+        self.assertGreater(vista['tiempo_plantillas_ms'], 0)
+        self.assertIsNotNone(vista['p99'])
+        # La segunda petición sale entera del caché, sesión y usuario incluidos
+        self.assertEqual(resumen['recientes'][-1]['consultas'], 0)
+
+    def test_detecta_n_mas_1(self):
+        producto = Producto.objects.get()
+        for dia in range(2, 7):
+            Venta.objects.create(producto=producto, cantidad=1, total=50, fecha=f'2024-05-0{dia}')
+        registro = metricas.RegistroPeticion('GET', '/')
+        with connection.execute_wrapper(registro.envolver_consulta):
+            for venta in Venta.objects.all():
+                venta.producto.nombre
+        self.assertEqual(registro.detectar_n_mas_1(3)[0]['repeticiones'], 6)
+
+    def test_endpoints_solo_staff(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('lista_productos'))
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metricas'))
+        self.assertIn('lista_productos', response.json()['vistas'])
+        response = self.client.get(reverse('metricas_prometheus'))
+        self.assertIn('ventas_peticion_duracion_segundos_bucket{vista="lista_productos",le="+Inf"} 1',
+                      response.content.decode())
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_prometheus_con_token(self):
+        response = self.client.get(reverse('metricas_prometheus'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metricas_prometheus'), HTTP_AUTHORIZATION='Bearer otro')
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(INSTRUMENTACION_PERFIL=True)
+    def test_perfil_bajo_demanda(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('lista_productos'), {'perfil': '1'})
+        perfiles = metricas.metricas().resumen()['perfiles']
+        self.assertEqual(len(perfiles), 1)
+        self.assertIn('cumulative', perfiles[0]['perfil'])
+
+
+class FiltroVentasTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto_a = Producto.objects.create(nombre='Producto A', precio=10)
+        self.producto_b = Producto.objects.create(nombre='Producto B', precio=20)
+        for dia in range(1, 31):
+            Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha=f'2024-04-{dia:02d}', estado='completada')
+            Venta.objects.create(producto=self.producto_b, cantidad=2, total=40, fecha=f'2024-04-{dia:02d}', estado='pendiente')
+
+    def test_clave_normalizada(self):
+        uno = FiltroVentas({'estado': 'pendiente', 'precio_minimo': '10', 'producto': ''})
+        otro = FiltroVentas({'precio_minimo': '10.00', 'estado': 'pendiente'})
+        self.assertEqual(uno.clave(), otro.clave())
+        self.assertEqual(uno.querystring(), 'estado=pendiente&precio_minimo=10')
+        self.assertNotEqual(uno.clave(), FiltroVentas({'estado': 'completada'}).clave())
+
+    def test_resumen_en_una_consulta(self):
+        filtro = FiltroVentas({'producto': self.producto_b.pk, 'fecha_inicio': '2024-04-11'})
+        # Validar el producto + un único aggregate con COUNT y SUM + la
+        # fecha máxima del archivo, que después sale del caché
+        with self.assertNumQueries(3):
+            resumen_filtro = filtro.resumen()
+        self.assertEqual(resumen_filtro, {'num_ventas': 20, 'total': Decimal('800.00')})
+        with self.assertNumQueries(0):
+            filtro.resumen()
+
+    @mock.patch('ventas.views.VENTAS_FILTRADAS_POR_PAGINA', 20)
+    def test_vista_paginada_sin_n_mas_1(self):
+        # Usuario, aggregate, fecha máxima del archivo (sólo con el caché
+        # vacío) y página con JOIN: la sesión sale del caché y el formulario
+        # ya no lista todos los productos (ver ProductoAutocompletar)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('ventas_filtradas'), {'estado': 'pendiente'})
+        self.assertEqual(response.context['num_ventas'], 30)
+        self.assertEqual(response.context['total_ventas'], Decimal('1200.00'))
+        tabla = response.context['tabla']
+        self.assertEqual(tabla.count('<td>Producto B</td>'), 20)
+        self.assertNotIn('Producto A', tabla)
+        # Los enlaces de página conservan el filtro normalizado
+        self.assertIn('?estado=pendiente&amp;despues=2024-04-11_', tabla)
+
+    def test_api_comparte_filtros(self):
+        response = self.client.get(reverse('api_ventas_filtradas'), {'producto': self.producto_a.pk, 'fecha_fin': '2024-04-05'})
+        datos = response.json()
+        self.assertEqual((datos['num_ventas'], datos['total']), (5, '50.00'))
+        self.assertEqual([fila['fecha'] for fila in datos['resultados']][:2], ['2024-04-05', '2024-04-04'])
+        self.assertIsNone(datos['siguiente'])
+
+        response = self.client.get(reverse('api_ventas_filtradas'), {'fecha_inicio': 'ayer'})
+        self.assertEqual(response.status_code, 400)
+
+
+class VistasAsgiTest(TestCase):
+    # Las vistas async a través de AsyncClient, que arma ASGIRequest como uvicorn
+    def setUp(self):
+        cache.clear()
+        metricas.metricas().reiniciar()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(GRAFICOS_DIR=directorio.name, GRAFICOS_PROCESOS=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        producto = Producto.objects.create(nombre='Producto Test', precio=50)
+        Venta.objects.create(producto=producto, cantidad=2, total=100, fecha='2024-05-01', estado='completada')
+        Venta.objects.create(producto=producto, cantidad=1, total=50, fecha='2024-05-02', estado='pendiente')
+
+    async def test_requiere_login(self):
+        response = await self.async_client.get(reverse('lista_ventas'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login_usuario'), response['Location'])
+
+    async def test_listados_y_estadisticas(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('lista_ventas'))
+        self.assertContains(response, '2 sales.')
+        response = await self.async_client.get(reverse('lista_productos'))
+        self.assertContains(response, 'Producto Test')
+        response = await self.async_client.get(reverse('estadisticas_avanzadas'))
+        self.assertEqual(response.context['ventas_anuales'][0]['total'], Decimal('150.00'))
+
+        # La instrumentación cuenta las consultas hechas desde sync_to_async
+        vistas = metricas.metricas().resumen()['vistas']
+        self.assertGreater(vistas['lista_ventas']['consultas_media'], 0)
+
+    async def test_exportacion_csv_con_iterador_async(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('exportar_ventas_excel'), {'formato': 'csv', 'estado': 'pendiente'})
+        self.assertTrue(response.is_async)
+        contenido = b''.join([parte async for parte in response.streaming_content]).decode()
+        self.assertEqual(contenido.strip().splitlines()[1:], ['Producto Test,1,50.00,2024-05-02,pendiente'])
+
+    async def test_exportacion_excel_con_iterador_async(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('exportar_ventas_excel'))
+        self.assertTrue(response.is_async)
+        contenido = b''.join([parte async for parte in response.streaming_content])
+        self.assertEqual(int(response['Content-Length']), len(contenido))
+
+        import openpyxl
+        from io import BytesIO
+        self.assertEqual(len(list(openpyxl.load_workbook(BytesIO(contenido))['Ventas'].values)), 3)
+
+    async def test_grafico_con_etag(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('graficos_ventas'))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        response = await self.async_client.get(reverse('graficos_ventas'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class TableroTiempoRealTest(TestCase):
+    # El consumer se prueba con el ApplicationCommunicator de asgiref: el de
+    # channels.testing necesita daphne
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=50)
+
+    async def conectar(self, usuario):
+        scope = {'type': 'websocket', 'path': '/ws/ventas/', 'headers': [], 'subprotocols': [], 'user': usuario}
+        comunicador = ApplicationCommunicator(TableroVentasConsumer.as_asgi(), scope)
+        await comunicador.send_input({'type': 'websocket.connect'})
+        respuesta = await comunicador.receive_output(timeout=1)
+        return comunicador, respuesta
+
+    async def desconectar(self, comunicador):
+        await comunicador.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await comunicador.wait(timeout=1)
+
+    def guardar_y_editar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            venta = Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01')
+        with self.captureOnCommitCallbacks(execute=True):
+            venta.fecha = date(2024, 7, 1)
+            venta.save()
+
+    async def test_anonimo_rechazado(self):
+        _, respuesta = await self.conectar(AnonymousUser())
+        self.assertEqual(respuesta['type'], 'websocket.close')
+
+    async def test_deltas_de_alta_y_edicion(self):
+        comunicador, respuesta = await self.conectar(self.user)
+        self.assertEqual(respuesta['type'], 'websocket.accept')
+
+        # Los deltas salen de la fila guardada: ninguna consulta extra a los agregados
+        await sync_to_async(self.guardar_y_editar)()
+
+        alta = json.loads((await comunicador.receive_output(timeout=1))['text'])['deltas']
+        self.assertEqual(len(alta), 1)
+        self.assertEqual(alta[0]['fecha'], '2024-05-01')
+        self.assertEqual(alta[0]['etiquetas'], {'semana': '2024-W18', 'mes': '2024-05', 'trimestre': '2024-Q2', 'anio': '2024'})
+        self.assertEqual(alta[0]['inicios']['semana'], '2024-04-29')
+        self.assertEqual((alta[0]['total'], alta[0]['cantidad'], alta[0]['num_ventas']), ('100.00', 2, 1))
+
+        # Una edición que cambia de día resta en el día viejo y suma en el nuevo
+        edicion = json.loads((await comunicador.receive_output(timeout=1))['text'])['deltas']
+        self.assertEqual([(d['fecha'], d['total'], d['num_ventas']) for d in edicion],
+                         [('2024-05-01', '-100.00', -1), ('2024-07-01', '100.00', 1)])
+        await self.desconectar(comunicador)
+
+    def test_sin_publicar_si_se_revierte(self):
+        with mock.patch('ventas.tiempo_real._enviar') as enviar:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-01')
+                        raise ValueError
+                except ValueError:
+                    pass
+        self.assertEqual(callbacks, [])
+        enviar.assert_not_called()
+
+    def test_ingesta_agrupa_deltas_por_dia_y_producto(self):
+        filas = [{'producto': self.producto.id, 'cantidad': 1, 'fecha': '2024-05-01'} for _ in range(50)]
+        with mock.patch('ventas.tiempo_real._enviar') as enviar:
+            with self.captureOnCommitCallbacks(execute=True):
+                ingesta.importar(filas)
+        (deltas,), _ = enviar.call_args
+        self.assertEqual(len(deltas), 1)
+        self.assertEqual((deltas[0]['total'], deltas[0]['num_ventas']), ('2500.00', 50))
+
+
+class TrabajosTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajustes = override_settings(TRABAJOS_DIR=self.directorio.name, GRAFICOS_DIR=self.directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=50)
+        Venta.objects.create(producto=self.producto, cantidad=2, total=100, fecha='2024-05-01', estado='pendiente')
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-02', estado='completada')
+
+    def encolar(self, tipo, filtros=None):
+        return self.client.post(
+            reverse('api_trabajos'), {'tipo': tipo, 'filtros': filtros or {}}, content_type='application/json'
+        )
+
+    def procesar(self):
+        call_command('procesar_trabajos', procesos=0, una_vez=True, stdout=StringIO())
+
+    def test_exportacion_csv_en_segundo_plano(self):
+        response = self.encolar('csv', {'estado': 'pendiente'})
+        self.assertEqual(response.status_code, 202)
+        datos = response.json()
+        self.assertEqual(datos['estado'], 'pendiente')
+        self.assertIsNone(datos['descarga'])
+        self.assertEqual(self.client.get(reverse('api_trabajo_descarga', args=[datos['id']])).status_code, 409)
+
+        self.procesar()
+        datos = self.client.get(datos['url']).json()
+        self.assertEqual(datos['estado'], 'completado')
+        response = self.client.get(datos['descarga'])
+        self.assertEqual(response.status_code, 200)
+        lineas = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('pendiente', lineas[1])
+
+    def test_excel_y_grafico(self):
+        ids = [self.encolar(tipo).json()['id'] for tipo in ('excel', 'grafico')]
+        self.procesar()
+        import openpyxl
+        from io import BytesIO
+        excel = self.client.get(reverse('api_trabajo_descarga', args=[ids[0]]))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(excel.streaming_content)))
+        self.assertEqual(len(list(wb['Ventas'].values)), 3)
+        grafico = self.client.get(reverse('api_trabajo_descarga', args=[ids[1]]))
+        self.assertTrue(b''.join(grafico.streaming_content).startswith(b'\x89PNG'))
+
+    def test_pedidos_identicos_comparten_trabajo(self):
+        primero = self.encolar('csv', {'estado': 'pendiente', 'precio_minimo': '10.00'}).json()
+        segundo = self.encolar('csv', {'precio_minimo': '10', 'estado': 'pendiente'}).json()
+        self.assertEqual(primero['id'], segundo['id'])
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+        # Ya generado se reutiliza el archivo, hasta que cambian las ventas
+        self.procesar()
+        response = self.encolar('csv', {'estado': 'pendiente', 'precio_minimo': '10'})
+        self.assertEqual((response.status_code, response.json()['id']), (200, primero['id']))
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-03', estado='pendiente')
+        self.assertNotEqual(self.encolar('csv', {'estado': 'pendiente', 'precio_minimo': '10'}).json()['id'], primero['id'])
+
+    def test_pedido_en_curso_se_comparte_aunque_cambien_las_ventas(self):
+        primero = self.encolar('csv').json()
+        Venta.objects.create(producto=self.producto, cantidad=1, total=50, fecha='2024-05-03', estado='pendiente')
+        self.assertEqual(self.encolar('csv').json()['id'], primero['id'])
+
+    def test_pool_roto_se_recrea(self):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        class PoolFalso:
+            # El primero pierde un hijo: el futuro ya enviado falla y los
+            # envíos siguientes se rechazan. El segundo ejecuta en línea
+            creados = 0
+
+            def __init__(self, **kwargs):
+                PoolFalso.creados += 1
+                self.roto = PoolFalso.creados == 1
+                self.enviados = 0
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def submit(self, funcion, trabajo_id):
+                futuro = Future()
+                self.enviados += 1
+                if not self.roto:
+                    futuro.set_result(trabajos.ejecutar(trabajo_id))
+                elif self.enviados == 1:
+                    futuro.set_exception(BrokenProcessPool('murió un hijo'))
+                else:
+                    raise BrokenProcessPool('murió un hijo')
+                return futuro
+
+        primero = self.encolar('csv').json()['id']
+        segundo = self.encolar('excel').json()['id']
+        errores = StringIO()
+        with mock.patch('ventas.management.commands.procesar_trabajos.ProcessPoolExecutor', PoolFalso):
+            call_command('procesar_trabajos', procesos=2, una_vez=True, stdout=StringIO(), stderr=errores)
+        self.assertEqual(PoolFalso.creados, 2)
+        self.assertIn('se rompió', errores.getvalue())
+        self.assertEqual(Trabajo.objects.get(pk=primero).estado, 'fallido')
+        # El que no llegó a empezar volvió a la cola y salió con el pool nuevo
+        self.assertEqual(Trabajo.objects.get(pk=segundo).estado, 'completado')
+
+    def test_reclamar_no_repite_trabajos(self):
+        self.encolar('csv')
+        self.encolar('excel')
+        self.assertEqual(len(trabajos.reclamar(5)), 2)
+        self.assertEqual(trabajos.reclamar(5), [])
+
+    def test_errores(self):
+        self.assertEqual(self.encolar('pdf').status_code, 400)
+        self.assertEqual(self.encolar('csv', {'fecha_inicio': 'ayer'}).status_code, 400)
+        trabajo = Trabajo.objects.create(tipo='csv', parametros={'producto': '999999'}, huella='x')
+        with mock.patch.dict(trabajos.GENERADORES, csv=mock.Mock(side_effect=RuntimeError('sin disco'))):
+            self.procesar()
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.error), ('fallido', 'sin disco'))
+        self.assertEqual(list(Path(self.directorio.name).iterdir()), [])
+
+    def test_atascados_y_vencidos(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        hace_mucho = timezone.now() - timedelta(days=2)
+        atascado = Trabajo.objects.create(tipo='csv', huella='a', estado='en_proceso', iniciado=hace_mucho)
+        vencido = Trabajo.objects.create(
+            tipo='csv', huella='b', estado='completado', archivo='viejo.csv', expira=hace_mucho
+        )
+        (Path(self.directorio.name) / 'viejo.csv').write_text('x')
+
+        self.assertEqual(trabajos.reencolar_atascados(), 1)
+        self.assertEqual(trabajos.limpiar_vencidos(), 1)
+        atascado.refresh_from_db()
+        self.assertEqual(atascado.estado, 'pendiente')
+        self.assertFalse(Trabajo.objects.filter(pk=vencido.pk).exists())
+        self.assertFalse((Path(self.directorio.name) / 'viejo.csv').exists())
+        self.assertEqual(self.client.get(reverse('api_trabajo', args=[vencido.pk])).status_code, 404)
+
+
+class InstantaneasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajustes = override_settings(INSTANTANEAS_DIR=self.directorio.name, ANALITICA_FUENTE='instantaneas')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=10)
+        Venta.objects.create(producto=self.producto, cantidad=1, total='10.10', fecha='2024-03-31')
+        Venta.objects.create(producto=self.producto, cantidad=2, total='20.20', fecha='2024-04-02', estado='completada')
+        Venta.objects.create(producto=self.producto, cantidad=3, total='30.30', fecha='2024-04-01')
+
+    def meses(self):
+        return sorted(p.name.split('.')[0] for p in Path(self.directorio.name).glob('mes=*'))
+
+    def test_particiones_por_mes(self):
+        self.assertEqual(instantaneas.actualizar(), {'nuevas': 3, 'meses': ['2024-03', '2024-04']})
+        self.assertEqual(self.meses(), ['mes=2024-03', 'mes=2024-04'])
+
+        datos = instantaneas.cargar(('fecha', 'centavos', 'estado'), desde=date(2024, 4, 1))
+        self.assertIsInstance(datos['centavos'], np.memmap)
+        self.assertEqual(datos['fecha'].astype(str).tolist(), ['2024-04-01', '2024-04-02'])
+        self.assertEqual(datos['centavos'].tolist(), [3030, 2020])
+        self.assertEqual([instantaneas.ESTADOS[e] for e in datos['estado']], ['pendiente', 'completada'])
+
+    def test_incremental_por_id_y_meses_desfasados(self):
+        instantaneas.actualizar()
+        # Sin cambios no se reescribe nada
+        self.assertEqual(instantaneas.actualizar(), {'nuevas': 0, 'meses': []})
+
+        Venta.objects.create(producto=self.producto, cantidad=1, total='5.00', fecha='2025-01-01')
+        self.assertEqual(instantaneas.actualizar(), {'nuevas': 1, 'meses': ['2025-01']})
+
+        # Una edición de una venta ya copiada se detecta contra el resumen diario
+        venta = Venta.objects.get(fecha='2024-03-31')
+        venta.total = Decimal('11.10')
+        venta.save()
+        Venta.objects.filter(fecha='2024-04-02').get().delete()
+        self.assertEqual(instantaneas.actualizar(), {'nuevas': 0, 'meses': ['2024-03', '2024-04']})
+        self.assertEqual(instantaneas.cargar(('centavos',))['centavos'].tolist(), [1110, 3030, 500])
+        self.assertEqual(self.meses(), ['mes=2024-03', 'mes=2024-04', 'mes=2025-01'])
+
+    def test_analitica_sin_consultar_ventas(self):
+        call_command('actualizar_instantaneas', stdout=StringIO())
+        with self.assertNumQueries(0):
+            periodos = agregaciones.resumen_periodos()
+            serie = graficos.serie_diaria()
+        self.assertEqual(
+            [(p['etiqueta'], p['total'], p['num_ventas']) for p in periodos['mensual']],
+            [('2024-03', Decimal('10.10'), 1), ('2024-04', Decimal('50.50'), 2)],
+        )
+        self.assertEqual(serie['totales'], [10.10, 30.30, 20.20])
+
+        with override_settings(ANALITICA_FUENTE='resumen'):
+            cache.clear()
+            self.assertEqual(graficos.serie_diaria(), serie)
+
+    def test_sin_instantanea_usa_la_base(self):
+        self.assertIsNone(instantaneas.cargar())
+        self.assertEqual(len(agregaciones.resumen_periodos()['mensual']), 2)
+
+
+class CatalogoProductosTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        Producto.objects.bulk_create(Producto(nombre=f'Tornillo {i:03d}', precio=1) for i in range(120))
+        self.tuerca = Producto.objects.create(nombre='Tuerca hexagonal', precio=2)
+        self.arandela = Producto.objects.create(nombre='Arandela para tornillo', precio=3)
+
+    def test_formularios_sin_una_opcion_por_producto(self):
+        html = FiltroVentasForm().as_p()
+        self.assertEqual(html.count('<option'), 1 + len(Venta.ESTADO_CHOICES) + 1)
+        self.assertIn('data-autocompletar="/api/productos/buscar/"', html)
+
+        # La opción elegida sale del catálogo cacheado
+        form = VentaForm(initial={'producto': self.tuerca.pk})
+        self.assertInHTML(f'<option value="{self.tuerca.pk}" selected>Tuerca hexagonal</option>', form.as_p())
+        with self.assertNumQueries(0):
+            VentaForm(initial={'producto': self.tuerca.pk}).as_p()
+        self.assertIn('ventas/js/autocompletar.js', str(VentaForm().media))
+
+    def test_busqueda_por_prefijo_y_subcadena(self):
+        response = self.client.get(reverse('api_productos_buscar'), {'q': 'tuer'})
+        self.assertEqual(response.json()['resultados'], [{'id': self.tuerca.pk, 'nombre': 'Tuerca hexagonal', 'precio': '2.00'}])
+
+        # Primero los que empiezan con el texto, después los que lo contienen
+        nombres = [p['nombre'] for p in catalogo.buscar('TORNILLO', limite=200)]
+        self.assertEqual(len(nombres), catalogo.BUSQUEDA_MAXIMO)
+        self.assertEqual(nombres[0], 'Tornillo 000')
+        self.assertEqual(catalogo.buscar('  para   tornillo ')[0]['nombre'], 'Arandela para tornillo')
+        self.assertEqual(catalogo.buscar(''), [])
+
+    def test_version_propia_del_catalogo(self):
+        catalogo.buscar('tuer')
+        with self.assertNumQueries(0):
+            catalogo.buscar('tuer')
+
+        # Una venta no invalida el catálogo; un producto sí
+        Venta.objects.create(producto=self.tuerca, cantidad=1, total=2, fecha='2024-05-01')
+        with self.assertNumQueries(0):
+            catalogo.buscar('tuer')
+        self.tuerca.nombre = 'Tuerca mariposa'
+        self.tuerca.save()
+        self.assertEqual(catalogo.buscar('tuer')[0]['nombre'], 'Tuerca mariposa')
+        self.assertEqual(catalogo.productos([self.tuerca.pk])[self.tuerca.pk]['nombre'], 'Tuerca mariposa')
+
+    def test_lista_productos_paginada(self):
+        response = self.client.get(reverse('lista_productos'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<tr>', count=51)
+        self.assertContains(response, 'Page 1 of 3 (122 products)')
+        self.assertContains(response, 'Arandela para tornillo')
+
+        response = self.client.get(reverse('lista_productos'), {'pagina': 3})
+        self.assertContains(response, 'Tuerca hexagonal')
+        self.assertEqual(self.client.get(reverse('lista_productos'), {'pagina': 'x'}).status_code, 200)
+
+
+class ContadoresProductoTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        # Mismo nombre: el ranking no los debe mezclar
+        self.producto_a = Producto.objects.create(nombre='Repetido', precio=10)
+        self.producto_b = Producto.objects.create(nombre='Repetido', precio=10)
+
+    def contador(self, producto, estado=ContadorProducto.TODOS):
+        return ContadorProducto.objects.filter(producto=producto, estado=estado).values_list(
+            'unidades', 'ingresos', 'num_ventas', 'ultima_venta'
+        ).first()
+
+    def test_alta_edicion_y_borrado(self):
+        venta = Venta.objects.create(producto=self.producto_a, cantidad=2, total=20, fecha='2024-05-01', estado='pendiente')
+        Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha='2024-04-01', estado='pendiente')
+        self.assertEqual(self.contador(self.producto_a), (3, Decimal('30.00'), 2, date(2024, 5, 1)))
+        self.assertEqual(self.contador(self.producto_a, 'pendiente')[:3], (3, Decimal('30.00'), 2))
+
+        # Cambiar estado y producto mueve la venta entre contadores
+        venta.estado = 'completada'
+        venta.producto = self.producto_b
+        venta.save()
+        self.assertEqual(self.contador(self.producto_a), (1, Decimal('10.00'), 1, date(2024, 5, 1)))
+        self.assertEqual(self.contador(self.producto_b, 'completada'), (2, Decimal('20.00'), 1, date(2024, 5, 1)))
+
+        venta.delete()
+        self.assertEqual(self.contador(self.producto_b)[:3], (0, Decimal('0.00'), 0))
+
+    def test_ingesta_masiva(self):
+        filas = [{'producto': self.producto_a.id, 'cantidad': 2, 'fecha': f'2024-05-{dia:02d}'} for dia in range(1, 11)]
+        ingesta.importar(filas)
+        ingesta.importar(filas[:1])
+        self.assertEqual(self.contador(self.producto_a), (22, Decimal('220.00'), 11, date(2024, 5, 10)))
+        self.assertEqual(self.contador(self.producto_a, 'pendiente'), (22, Decimal('220.00'), 11, date(2024, 5, 10)))
+
+    def test_top_por_id_y_estado(self):
+        Venta.objects.create(producto=self.producto_a, cantidad=3, total=30, fecha='2024-05-01', estado='completada')
+        Venta.objects.create(producto=self.producto_b, cantidad=5, total=50, fecha='2024-05-01', estado='pendiente')
+        with self.assertNumQueries(1):
+            top = list(contadores.top(10))
+        self.assertEqual([fila['producto_id'] for fila in top], [self.producto_b.pk, self.producto_a.pk])
+
+        datos = self.client.get(reverse('api_productos_top'), {'estado': 'completada'}).json()
+        self.assertEqual((datos['ids'], datos['cantidades']), ([self.producto_a.pk], [3]))
+        self.assertEqual(self.client.get(reverse('api_productos_top'), {'estado': 'otro'}).status_code, 400)
+
+    def test_reconciliar(self):
+        Venta.objects.create(producto=self.producto_a, cantidad=3, total=30, fecha='2024-05-01')
+        venta = Venta.objects.create(producto=self.producto_b, cantidad=1, total=10, fecha='2024-05-02')
+        ContadorProducto.objects.filter(producto=self.producto_a).update(unidades=99)
+        ContadorProducto.objects.filter(producto=self.producto_b, estado='pendiente').delete()
+        Venta.objects.filter(pk=venta.pk).update(cantidad=4)  # sin señales
+        ContadorProducto.objects.create(producto=self.producto_b, estado='cancelada', unidades=1)
+
+        salida = StringIO()
+        call_command('reconciliar_contadores', stdout=salida)
+        self.assertIn('creados: 1, corregidos: 3, borrados: 1', salida.getvalue())
+        self.assertEqual(self.contador(self.producto_a)[0], 3)
+        self.assertEqual(self.contador(self.producto_b, 'pendiente'), (4, Decimal('10.00'), 1, date(2024, 5, 2)))
+        self.assertEqual(contadores.reconciliar(), {'creados': 0, 'corregidos': 0, 'borrados': 0})
+
+
+class InventarioTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=10)
+        inventario.ajustar(self.producto.pk, 5)
+
+    def stock(self):
+        return Producto.objects.values_list('stock', flat=True).get(pk=self.producto.pk)
+
+    def test_registrar_venta_descuenta_stock(self):
+        venta = inventario.registrar_venta(self.producto.pk, 3, date(2024, 5, 1))
+        self.assertEqual((venta.total, venta.estado, self.stock()), (Decimal('30'), 'pendiente', 2))
+        with self.assertRaises(inventario.StockInsuficiente):
+            inventario.registrar_venta(self.producto.pk, 3, date(2024, 5, 1))
+        self.assertEqual((self.stock(), Venta.objects.count()), (2, 1))
+
+        inventario.reponer(self.producto.pk, 10)
+        self.assertEqual(self.stock(), 12)
+        self.assertEqual(
+            list(MovimientoStock.objects.order_by('id').values_list('tipo', 'cantidad', 'venta')),
+            [('ajuste', 5, None), ('venta', -3, venta.pk), ('reposicion', 10, None)],
+        )
+        self.assertLibroExplicaStock()
+        with self.assertRaises(Producto.DoesNotExist):
+            inventario.registrar_venta(999999, 1, date(2024, 5, 1))
+
+    def assertLibroExplicaStock(self):
+        libro = dict(MovimientoStock.objects.values('producto').annotate(total=Sum('cantidad')).values_list('producto', 'total'))
+        for pk, stock in Producto.objects.filter(stock__isnull=False).values_list('pk', 'stock'):
+            self.assertEqual(libro.get(pk, 0), stock)
+
+    def test_ajustes_y_cancelaciones_pasan_por_el_libro(self):
+        inventario.ajustar(self.producto.pk, 8)
+        venta = inventario.registrar_venta(self.producto.pk, 2, date(2024, 5, 1))
+        with transaction.atomic():
+            inventario.devolver_lote([(venta.pk, self.producto.pk, 2)])
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(
+            list(MovimientoStock.objects.order_by('id').values_list('tipo', 'cantidad')),
+            [('ajuste', 5), ('ajuste', 3), ('venta', -2), ('cancelacion', 2)],
+        )
+        self.assertLibroExplicaStock()
+        with self.assertRaises(ValueError):
+            inventario.ajustar(self.producto.pk, -1)
+
+    def test_alta_de_producto_con_stock_inicial(self):
+        response = self.client.post(reverse('agregar_producto'), {'nombre': 'Nuevo', 'precio': '3.00', 'stock_inicial': 12})
+        self.assertRedirects(response, reverse('lista_productos'))
+        nuevo = Producto.objects.get(nombre='Nuevo')
+        self.assertEqual(nuevo.stock, 12)
+        self.assertEqual(MovimientoStock.objects.get(producto=nuevo).tipo, 'ajuste')
+
+    def test_producto_sin_control_de_stock(self):
+        libre = Producto.objects.create(nombre='Libre', precio=1)
+        inventario.registrar_venta(libre.pk, 1000, date(2024, 5, 1))
+        libre.refresh_from_db()
+        self.assertIsNone(libre.stock)
+        self.assertFalse(MovimientoStock.objects.filter(producto=libre).exists())
+
+    def test_agregar_venta_sin_stock(self):
+        datos = {'producto': self.producto.pk, 'cantidad': 6, 'fecha': '2024-05-01', 'total': 1}
+        response = self.client.post(reverse('agregar_venta'), datos)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No hay stock suficiente')
+        datos['cantidad'] = 5
+        self.assertRedirects(self.client.post(reverse('agregar_venta'), datos), reverse('lista_ventas'))
+        self.assertEqual(Venta.objects.get().total, Decimal('50.00'))
+        self.assertEqual(self.stock(), 0)
+
+    def test_agregar_venta_sin_unidades(self):
+        datos = {'producto': self.producto.pk, 'cantidad': 0, 'fecha': '2024-05-01', 'total': 1}
+        response = self.client.post(reverse('agregar_venta'), datos)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('cantidad'))
+        self.assertFalse(Venta.objects.exists())
+
+    def test_venta_que_nace_cancelada_no_lleva_stock(self):
+        venta = inventario.registrar_venta(self.producto.pk, 3, date(2024, 5, 1), estado='cancelada')
+        self.assertEqual((venta.estado, venta.total, self.stock()), ('cancelada', Decimal('30'), 5))
+        # Aunque supere el stock: no se descuenta nada
+        inventario.registrar_venta(self.producto.pk, 50, date(2024, 5, 1), estado='cancelada')
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(MovimientoStock.objects.filter(tipo='venta').exists())
+        self.assertLibroExplicaStock()
+
+    def test_ingesta_de_canceladas_no_lleva_stock(self):
+        filas = [
+            {'producto': self.producto.pk, 'cantidad': 4, 'fecha': '2024-05-01', 'estado': 'cancelada'},
+            {'producto': self.producto.pk, 'cantidad': 2, 'fecha': '2024-05-01'},
+        ]
+        reporte = ingesta.importar(filas)
+        self.assertEqual((reporte['creadas'], reporte['num_errores']), (2, 0))
+        self.assertEqual(self.stock(), 3)
+        self.assertEqual(MovimientoStock.objects.get(tipo='venta').cantidad, -2)
+
+        # Un producto rechazado por falta de stock conserva sus canceladas
+        filas[1]['cantidad'] = 9
+        reporte = ingesta.importar(filas)
+        self.assertEqual((reporte['creadas'], reporte['num_errores']), (1, 1))
+        self.assertEqual(self.stock(), 3)
+        self.assertLibroExplicaStock()
+
+    def test_ingesta_rechaza_productos_sin_stock(self):
+        otro = Producto.objects.create(nombre='Otro', precio=1)
+        inventario.ajustar(otro.pk, 100)
+        filas = [{'producto': self.producto.pk, 'cantidad': 2, 'fecha': '2024-05-01'} for _ in range(3)]
+        filas.append({'producto': otro.pk, 'cantidad': 7, 'fecha': '2024-05-01'})
+        reporte = ingesta.importar(filas)
+        self.assertEqual((reporte['creadas'], reporte['num_errores']), (1, 3))
+        self.assertEqual(self.stock(), 5)
+        otro.refresh_from_db()
+        self.assertEqual(otro.stock, 93)
+        self.assertEqual(MovimientoStock.objects.get(tipo='venta').cantidad, -7)
+        self.assertLibroExplicaStock()
+
+    def test_lista_productos_con_stock_al_dia(self):
+        self.assertContains(self.client.get(reverse('lista_productos')), '<td>5</td>')
+        inventario.registrar_venta(self.producto.pk, 2, date(2024, 5, 1))
+        # La página sigue en caché, pero el stock se lee en cada petición
+        self.assertContains(self.client.get(reverse('lista_productos')), '<td>3</td>')
+
+
+class InventarioConcurrenteTest(TransactionTestCase):
+    # Varios hilos, cada uno con su conexión, compitiendo por el mismo stock
+    HILOS = 8
+    VENTAS_POR_HILO = 15
+    STOCK = 50
+
+    def test_nunca_vende_de_mas(self):
+        import threading
+        from django.db import OperationalError, connections
+
+        producto = Producto.objects.create(nombre='Escaso', precio=1)
+        inventario.ajustar(producto.pk, self.STOCK)
+        vendidas = []
+        rechazadas = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def vender():
+            barrera.wait()
+            try:
+                for _ in range(self.VENTAS_POR_HILO):
+                    while True:
+                        try:
+                            inventario.registrar_venta(producto.pk, 1, date(2024, 5, 1))
+                            vendidas.append(1)
+                        except inventario.StockInsuficiente:
+                            rechazadas.append(1)
+                        except OperationalError:
+                            # SQLite serializa las escrituras: se reintenta si
+                            # la base estaba ocupada por otro hilo
+                            continue
+                        break
+            finally:
+                connections.close_all()
+
+        with mock.patch('ventas.tiempo_real.publicar'):
+            hilos = [threading.Thread(target=vender) for _ in range(self.HILOS)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(len(vendidas), self.STOCK)
+        self.assertEqual(len(rechazadas), self.HILOS * self.VENTAS_POR_HILO - self.STOCK)
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(Venta.objects.count(), self.STOCK)
+        # El ajuste inicial más las salidas explican el stock que quedó
+        self.assertEqual(MovimientoStock.objects.aggregate(total=Sum('cantidad'))['total'], producto.stock)
+        self.assertEqual(ContadorProducto.objects.get(producto=producto, estado='').unidades, self.STOCK)
+
+
+class AutenticacionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        autenticacion.olvidar_tokens()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Producto.objects.create(nombre='Producto A', precio=10)
+        self.url = reverse('api_productos_buscar')
+
+    def _jwt(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_sesion_sin_consultas_de_autenticacion(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url, {'q': 'Prod'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'Prod'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_jwt_sin_consultas_de_autenticacion(self):
+        cabecera = self._jwt()
+        self.client.get(self.url, {'q': 'Prod'}, **cabecera)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'Prod'}, **cabecera)
+        self.assertEqual(response.status_code, 200)
+
+    def test_el_cache_compartido_no_guarda_usuarios(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        # Sólo una versión al azar: ni el usuario ni el hash de la contraseña
+        version = cache.get(f'auth:usuario:{self.user.pk}')
+        self.assertIsInstance(version, str)
+        self.assertNotIn(self.user.password, version)
+
+        # Otro proceso invalidó al usuario: aquí se vuelve a leer
+        cache.delete(f'auth:usuario:{self.user.pk}')
+        with self.assertNumQueries(1):
+            self.assertEqual(autenticacion.usuario_cacheado(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            usuario = autenticacion.usuario_cacheado(self.user.pk)
+        # Cada petición recibe su propia copia
+        usuario.first_name = 'Otro'
+        self.assertEqual(autenticacion.usuario_cacheado(self.user.pk).first_name, '')
+
+    def test_desactivar_usuario_invalida_el_cache(self):
+        self.client.force_login(self.user)
+        cabecera = self._jwt()
+        self.assertEqual(self.client.get(self.url, **cabecera).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        # DRF responde 403 y no 401 porque SessionAuthentication va primero
+        self.assertEqual(self.client.get(self.url, **cabecera).status_code, 403)
+        self.assertEqual(Client().get(self.url, **cabecera).status_code, 403)
+        self.assertEqual(self.client.get(reverse('lista_ventas')).status_code, 302)
+
+    def test_cambio_de_contrasena_cierra_la_sesion(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.set_password('otra')
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_iteraciones_ajustables(self):
+        with override_settings(PASSWORD_PBKDF2_ITERACIONES=1000):
+            self.user.set_password('nueva')
+            self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+            self.assertTrue(self.user.check_password('nueva'))
+        # Con otro número de iteraciones el hash viejo sigue valiendo y se
+        # recalcula al verificarlo
+        self.user.save()
+        self.assertTrue(self.user.check_password('nueva'))
+        self.assertFalse(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+
+class SeriesTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=10)
+        for dia in range(1, 29):
+            Venta.objects.create(producto=self.producto, cantidad=1, total=dia, fecha=f'2024-02-{dia:02d}')
+
+    def completa(self):
+        # La serie calculada desde cero, para comparar con la incremental
+        return series._calcular(series.revision())
+
+    def test_refresca_solo_la_cola(self):
+        series.materializada()
+        Venta.objects.create(producto=self.producto, cantidad=1, total=5, fecha='2024-02-27')
+        Venta.objects.create(producto=self.producto, cantidad=1, total=7, fecha='2024-03-02')
+        with self.assertNumQueries(1) as consultas:
+            datos = series.materializada()
+        self.assertIn("'2024-02-27'", consultas.captured_queries[0]['sql'])
+        self.assertEqual(datos, self.completa())
+        self.assertEqual(datos['mes'], ([date(2024, 2, 1), date(2024, 3, 1)], [41100, 700]))
+        with self.assertNumQueries(0):
+            series.materializada()
+
+    def test_edicion_hacia_atras_y_borrado(self):
+        series.materializada()
+        venta = Venta.objects.get(fecha='2024-02-28')
+        venta.fecha = '2024-01-15'
+        venta.save()
+        Venta.objects.get(fecha='2024-02-10').delete()
+        datos = series.materializada()
+        self.assertEqual(datos, self.completa())
+        self.assertEqual(datos['dia'][0][0], date(2024, 1, 15))
+        self.assertEqual(datos['semana'][0], [date(2024, 1, 15)] + [date(2024, 1, 29) + timedelta(weeks=n) for n in range(5)])
+
+    def test_marca_perdida_recalcula_todo(self):
+        series.materializada()
+        Venta.objects.create(producto=self.producto, cantidad=1, total=5, fecha='2024-02-27')
+        cache.delete(series._clave_marca(series.revision()))
+        with self.assertNumQueries(1) as consultas:
+            datos = series.materializada()
+        self.assertNotIn('WHERE', consultas.captured_queries[0]['sql'])
+        self.assertEqual(datos['dia'][1][-2], 3200)
+
+    def test_lttb(self):
+        xs = list(range(100))
+        ys = [0] * 100
+        ys[37] = 500
+        indices = series.lttb(xs, ys, 10)
+        self.assertEqual(len(indices), 10)
+        self.assertEqual((indices[0], indices[-1]), (0, 99))
+        self.assertIn(37, indices)
+        self.assertEqual(indices, sorted(indices))
+        self.assertEqual(series.lttb(xs, ys, 200), xs)
+
+    def test_api_con_puntos(self):
+        datos = self.client.get(reverse('api_serie_ventas'), {'puntos': 10}).json()
+        self.assertEqual(len(datos['fechas']), 10)
+        self.assertEqual((datos['fechas'][0], datos['fechas'][-1]), ('2024-02-01', '2024-02-28'))
+        self.assertEqual(len(self.client.get(reverse('api_serie_ventas')).json()['fechas']), 28)
+        response = self.client.get(reverse('api_serie_ventas'), {'puntos': 'muchos'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_sigue_a_la_revision(self):
+        response = self.client.get(reverse('api_serie_ventas'))
+        etag = response['ETag']
+        self.producto.nombre = 'Renombrado'
+        self.producto.save()
+        response = self.client.get(reverse('api_serie_ventas'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Venta.objects.create(producto=self.producto, cantidad=1, total=5, fecha='2024-02-27')
+        response = self.client.get(reverse('api_serie_ventas'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CambioEstadoTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto_a = Producto.objects.create(nombre='Producto A', precio=10)
+        self.producto_b = Producto.objects.create(nombre='Producto B', precio=10)
+        for dia in range(1, 8):
+            Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha=f'2024-05-0{dia}')
+            Venta.objects.create(producto=self.producto_b, cantidad=2, total=20, fecha=f'2024-05-0{dia}')
+        Venta.objects.create(producto=self.producto_a, cantidad=1, total=10, fecha='2024-05-03', estado='cancelada')
+        Venta.objects.create(producto=self.producto_b, cantidad=1, total=10, fecha='2024-05-03', estado='completada')
+
+    def resumen_actual(self):
+        return sorted(VentaResumenDiario.objects.filter(num_ventas__gt=0).values_list(
+            'fecha', 'producto_id', 'estado', 'total', 'cantidad', 'num_ventas'))
+
+    def assertDerivadosAlDia(self):
+        # El resumen y los contadores movidos con deltas coinciden con los
+        # reconstruidos desde las ventas
+        incremental = self.resumen_actual()
+        from . import resumen
+        resumen.reconstruir()
+        self.assertEqual(incremental, self.resumen_actual())
+        self.assertEqual(contadores.reconciliar()['corregidos'], 0)
+
+    def test_cierre_del_dia_en_lotes(self):
+        reporte = estados.cambiar_estado(Venta.objects.filter(fecha__lte='2024-05-05'), 'completada', tamano_lote=3)
+        self.assertEqual(reporte, {
+            'estado': 'completada', 'actualizadas': 10, 'por_origen': {'pendiente': 10},
+            'omitidas': {'cancelada': 1, 'completada': 1},
+        })
+        self.assertEqual(Venta.objects.filter(estado='pendiente').count(), 4)
+        self.assertEqual(
+            ContadorProducto.objects.get(producto=self.producto_b, estado='completada').unidades, 11
+        )
+        self.assertDerivadosAlDia()
+
+    def test_cancelar_devuelve_el_stock(self):
+        inventario.ajustar(self.producto_a.pk, 10)
+        vendidas = [inventario.registrar_venta(self.producto_a.pk, 2, date(2024, 5, 8)) for _ in range(3)]
+        reporte = estados.cambiar_estado(
+            Venta.objects.filter(pk__in=[venta.pk for venta in vendidas[:2]]), 'cancelada', tamano_lote=1
+        )
+        self.assertEqual(reporte['actualizadas'], 2)
+        self.assertEqual(Producto.objects.get(pk=self.producto_a.pk).stock, 8)
+        self.assertEqual(
+            sorted(MovimientoStock.objects.filter(tipo='cancelacion').values_list('venta', 'cantidad')),
+            [(vendidas[0].pk, 2), (vendidas[1].pk, 2)],
+        )
+        self.assertEqual(MovimientoStock.objects.aggregate(total=Sum('cantidad'))['total'], 8)
+        # Los productos sin control de stock no reciben movimientos
+        estados.cambiar_estado(Venta.objects.filter(producto=self.producto_b), 'cancelada')
+        self.assertFalse(MovimientoStock.objects.filter(producto=self.producto_b).exists())
+        self.assertDerivadosAlDia()
+
+    def test_transiciones_no_permitidas(self):
+        reporte = estados.cambiar_estado(Venta.objects.filter(estado='cancelada'), 'pendiente')
+        self.assertEqual((reporte['actualizadas'], reporte['omitidas']), (0, {'cancelada': 1}))
+        with self.assertRaises(ValueError):
+            estados.cambiar_estado(Venta.objects.all(), 'reembolsada')
+
+    def test_api(self):
+        url = reverse('api_cambiar_estado')
+        ids = list(Venta.objects.filter(producto=self.producto_a).values_list('pk', flat=True))
+        response = self.client.post(url, {'estado': 'cancelada', 'ids': ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['por_origen'], {'completada': 0, 'pendiente': 7})
+
+        response = self.client.post(
+            url, {'estado': 'completada', 'filtros': {'producto': self.producto_b.pk, 'fecha_fin': '2024-05-02'}},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['actualizadas'], 2)
+        self.assertDerivadosAlDia()
+
+        # Sin filtros ni ids se rechaza: cambiaría todas las ventas
+        response = self.client.post(url, {'estado': 'completada'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'estado': 'enviada', 'ids': ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command(
+            'cambiar_estado_ventas', 'completada', '--estado-actual', 'pendiente', '--fecha-inicio', '2024-05-06',
+            stdout=salida, stderr=StringIO(),
+        )
+        self.assertIn('completada: 4', salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('cambiar_estado_ventas', 'completada', stdout=StringIO())
+
+    def test_instantanea_detecta_el_cambio(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(INSTANTANEAS_DIR=directorio):
+            instantaneas.actualizar()
+            estados.cambiar_estado(Venta.objects.filter(fecha='2024-05-01'), 'completada')
+            self.assertEqual(instantaneas.actualizar()['meses'], ['2024-05'])
+            codigos = instantaneas.cargar(('estado',))['estado']
+            self.assertEqual(sum(instantaneas.ESTADOS[codigo] == 'pendiente' for codigo in codigos), 12)
+
+
+class ReplicasTest(VentasTransactionTestCase):
+    # Sin DATABASE_REPLICA_URL en los tests, el router se observa sin
+    # dejar que use un alias que no existe: se registra qué decidió y se lee
+    # de la primaria igual. TransactionTestCase porque dentro de una
+    # transacción el router nunca elige la réplica
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=10)
+        Venta.objects.create(producto=self.producto, cantidad=1, total=10, fecha='2024-05-01')
+
+        self.decisiones = []
+        self.original = original = replicas.ReplicaRouter.db_for_read
+
+        def espiar(router, model, **hints):
+            self.decisiones.append(original(router, model, **hints))
+
+        for parche in (
+            mock.patch.object(replicas.ReplicaRouter, 'db_for_read', autospec=True, side_effect=espiar),
+            mock.patch.object(replicas, 'hay_replica', return_value=True),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_listados_leen_de_la_replica(self):
+        # El stock de lista_productos no se cachea: sale de la réplica
+        self.client.get(reverse('lista_productos'))
+        self.assertIn('replica', self.decisiones)
+
+        self.decisiones.clear()
+        self.client.get(reverse('agregar_venta'))
+        self.assertNotIn('replica', self.decisiones)
+
+    def test_lo_que_se_cachea_se_calcula_en_la_primaria(self):
+        for nombre in ('estadisticas_ventas', 'lista_ventas', 'api_serie_ventas'):
+            self.client.get(reverse(nombre))
+        self.assertTrue(self.decisiones)
+        self.assertNotIn('replica', self.decisiones)
+
+    def test_lee_sus_escrituras(self):
+        response = self.client.post(reverse('agregar_venta'), {
+            'producto': self.producto.pk, 'cantidad': 1, 'fecha': '2024-05-02', 'total': 10,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(replicas.COOKIE, response.cookies)
+        self.assertNotIn('replica', self.decisiones)
+
+        # Con la cookie, el listado siguiente lee de la primaria
+        self.client.get(reverse('lista_ventas'))
+        self.assertNotIn('replica', self.decisiones)
+
+    def test_transacciones_y_escrituras_van_a_la_primaria(self):
+        router = replicas.ReplicaRouter()
+        token = replicas.usar_replica(True)
+        try:
+            self.assertEqual(self.original(router, Venta), 'replica')
+            with transaction.atomic():
+                self.assertIsNone(self.original(router, Venta))
+            router.db_for_write(Venta)
+            self.assertIsNone(self.original(router, Venta))
+        finally:
+            replicas.restaurar(token)
+        self.assertFalse(router.allow_migrate('replica', 'ventas'))
+        self.assertTrue(router.allow_migrate('default', 'ventas'))
+
+    def test_sin_replica_no_hay_cookie(self):
+        with mock.patch.object(replicas, 'hay_replica', return_value=False):
+            response = self.client.post(reverse('agregar_venta'), {
+                'producto': self.producto.pk, 'cantidad': 1, 'fecha': '2024-05-02', 'total': 10,
+            })
+            self.client.get(reverse('lista_ventas'))
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+        self.assertNotIn('replica', self.decisiones)
+
+
+class ReplicaAtrasadaTest(VentasTransactionTestCase):
+    # Una réplica de verdad: otra base SQLite con la copia del momento. Todo
+    # lo que se escribe después en la primaria es el retraso de la réplica
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto Test', precio=10)
+        inventario.ajustar(self.producto.pk, 5)
+        inventario.registrar_venta(self.producto.pk, 1, date(2024, 5, 1))
+
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        connections.databases['replica'] = {
+            **connections.databases['default'], 'NAME': str(Path(directorio.name) / 'replica.sqlite3'),
+        }
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(connections['replica'].close)
+        connections['default'].ensure_connection()
+        connections['replica'].ensure_connection()
+        connections['default'].connection.backup(connections['replica'].connection)
+
+    def test_el_cache_no_guarda_datos_atrasados(self):
+        # Se llenan el caché y la serie materializada antes de la escritura
+        self.client.get(reverse('estadisticas_ventas'))
+        self.assertEqual(self.client.get(reverse('api_serie_ventas')).json()['totales'], [10.0])
+
+        # Escribe otro cliente: este no tiene la cookie y sigue en la réplica
+        inventario.registrar_venta(self.producto.pk, 2, date(2024, 5, 2))
+
+        # El stock no se cachea y se lee atrasado (en la primaria ya es 2)
+        response = self.client.get(reverse('lista_productos'))
+        self.assertEqual(response.context['productos'][0]['stock'], 4)
+        # Lo cacheado bajo la generación nueva ya incluye la venta
+        response = self.client.get(reverse('estadisticas_ventas'))
+        self.assertEqual(response.context['total_mensual'][0]['total'], 30)
+        datos = self.client.get(reverse('api_serie_ventas')).json()
+        self.assertEqual(datos['totales'], [10.0, 20.0])
+        self.assertEqual(self.client.get(reverse('lista_ventas')).context['tabla'].count('<tr>'), 3)
+
+
+class ArchivoTest(VentasTestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.create(nombre='Producto A', precio=10)
+        inventario.ajustar(self.producto.pk, 100)
+        self.otro = Producto.objects.create(nombre='Producto B', precio=10)
+        for dia in range(1, 7):
+            Venta.objects.create(producto=self.otro, cantidad=1, total=10, fecha=f'2024-01-0{dia}')
+        for dia in range(1, 5):
+            Venta.objects.create(producto=self.otro, cantidad=2, total=20, fecha=f'2024-05-0{dia}', estado='completada')
+        self.vieja = inventario.registrar_venta(self.producto.pk, 3, date(2024, 1, 3))
+
+    def resumen_actual(self):
+        return sorted(VentaResumenDiario.objects.filter(num_ventas__gt=0).values_list(
+            'fecha', 'producto_id', 'estado', 'total', 'cantidad', 'num_ventas'))
+
+    def test_horizonte(self):
+        self.assertEqual(archivo.horizonte(meses=24, hoy=date(2026, 10, 18)), date(2024, 10, 1))
+        self.assertEqual(archivo.horizonte(meses=10, hoy=date(2026, 10, 18)), date(2025, 12, 1))
+
+    def test_archiva_en_lotes_sin_cambiar_derivados(self):
+        resumen_antes = self.resumen_actual()
+        ids = sorted(Venta.objects.filter(fecha__lt='2024-02-01').values_list('pk', flat=True))
+        reporte = archivo.archivar(antes_de=date(2024, 2, 1), tamano_lote=3)
+        self.assertEqual(reporte, {'antes_de': date(2024, 2, 1), 'archivadas': 7})
+        self.assertEqual(sorted(VentaArchivada.objects.values_list('pk', flat=True)), ids)
+        self.assertEqual(Venta.objects.count(), 4)
+        self.assertEqual(archivo.fecha_maxima(), date(2024, 1, 6))
+
+        # El movimiento de stock queda, sin vínculo a la venta
+        self.assertEqual(MovimientoStock.objects.get(tipo='venta').venta_id, None)
+        # Resumen y contadores siguen contando las archivadas
+        self.assertEqual(self.resumen_actual(), resumen_antes)
+        from . import resumen
+        resumen.reconstruir()
+        self.assertEqual(self.resumen_actual(), resumen_antes)
+        self.assertEqual(contadores.reconciliar(), {'creados': 0, 'corregidos': 0, 'borrados': 0})
+
+        # Volver a archivar no mueve nada
+        self.assertEqual(archivo.archivar(antes_de=date(2024, 2, 1))['archivadas'], 0)
+
+    def test_filtros_consultan_el_archivo(self):
+        archivo.archivar(antes_de=date(2024, 2, 1))
+        filtro = FiltroVentas({'producto': self.otro.pk})
+        self.assertEqual(filtro.resumen(), {'num_ventas': 10, 'total': Decimal('140.00')})
+
+        # Un rango posterior al archivo no lo toca
+        reciente = FiltroVentas({'fecha_inicio': '2024-02-01'})
+        self.assertIsNone(reciente.filtrar_archivo())
+        self.assertEqual(reciente.resumen()['num_ventas'], 4)
+
+        response = self.client.get(reverse('ventas_filtradas'), {'fecha_fin': '2024-01-31'})
+        self.assertEqual(response.context['num_ventas'], 7)
+        self.assertEqual(response.context['tabla'].count('<tr>'), 8)
+
+    def test_paginacion_cruza_las_dos_tablas(self):
+        archivo.archivar(antes_de=date(2024, 2, 1))
+        filtro = FiltroVentas({})
+        esperadas = [
+            (venta.fecha, venta.pk)
+            for venta in sorted(
+                list(Venta.objects.all()) + list(VentaArchivada.objects.all()),
+                key=lambda venta: (venta.fecha, venta.pk), reverse=True,
+            )
+        ]
+        vistas, despues = [], None
+        while True:
+            pagina = paginar_por_cursor(filtro.filtrar(), despues=despues, por_pagina=3, archivo=filtro.filtrar_archivo())
+            vistas += [(venta.fecha, venta.pk) for venta in pagina.object_list]
+            if not pagina.has_next():
+                break
+            despues = pagina.cursor_siguiente
+        self.assertEqual(vistas, esperadas)
+
+        # Hacia atrás desde la última página
+        pagina = paginar_por_cursor(filtro.filtrar(), ultima=True, por_pagina=3, archivo=filtro.filtrar_archivo())
+        self.assertEqual([(venta.fecha, venta.pk) for venta in pagina.object_list], esperadas[-3:])
+        pagina = paginar_por_cursor(
+            filtro.filtrar(), antes=pagina.cursor_anterior, por_pagina=3, archivo=filtro.filtrar_archivo()
+        )
+        self.assertEqual([(venta.fecha, venta.pk) for venta in pagina.object_list], esperadas[-6:-3])
+
+        datos = self.client.get(reverse('api_ventas_filtradas'), {'fecha_fin': '2024-01-02'}).json()
+        self.assertEqual([fila['fecha'] for fila in datos['resultados']], ['2024-01-02', '2024-01-01'])
+
+    def test_lista_ventas_incluye_el_archivo(self):
+        archivo.archivar(antes_de=date(2024, 2, 1))
+        tabla = self.client.get(reverse('lista_ventas')).context['tabla']
+        self.assertIn('11 sales.', tabla)
+        # 4 recientes y 6 archivadas; la última archivada queda en la página 2
+        self.assertEqual(tabla.count('<tr>'), 11)
+        despues = tabla.split('?despues=')[1].split('"')[0]
+        tabla = self.client.get(reverse('lista_ventas'), {'despues': despues}).context['tabla']
+        self.assertEqual(tabla.count('<tr>'), 2)
+        self.assertIn('Jan. 1, 2024', tabla)
+
+    def test_fecha_maxima_se_invalida(self):
+        archivo.archivar(antes_de=date(2024, 2, 1))
+        self.assertEqual(archivo.fecha_maxima(), date(2024, 1, 6))
+        self.producto.delete()
+        self.assertEqual(archivo.fecha_maxima(), date(2024, 1, 6))
+        self.otro.delete()
+        self.assertIsNone(archivo.fecha_maxima())
+
+    def test_exportacion_incluye_el_archivo(self):
+        archivo.archivar(antes_de=date(2024, 2, 1))
+        response = self.client.get(reverse('exportar_ventas_excel'), {'formato': 'csv'})
+        lineas = b''.join(response.streaming_content).decode().strip().splitlines()[1:]
+        fechas = [linea.split(',')[3] for linea in lineas]
+        self.assertEqual(len(fechas), 11)
+        self.assertEqual(fechas, sorted(fechas))
+
+    def test_instantaneas_conservan_lo_archivado(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(INSTANTANEAS_DIR=directorio):
+            archivo.archivar(antes_de=date(2024, 2, 1))
+            # Una reconstrucción completa ya no encuentra las viejas en Venta,
+            # pero el mes queda desfasado contra el resumen y se lee del archivo
+            instantaneas.actualizar(completo=True)
+            self.assertEqual(len(instantaneas.cargar(('id',))['id']), 11)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('archivar_ventas', '--antes-de', '2024-01-04', '--lote', '2', stdout=salida)
+        self.assertIn('Ventas archivadas anteriores a 2024-01-04: 4', salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('archivar_ventas', '--antes-de', 'ayer')
@@ -0,0 +1,69 @@
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .periodos import etiquetas, inicios
+
+# Deltas en vivo para los tableros (ver consumers.py). Cada venta que se
+# guarda o se borra genera un delta calculado sólo con la fila cambiada: los
+# clientes suman lo recibido a los totales que ya tienen dibujados, sin que
+# nadie vuelva a consultar la base.
+GRUPO = 'ventas_dashboard'
+CENTAVO = Decimal('0.01')
+
+logger = logging.getLogger(__name__)
+
+
+def delta(fecha, producto_id, total, cantidad, num_ventas, producto=None):
+    if isinstance(fecha, str):
+        # Venta.objects.create(fecha='2024-05-01') deja la cadena en la instancia
+        fecha = date.fromisoformat(fecha)
+    return {
+        'fecha': fecha.isoformat(),
+        'etiquetas': etiquetas(fecha),
+        'inicios': inicios(fecha),
+        'producto_id': producto_id,
+        # El nombre sólo viaja si ya estaba cargado: no se consulta por él
+        'producto': producto,
+        'total': str(Decimal(str(total)).quantize(CENTAVO)),
+        'cantidad': cantidad,
+        'num_ventas': num_ventas,
+    }
+
+
+def deltas_de_filas(filas):
+    # Para los caminos masivos: filas (fecha, producto_id, estado, total,
+    # cantidad) agrupadas por día y producto, un delta por grupo
+    grupos = defaultdict(lambda: [Decimal('0'), 0, 0])
+    for fecha, producto_id, _, total, cantidad in filas:
+        grupo = grupos[(fecha, producto_id)]
+        grupo[0] += total
+        grupo[1] += cantidad
+        grupo[2] += 1
+    return [
+        delta(fecha, producto_id, total, cantidad, num_ventas)
+        for (fecha, producto_id), (total, cantidad, num_ventas) in grupos.items()
+    ]
+
+
+def publicar(deltas):
+    # Se envía al confirmar la transacción: un alta que se revierte no debe
+    # llegar a los tableros
+    if deltas:
+        transaction.on_commit(lambda: _enviar(deltas))
+
+
+def _enviar(deltas):
+    capa = get_channel_layer()
+    if capa is None:
+        return
+    try:
+        async_to_sync(capa.group_send)(GRUPO, {'type': 'ventas.delta', 'deltas': deltas})
+    except Exception:
+        # Sin tableros en vivo la venta igual quedó guardada
+        logger.exception('No se pudieron publicar los deltas de ventas')
@@ -0,0 +1,13 @@
+# Punto de entrada de los procesos del pool de procesar_trabajos. Como
+# renderizado.py, no importa Django al cargarse: los procesos hijos se crean
+# con 'spawn' y configuran Django una sola vez en inicializar().
+
+
+def inicializar():
+    import django
+    django.setup()
+
+
+def ejecutar(trabajo_id):
+    from .trabajos import ejecutar as ejecutar_trabajo
+    return ejecutar_trabajo(trabajo_id)
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache_ventas, exportacion, graficos
+from .filtros import FiltroVentas
+from .models import Trabajo
+from .renderizado import renderizar_serie_png
+
+# Cola de exportaciones e informes en la propia base: la API encola, el
+# comando procesar_trabajos los ejecuta en un pool de procesos y deja el
+# archivo en TRABAJOS_DIR hasta que vence (TRABAJOS_TTL).
+
+EN_CURSO = ('pendiente', 'en_proceso')
+EXTENSIONES = {'excel': 'xlsx', 'csv': 'csv', 'grafico': 'png'}
+CONTENT_TYPES = {
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'grafico': 'image/png',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _generar_excel(trabajo, ruta):
+    with open(ruta, 'wb') as archivo:
+        filtro = FiltroVentas(trabajo.parametros)
+        exportacion.escribir_excel(filtro.filtrar(), archivo, filtro.filtrar_archivo())
+
+
+def _generar_csv(trabajo, ruta):
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        filtro = FiltroVentas(trabajo.parametros)
+        exportacion.escribir_csv(filtro.filtrar(), archivo, filtro.filtrar_archivo())
+
+
+def _generar_grafico(trabajo, ruta):
+    # Ya se está en un proceso aparte: se dibuja directamente, sin el pool de graficos.py
+    serie = graficos.serie_diaria()
+    png = graficos.ruta_png(graficos.version(serie))
+    if png.exists():
+        shutil.copyfile(png, ruta)
+    else:
+        renderizar_serie_png(serie['fechas'], serie['totales'], str(ruta))
+
+
+GENERADORES = {
+    'excel': _generar_excel,
+    'csv': _generar_csv,
+    'grafico': _generar_grafico,
+}
+
+
+def huella(tipo, parametros):
+    # Sólo el pedido: dos pedidos iguales comparten el trabajo en curso
+    # aunque entre medio se registren ventas
+    contenido = json.dumps([tipo, parametros], sort_keys=True)
+    return hashlib.sha1(contenido.encode()).hexdigest()
+
+
+def _vigente(clave):
+    # El trabajo en curso con esa huella o, si no hay, uno terminado sin
+    # vencer y generado con las ventas actuales
+    return (
+        Trabajo.objects.filter(huella=clave)
+        .filter(
+            Q(estado__in=EN_CURSO)
+            | Q(estado='completado', expira__gt=timezone.now(), generacion=cache_ventas.generacion())
+        )
+        .order_by('-creado')
+        .first()
+    )
+
+
+def encolar(tipo, filtro, usuario=None):
+    # Devuelve (trabajo, creado). Un pedido idéntico en curso, o ya
+    # terminado y sin vencer, se reutiliza en vez de encolar otro
+    parametros = {} if tipo == 'grafico' else filtro.parametros()
+    clave = huella(tipo, parametros)
+    existente = _vigente(clave)
+    if existente is not None:
+        return existente, False
+    try:
+        with transaction.atomic():
+            trabajo = Trabajo.objects.create(tipo=tipo, parametros=parametros, huella=clave, usuario=usuario)
+        return trabajo, True
+    except IntegrityError:
+        # Otro pedido igual lo creó entre la búsqueda y el INSERT
+        # (restricción trabajo_en_curso_unico)
+        return _vigente(clave), False
+
+
+def reclamar(limite):
+    # Pasa hasta `limite` trabajos pendientes a en_proceso y devuelve sus
+    # ids. El UPDATE condicionado al estado hace que dos procesadores
+    # nunca tomen el mismo trabajo
+    reclamados = []
+    candidatos = Trabajo.objects.filter(estado='pendiente').order_by('creado').values_list('pk', flat=True)
+    for pk in candidatos[:limite * 2]:
+        if Trabajo.objects.filter(pk=pk, estado='pendiente').update(estado='en_proceso', iniciado=timezone.now()):
+            reclamados.append(pk)
+            if len(reclamados) == limite:
+                break
+    return reclamados
+
+
+def ruta_archivo(trabajo):
+    return Path(settings.TRABAJOS_DIR) / trabajo.archivo
+
+
+def _terminar(pk, estado, **campos):
+    ahora = timezone.now()
+    Trabajo.objects.filter(pk=pk).update(
+        estado=estado, terminado=ahora, expira=ahora + timedelta(seconds=settings.TRABAJOS_TTL), **campos
+    )
+
+
+def ejecutar(trabajo_id):
+    # Genera el archivo de un trabajo ya reclamado. Corre en los procesos
+    # del pool, así que maneja sus conexiones como si fuera una petición
+    close_old_connections()
+    try:
+        trabajo = Trabajo.objects.get(pk=trabajo_id)
+        directorio = Path(settings.TRABAJOS_DIR)
+        directorio.mkdir(parents=True, exist_ok=True)
+        ruta = directorio / f'{trabajo.pk}.{EXTENSIONES[trabajo.tipo]}'
+        temporal = ruta.with_name(ruta.name + '.tmp')
+        # Antes de leer las ventas: si cambian mientras se genera, el
+        # archivo ya nace viejo y no se reutiliza
+        generacion = cache_ventas.generacion()
+        try:
+            GENERADORES[trabajo.tipo](trabajo, temporal)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            logger.exception('Falló el trabajo %s', trabajo_id)
+            temporal.unlink(missing_ok=True)
+            fallar(trabajo_id, e)
+            return 'fallido'
+        _terminar(trabajo_id, 'completado', archivo=ruta.name, generacion=generacion)
+        return 'completado'
+    finally:
+        close_old_connections()
+
+
+def fallar(trabajo_id, error):
+    _terminar(trabajo_id, 'fallido', error=str(error) or error.__class__.__name__)
+
+
+def reencolar(ids):
+    # Trabajos reclamados que no llegaron a empezar
+    return Trabajo.objects.filter(pk__in=ids, estado='en_proceso').update(estado='pendiente', iniciado=None)
+
+
+def reencolar_atascados():
+    # Trabajos de un procesador que murió a mitad de camino
+    limite = timezone.now() - timedelta(seconds=settings.TRABAJOS_TIMEOUT)
+    return Trabajo.objects.filter(estado='en_proceso', iniciado__lt=limite).update(estado='pendiente', iniciado=None)
+
+
+def limpiar_vencidos():
+    vencidos = Trabajo.objects.filter(expira__lt=timezone.now())
+    for archivo in vencidos.exclude(archivo='').values_list('archivo', flat=True):
+        (Path(settings.TRABAJOS_DIR) / archivo).unlink(missing_ok=True)
+    borrados, _ = vencidos.delete()
+    return borrados
@@ -1,10 +1,11 @@
 from django.urls import path
-from . import views
+from . import views, vistas_analisis, vistas_exportacion
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from .views import health_check
+from . import api
 
 # Configuración de Swagger
 schema_view = get_schema_view(
@@ -29,27 +30,48 @@ urlpatterns = [
     path('', views.inicio, name='inicio'),
     path('agregar_producto/', views.agregar_producto, name='agregar_producto'),
     path('agregar_venta/', views.agregar_venta, name='agregar_venta'),
-    path('graficos/', views.graficos_ventas, name='graficos_ventas'),
-    path('estadisticas_ventas/', views.estadisticas_ventas, name='estadisticas_ventas'),
+    path('graficos/', vistas_analisis.graficos_ventas, name='graficos_ventas'),
+    path('estadisticas_ventas/', vistas_analisis.estadisticas_ventas, name='estadisticas_ventas'),
     path('ventas_filtradas/', views.ventas_filtradas, name='ventas_filtradas'),
-    path('graficos_interactivos/', views.graficos_interactivos, name='graficos_interactivos'),
-    path('estadisticas_avanzadas/', views.estadisticas_avanzadas, name='estadisticas_avanzadas'),
-    path('productos_mas_vendidos/', views.productos_mas_vendidos, name='productos_mas_vendidos'),
+    path('graficos_interactivos/', vistas_analisis.graficos_interactivos, name='graficos_interactivos'),
+    path('estadisticas_avanzadas/', vistas_analisis.estadisticas_avanzadas, name='estadisticas_avanzadas'),
+    path('productos_mas_vendidos/', vistas_analisis.productos_mas_vendidos, name='productos_mas_vendidos'),
     path('registro_usuario/', views.registro_usuario, name='registro_usuario'),
     path('login_usuario/', views.login_usuario, name='login_usuario'),
     path('logout_usuario/', views.logout_usuario, name='logout_usuario'),
     path('lista_productos/', views.lista_productos, name='lista_productos'),
     path('lista_ventas/', views.lista_ventas, name='lista_ventas'),
-    path('exportar/ventas/excel/', views.exportar_ventas_excel, name='exportar_ventas_excel'),
+    path('exportar/ventas/excel/', vistas_exportacion.exportar_ventas_excel, name='exportar_ventas_excel'),
 
     # Autenticación con JWT
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
+    # Datos agregados para los gráficos
+    path('api/ventas/serie/', api.SerieVentasAPI.as_view(), name='api_serie_ventas'),
+    path('api/ventas/', api.VentasFiltradasAPI.as_view(), name='api_ventas_filtradas'),
+    path('api/productos/top/', api.ProductosTopAPI.as_view(), name='api_productos_top'),
+    path('api/productos/buscar/', api.ProductosBuscarAPI.as_view(), name='api_productos_buscar'),
+
+    # Alta masiva de ventas (JSON lines o CSV)
+    path('api/ventas/ingesta/', api.IngestaVentasAPI.as_view(), name='api_ingesta_ventas'),
+
+    # Cambio de estado en lote (pendiente -> completada, etc.)
+    path('api/ventas/estado/', api.CambioEstadoVentasAPI.as_view(), name='api_cambiar_estado'),
+
+    # Exportaciones e informes en segundo plano
+    path('api/trabajos/', api.TrabajosAPI.as_view(), name='api_trabajos'),
+    path('api/trabajos/<uuid:pk>/', api.TrabajoAPI.as_view(), name='api_trabajo'),
+    path('api/trabajos/<uuid:pk>/descarga/', api.DescargaTrabajoAPI.as_view(), name='api_trabajo_descarga'),
+
     # Documentación con Swagger
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 
     path('health/', health_check, name='health_check'),
 
+    # Métricas de rendimiento por vista
+    path('metricas/', views.metricas_json, name='metricas'),
+    path('metricas/prometheus/', views.metricas_prometheus, name='metricas_prometheus'),
+
 ]
@@ -1,21 +1,28 @@
 from django.shortcuts import render, redirect
-from .forms import ProductoForm, VentaForm, FiltroVentasForm
-from .models import Producto, Venta
-import matplotlib.pyplot as plt
-import pandas as pd
-from io import BytesIO
-from django.http import HttpResponse
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth, TruncQuarter
-import plotly.express as px
+from .forms import ProductoForm, VentaForm
+from .filtros import FiltroVentas
+from .models import Producto, Venta, VentaArchivada
+from . import archivo, cache_ventas, catalogo, inventario, metricas
+from .asincrono import login_requerido
+from .paginacion import apaginar_por_cursor, paginar_por_cursor
+import hmac
+from asgiref.sync import sync_to_async
+from functools import wraps
+from django.conf import settings
+from django.db import transaction
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.core.cache import cache
-import openpyxl
+from django.template.loader import render_to_string
 from django.contrib import messages
 
+# Las vistas de análisis y la exportación están en vistas_analisis.py y
+# vistas_exportacion.py: cargan numpy, pandas, matplotlib u openpyxl sólo
+# cuando se usan, así que un worker que nunca las sirve no los importa
+
 # Vista para agregar productos
 
 @login_required
@@ -23,7 +30,10 @@ def agregar_producto(request):
     if request.method == 'POST':
         form = ProductoForm(request.POST)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                producto = form.save()
+                if form.cleaned_data['stock_inicial'] is not None:
+                    inventario.ajustar(producto.pk, form.cleaned_data['stock_inicial'])
             return redirect('lista_productos')
     else:
         form = ProductoForm()
@@ -36,161 +46,62 @@ def agregar_venta(request):
     if request.method == 'POST':
         form = VentaForm(request.POST)
         if form.is_valid():
-            venta = form.save(commit=False)
-            producto = venta.producto
-            venta.total = producto.precio * venta.cantidad
-            venta.save()
-            # Invalida el caché de la lista de ventas
-            cache.delete('ventas_list')
-            return redirect('lista_ventas')
+            # El total sale del precio vigente y el stock se descuenta en la
+            # misma transacción (ver inventario.py)
+            try:
+                inventario.registrar_venta(
+                    form.cleaned_data['producto'].pk, form.cleaned_data['cantidad'], form.cleaned_data['fecha'],
+                )
+            except inventario.StockInsuficiente:
+                form.add_error('cantidad', 'No hay stock suficiente de este producto.')
+            else:
+                return redirect('lista_ventas')
     else:
         form = VentaForm()
     
     return render(request, 'agregar_venta.html', {'form': form})
 
-# Vista para generar gráficos de ventas con Matplotlib
-
-@login_required
-def graficos_ventas(request):
-    import matplotlib
-    matplotlib.use('Agg')  # Cambiar el backend a uno sin GUI
-    import matplotlib.pyplot as plt
-    import pandas as pd
-    from io import BytesIO
-    from django.http import HttpResponse
-
-    try:
-        # Obtener datos de ventas
-        ventas = Venta.objects.all().values('fecha', 'total')
-        df = pd.DataFrame(ventas)
-
-        plt.figure(figsize=(10, 6))
-        plt.plot(df['fecha'], df['total'], marker='o', linestyle='-', color='b')
-        plt.title('Ventas Totales por Fecha')
-        plt.xlabel('Fecha')
-        plt.ylabel('Total')
-
-        # Guardar el gráfico en memoria
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        plt.close()
-        buffer.seek(0)
-
-        return HttpResponse(buffer, content_type='image/png')
-    except Exception as e:
-        return HttpResponse(f'Error al generar el gráfico: {e}', status=500)
-
-
-# Vista para estadísticas de ventas mensuales y trimestrales
-
-@login_required
-def estadisticas_ventas(request):
-    ventas = Venta.objects.all()
-    
-    # Usamos TruncMonth y TruncQuarter para agrupar
-    total_mensual = ventas.annotate(mes=TruncMonth('fecha')).values('mes').annotate(total=Sum('total'))
-    total_trimestral = ventas.annotate(trimestre=TruncQuarter('fecha')).values('trimestre').annotate(total=Sum('total'))
-
-    contexto = {
-        'total_mensual': total_mensual,
-        'total_trimestral': total_trimestral,
-    }
-    return render(request, 'estadisticas.html', contexto)
-
 # Vista para filtrar ventas
 
+VENTAS_FILTRADAS_POR_PAGINA = 50
+
 @login_required
 def ventas_filtradas(request):
-    form = FiltroVentasForm(request.GET or None)  # Recoge los datos del formulario
-    ventas = Venta.objects.all()  # Consulta base sin filtros
-
-    if form.is_valid():
-        # Recoge los valores del formulario
-        producto = form.cleaned_data.get('producto')
-        fecha_inicio = form.cleaned_data.get('fecha_inicio')
-        fecha_fin = form.cleaned_data.get('fecha_fin')
-        precio_minimo = form.cleaned_data.get('precio_minimo')
-        precio_maximo = form.cleaned_data.get('precio_maximo')
-        estado = form.cleaned_data.get('estado')
-
-        # Aplica filtros solo si los datos existen
-        if producto:
-            ventas = ventas.filter(producto=producto)  # Usa directamente el objeto producto
-        if fecha_inicio:
-            ventas = ventas.filter(fecha__gte=fecha_inicio)
-        if fecha_fin:
-            ventas = ventas.filter(fecha__lte=fecha_fin)
-        if precio_minimo is not None:
-            ventas = ventas.filter(total__gte=precio_minimo)
-        if precio_maximo is not None:
-            ventas = ventas.filter(total__lte=precio_maximo)
-        if estado:
-            ventas = ventas.filter(estado=estado)
-
-    # Calcula el total de ventas después de los filtros
-    total_ventas = ventas.aggregate(total=Sum('total'))['total'] or 0
-
+    filtro = FiltroVentas(request.GET)
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+    ultima = bool(request.GET.get('ultima'))
+    resumen_filtro = filtro.resumen()
+
+    def renderizar_tabla():
+        columnas = ('producto__nombre', 'cantidad', 'total', 'fecha', 'estado')
+        ventas = filtro.filtrar().select_related('producto').only(*columnas)
+        archivadas = filtro.filtrar_archivo()
+        if archivadas is not None:
+            archivadas = archivadas.select_related('producto').only(*columnas)
+        page_obj = paginar_por_cursor(
+            ventas, despues=despues, antes=antes, ultima=ultima, por_pagina=VENTAS_FILTRADAS_POR_PAGINA,
+            archivo=archivadas,
+        )
+        return render_to_string('ventas_filtradas_tabla.html', {
+            'page_obj': page_obj,
+            'filtros': filtro.querystring(),
+            'num_ventas': resumen_filtro['num_ventas'],
+        })
+
+    # La página se memoiza por filtro normalizado y cursor
+    tabla = cache_ventas.obtener_o_calcular(
+        f'filtro:{filtro.clave()}:pagina:{despues or ""}:{antes or ""}:{int(ultima)}', renderizar_tabla
+    )
     contexto = {
-        'form': form,
-        'ventas': ventas,
-        'total_ventas': total_ventas,
+        'form': filtro.form,
+        'tabla': tabla,
+        'num_ventas': resumen_filtro['num_ventas'],
+        'total_ventas': resumen_filtro['total'],
     }
     return render(request, 'ventas_filtradas.html', contexto)
 
 
-
-
-# Vista para generar gráficos interactivos con Plotly
-@login_required
-def graficos_interactivos(request):
-    ventas = Venta.objects.all().values('fecha', 'total')
-    df = pd.DataFrame(ventas)
-
-    fig = px.line(df, x='fecha', y='total', title='Ventas Totales por Fecha')
-
-    # Convertir el gráfico en HTML
-    grafico = fig.to_html(full_html=False)
-
-    contexto = {'grafico': grafico}
-    return render(request, 'graficos_interactivos.html', contexto)
-
-# Vista para estadísticas avanzadas
-@login_required
-def estadisticas_avanzadas(request):
-    ventas = Venta.objects.all().values('fecha', 'total')
-    df = pd.DataFrame(ventas)
-
-    # Agrupar por mes
-    df['fecha'] = pd.to_datetime(df['fecha'])
-    df['mes'] = df['fecha'].dt.to_period('M')
-    ventas_mensuales = df.groupby('mes')['total'].sum().reset_index()
-
-    # Agrupar por trimestre
-    df['trimestre'] = df['fecha'].dt.to_period('Q')
-    ventas_trimestrales = df.groupby('trimestre')['total'].sum().reset_index()
-
-    contexto = {
-        'ventas_mensuales': ventas_mensuales.to_dict('records'),
-        'ventas_trimestrales': ventas_trimestrales.to_dict('records'),
-    }
-    return render(request, 'estadisticas_avanzadas.html', contexto)
-
-# Vista para productos más vendidos
-@login_required
-def productos_mas_vendidos(request):
-    # Consultar las ventas agrupadas por producto y sumar la cantidad vendida
-    ventas = Venta.objects.values('producto__nombre').annotate(total_vendido=Sum('cantidad')).order_by('-total_vendido')
-    df = pd.DataFrame(ventas)
-
-    # Crear gráfico de barras
-    fig = px.bar(df, x='producto__nombre', y='total_vendido', title='Productos más vendidos')
-
-    # Convertir el gráfico en HTML
-    grafico = fig.to_html(full_html=False)
-
-    contexto = {'grafico': grafico}
-    return render(request, 'productos_mas_vendidos.html', contexto)
-
 # Vista para registro de usuario
 
 def registro_usuario(request):
@@ -227,58 +138,96 @@ def logout_usuario(request):
 def inicio(request):
     return render(request, "inicio.html")
 
-@login_required
-def lista_productos(request):
-    productos = Producto.objects.all()
-    return render(request, 'lista_productos.html', {'productos': productos})
+# Listados de sólo lectura en versión async: con ASGI esperan a la base sin
+# ocupar un hilo. render se llama vía sync_to_async porque los context
+# processors pueden consultar la sesión o los mensajes
 
-@login_required
-def lista_ventas(request):
-    # Intentar obtener las ventas desde el caché
-    ventas_list = cache.get('ventas_list')
-    if not ventas_list:
-        # Obtener todas las ventas con select_related para evitar consultas adicionales
-        ventas_list = Venta.objects.select_related('producto').only('producto', 'cantidad', 'total', 'fecha')
-        # Almacenar en caché por 15 minutos
-        cache.set('ventas_list', ventas_list, timeout=60*15)
-
-    # Configurar la paginación
-    paginator = Paginator(ventas_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    return render(request, 'lista_ventas.html', {'page_obj': page_obj})
+PRODUCTOS_POR_PAGINA = 50
 
-@login_required
-def exportar_ventas_excel(request):
+@login_requerido
+async def lista_productos(request):
     try:
-        ventas = Venta.objects.all()
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Ventas'
-
-        # Encabezados
-        headers = ['Producto', 'Cantidad', 'Total', 'Fecha']
-        ws.append(headers)
-
-        # Datos
-        for venta in ventas:
-            ws.append([venta.producto.nombre, venta.cantidad, venta.total, venta.fecha])
-
-        # Guardar en memoria
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-
-        response = HttpResponse(buffer, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="ventas.xlsx"'
-        return response
-    except Exception as e:
-        return HttpResponse(f'Error al exportar los datos: {e}', status=500)
-
+        numero = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        numero = 1
+
+    # La página se cachea con la versión del catálogo: las ventas no la
+    # invalidan. El stock sí cambia con cada venta, así que se lee aparte
+    # con una consulta por clave primaria
+    def leer_pagina():
+        productos = Producto.objects.order_by('nombre', 'id').values('id', 'nombre', 'precio')
+        page_obj = Paginator(productos, PRODUCTOS_POR_PAGINA).get_page(numero)
+        return {
+            'productos': list(page_obj),
+            'numero': page_obj.number,
+            'anterior': page_obj.previous_page_number() if page_obj.has_previous() else None,
+            'siguiente': page_obj.next_page_number() if page_obj.has_next() else None,
+            'num_paginas': page_obj.paginator.num_pages,
+            'total': page_obj.paginator.count,
+        }
+
+    pagina = await catalogo.aobtener_o_calcular(f'lista_productos:{numero}', sync_to_async(leer_pagina))
+    ids = [producto['id'] for producto in pagina['productos']]
+    stock = {pk: unidades async for pk, unidades in Producto.objects.filter(pk__in=ids).values_list('pk', 'stock')}
+    productos = [{**producto, 'stock': stock.get(producto['id'])} for producto in pagina['productos']]
+    return await sync_to_async(render)(request, 'lista_productos.html', {'pagina': pagina, 'productos': productos})
+
+@login_requerido
+async def lista_ventas(request):
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+    ultima = bool(request.GET.get('ultima'))
+
+    # La tabla renderizada se cachea por cursor dentro de la generación actual;
+    # cualquier cambio en ventas o productos la invalida (ver signals.py).
+    # Las ventas archivadas se listan a continuación de las recientes
+    async def renderizar_tabla():
+        columnas = ('producto__nombre', 'cantidad', 'total', 'fecha')
+        ventas = Venta.objects.select_related('producto').only(*columnas)
+        archivadas = None
+        if await sync_to_async(archivo.fecha_maxima)() is not None:
+            archivadas = VentaArchivada.objects.select_related('producto').only(*columnas)
+        page_obj = await apaginar_por_cursor(
+            ventas, despues=despues, antes=antes, ultima=ultima, por_pagina=10, archivo=archivadas
+        )
+
+        # El conteo total se calcula una vez por generación
+        async def contar():
+            return await Venta.objects.acount() + (await archivadas.acount() if archivadas is not None else 0)
+
+        total_ventas = await cache_ventas.aobtener_o_calcular('lista_ventas:total', contar, timeout=60*15)
+        return render_to_string('lista_ventas_tabla.html', {'page_obj': page_obj, 'total_ventas': total_ventas})
+
+    # Almacenar en caché por 15 minutos
+    tabla = await cache_ventas.aobtener_o_calcular(
+        f'lista_ventas:{despues or ""}:{antes or ""}:{int(ultima)}', renderizar_tabla, timeout=60*15
+    )
+
+    return await sync_to_async(render)(request, 'lista_ventas.html', {'tabla': tabla})
 
 from django.http import HttpResponse
 
 #Entran la página cada 10 minutos
 def health_check(request):
     return HttpResponse("OK", content_type="text/plain")
+
+# Métricas de la instrumentación (ver ventas/middleware.py)
+
+def _acceso_metricas(vista):
+    # Staff con sesión o, para el scraper de Prometheus, el token de METRICAS_TOKEN
+    @wraps(vista)
+    def envoltura(request):
+        token = settings.METRICAS_TOKEN
+        cabecera = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(cabecera.encode(), f'Bearer {token}'.encode()):
+            return vista(request)
+        return staff_member_required(vista)(request)
+    return envoltura
+
+@_acceso_metricas
+def metricas_json(request):
+    return JsonResponse(metricas.metricas().resumen())
+
+@_acceso_metricas
+def metricas_prometheus(request):
+    return HttpResponse(metricas.metricas().prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
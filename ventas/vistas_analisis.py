@@ -0,0 +1,92 @@
+import calendar
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, HttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import cache_ventas, graficos
+from .asincrono import en_hilo, login_requerido
+
+# Vistas de análisis. Las librerías pesadas se cargan con la primera
+# petición que las necesita: agregaciones (numpy) se importa en
+# _resumen_periodos y renderizado.py importa matplotlib al dibujar, de modo
+# que cargar las URLs no las arrastra
+
+
+async def _resumen_periodos():
+    from . import agregaciones
+
+    return await cache_ventas.aobtener_o_calcular('resumen_periodos', sync_to_async(agregaciones.resumen_periodos))
+
+
+# Vista para generar gráficos de ventas con Matplotlib
+
+@login_requerido
+async def graficos_ventas(request):
+    try:
+        # El PNG se identifica por el hash de la serie diaria: si no cambió,
+        # el navegador recibe un 304 y el servidor no vuelve a dibujar
+        serie = await sync_to_async(graficos.serie_diaria)()
+        version = graficos.version(serie)
+        etag = quote_etag(version)
+        modificacion = graficos.ultima_modificacion(version)
+        no_modificado = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=calendar.timegm(modificacion.utctimetuple()) if modificacion else None,
+        )
+        if no_modificado is not None:
+            no_modificado['ETag'] = etag
+            return no_modificado
+
+        # Dibujar es CPU puro: se hace fuera del event loop (y, con
+        # GRAFICOS_PROCESOS, en el pool de procesos de graficos.py)
+        ruta = await en_hilo(graficos.obtener_png)(serie, version)
+
+        response = FileResponse(open(ruta, 'rb'), content_type='image/png')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(ruta.stat().st_mtime)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    except Exception as e:
+        return HttpResponse(f'Error al generar el gráfico: {e}', status=500)
+
+
+# Vista para estadísticas de ventas mensuales y trimestrales
+
+@login_requerido
+async def estadisticas_ventas(request):
+    periodos = await _resumen_periodos()
+    contexto = {
+        'total_mensual': periodos['mensual'],
+        'total_trimestral': periodos['trimestral'],
+    }
+    return await sync_to_async(render)(request, 'estadisticas.html', contexto)
+
+
+# Vista para generar gráficos interactivos con Plotly
+# El gráfico se dibuja en el navegador con los datos de /api/ventas/serie/
+@login_required
+def graficos_interactivos(request):
+    return render(request, 'graficos_interactivos.html')
+
+# Vista para estadísticas avanzadas
+@login_requerido
+async def estadisticas_avanzadas(request):
+    periodos = await _resumen_periodos()
+    contexto = {
+        'ventas_semanales': periodos['semanal'],
+        'ventas_mensuales': periodos['mensual'],
+        'ventas_trimestrales': periodos['trimestral'],
+        'ventas_anuales': periodos['anual'],
+    }
+    return await sync_to_async(render)(request, 'estadisticas_avanzadas.html', contexto)
+
+# Vista para productos más vendidos
+# El gráfico se dibuja en el navegador con los datos de /api/productos/top/
+@login_required
+def productos_mas_vendidos(request):
+    return render(request, 'productos_mas_vendidos.html')
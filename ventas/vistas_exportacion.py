@@ -0,0 +1,93 @@
+import csv
+import os
+import tempfile
+from itertools import chain, islice
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .asincrono import en_hilo, es_asgi, login_requerido
+from .exportacion import EXPORTACION_CHUNK_SIZE, EXPORTACION_COLUMNAS, filas_exportacion, libro_excel
+from .filtros import FiltroVentas
+
+# Exportación de ventas en streaming (Excel o CSV)
+
+class _Eco:
+    # Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla
+    def write(self, valor):
+        return valor
+
+
+async def _bloques_exportacion(ventas, archivadas=None):
+    # Versión async de filas_exportacion: cada bloque se lee en el hilo que
+    # tiene la conexión (thread_sensitive), de a EXPORTACION_CHUNK_SIZE filas
+    filas = filas_exportacion(ventas, archivadas)
+    siguiente_bloque = sync_to_async(lambda: list(islice(filas, EXPORTACION_CHUNK_SIZE)))
+    while bloque := await siguiente_bloque():
+        yield bloque
+
+
+def _exportar_csv(ventas, archivadas=None, asincrono=False):
+    writer = csv.writer(_Eco())
+    cabecera = writer.writerow(EXPORTACION_COLUMNAS)
+    if asincrono:
+        async def lineas():
+            yield cabecera
+            async for bloque in _bloques_exportacion(ventas, archivadas):
+                yield ''.join(writer.writerow(fila) for fila in bloque)
+        contenido = lineas()
+    else:
+        contenido = chain([cabecera], (writer.writerow(fila) for fila in filas_exportacion(ventas, archivadas)))
+    response = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="ventas.csv"'
+    return response
+
+
+def _anexar(hoja, filas):
+    for fila in filas:
+        hoja.append(fila)
+
+
+async def _leer_archivo(archivo):
+    try:
+        while bloque := await en_hilo(archivo.read)(FileResponse.block_size):
+            yield bloque
+    finally:
+        archivo.close()
+
+
+async def _exportar_excel(ventas, archivadas=None, asincrono=False):
+    # El archivo resultante se envía por bloques
+    wb, ws = libro_excel()
+    # Armar el libro es CPU: va al pool de hilos para no frenar otras peticiones
+    async for bloque in _bloques_exportacion(ventas, archivadas):
+        await en_hilo(_anexar)(ws, bloque)
+
+    archivo = tempfile.TemporaryFile()
+    await en_hilo(wb.save)(archivo)
+    archivo.seek(0)
+
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    if not asincrono:
+        return FileResponse(archivo, as_attachment=True, filename='ventas.xlsx', content_type=content_type)
+
+    # Con ASGI, FileResponse se leería entero en memoria
+    response = StreamingHttpResponse(_leer_archivo(archivo), content_type=content_type)
+    response['Content-Length'] = os.fstat(archivo.fileno()).st_size
+    response['Content-Disposition'] = content_disposition_header(True, 'ventas.xlsx')
+    return response
+
+
+@login_requerido
+async def exportar_ventas_excel(request):
+    try:
+        # Respeta los mismos filtros que ventas_filtradas
+        filtro = FiltroVentas(request.GET)
+        ventas, archivadas = await sync_to_async(lambda: (filtro.filtrar(), filtro.filtrar_archivo()))()
+
+        if request.GET.get('formato') == 'csv':
+            return _exportar_csv(ventas, archivadas, asincrono=es_asgi(request))
+        return await _exportar_excel(ventas, archivadas, asincrono=es_asgi(request))
+    except Exception as e:
+        return HttpResponse(f'Error al exportar los datos: {e}', status=500)
@@ -1,6 +1,7 @@
 from datetime import timedelta
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,6 +35,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ventas.replicas.ReplicaMiddleware',
+    'ventas.middleware.InstrumentacionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,12 +64,41 @@ WSGI_APPLICATION = 'ventas_analisis.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Conexiones persistentes por worker (CONN_MAX_AGE) con chequeo de salud:
+# antes de reutilizar una conexión se verifica que siga viva, así un
+# reinicio de la base o un corte de pgbouncer no se convierte en un error
+# de la primera petición
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', 600))
+CONN_HEALTH_CHECKS = os.getenv('CONN_HEALTH_CHECKS', 'True') == 'True'
+
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///db.sqlite3',
-        conn_max_age=600
+        conn_max_age=CONN_MAX_AGE,
+        conn_health_checks=CONN_HEALTH_CHECKS,
+    )
+}
+
+# Réplica de lectura para los análisis y listados (ver ventas/replicas.py).
+# En local sirven dos SQLite:
+#   DATABASE_REPLICA_URL=sqlite:///db-replica.sqlite3 + manage.py copiar_replica
+REPLICA_ALIAS = 'replica'
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES[REPLICA_ALIAS] = dj_database_url.config(
+        env='DATABASE_REPLICA_URL',
+        conn_max_age=CONN_MAX_AGE,
+        conn_health_checks=CONN_HEALTH_CHECKS,
+        # En los tests la réplica es la misma base que la primaria
+        test_options={'MIRROR': 'default'},
     )
+DATABASE_ROUTERS = ['ventas.replicas.ReplicaRouter']
+REPLICA_VISTAS = {
+    'estadisticas_ventas', 'estadisticas_avanzadas', 'graficos_ventas', 'productos_mas_vendidos',
+    'lista_productos', 'lista_ventas', 'ventas_filtradas', 'exportar_ventas_excel',
+    'api_serie_ventas', 'api_ventas_filtradas', 'api_productos_top', 'api_productos_buscar',
 }
+# Cuánto lee de la primaria quien acaba de escribir; cubre el retraso de la réplica
+REPLICA_PEGAJOSA_SEGUNDOS = int(os.getenv('REPLICA_PEGAJOSA_SEGUNDOS', 10))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -108,7 +140,7 @@ SIMPLE_JWT = {
 # Configuración de Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication', #autenticacion con jwt
+        'ventas.autenticacion.JWTCacheadoAuthentication', #autenticacion con jwt, sin consultas por petición
     ),
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.UserRateThrottle',
@@ -138,7 +170,11 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 CSRF_COOKIE_SECURE = True  
 
 # Configuración de algoritmos de hash de contraseñas. (para que las contraseñas no aparezcan en texto plano)
+# El primero es el pbkdf2_sha256 de Django con iteraciones ajustables: cada
+# login cuesta proporcional a PASSWORD_PBKDF2_ITERACIONES (el valor por
+# defecto es el de Django 5.0)
 PASSWORD_HASHERS = [
+    'ventas.autenticacion.PBKDF2AjustableHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
     'django.contrib.auth.hashers.Argon2PasswordHasher',
@@ -150,16 +186,105 @@ SECURE_HSTS_PRELOAD = True  # Permite que el dominio sea incluido en la lista de
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True #para que las sesiones expiren cuando el usuario cierre el navegador.
 
+# Sesiones en caché con respaldo en la base: las lecturas no consultan
+# django_session. SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies
+# las guarda firmadas en la cookie. El usuario de la sesión también se
+# cachea (ventas/autenticacion.py)
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+AUTHENTICATION_BACKENDS = ['ventas.autenticacion.UsuarioCacheadoBackend']
+PASSWORD_PBKDF2_ITERACIONES = int(os.getenv('PASSWORD_PBKDF2_ITERACIONES', 720_000))
+JWT_LRU_TAMANO = 4096  # tokens verificados que recuerda cada proceso
+
 #prevención ataques del tipo MIME.
 SECURE_CONTENT_TYPE_NOSNIFF = True
 
 SECURE_REFERRER_POLICY = 'no-referrer-when-downgrade' # para proteger la información sobre los orígenes de las solicitudes.
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Caché compartido entre todos los workers: Redis si está configurado y,
+# si no, archivos en disco (sirve en local y en un solo nodo). Con varios
+# workers hace falta Redis: en disco, cache.incr lee y reescribe el archivo
+# sin bloqueo y dos incrementos simultáneos pueden quedar en uno (ver
+# CACHE_INCR_ATOMICO). `manage.py test` usa un caché en memoria propio para
+# no escribir en el de desarrollo
+REDIS_URL = os.getenv('REDIS_URL')
+PRUEBAS = sys.argv[1:2] == ['test']
+
+if PRUEBAS:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas'},
     }
-}
+elif REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_DIR', str(BASE_DIR / '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+# Redis (y el caché en memoria, dentro de su proceso) incrementa de forma
+# atómica; en disco las invalidaciones escriben una generación nueva en vez
+# de incrementar y las series se recalculan enteras tras cada escritura
+CACHE_INCR_ATOMICO = bool(REDIS_URL) or PRUEBAS
+
+# Capa de canales de los tableros en vivo (ventas/consumers.py). En memoria
+# sirve para las pruebas y un solo proceso; con varios workers o nodos cada
+# uno tendría la suya, así que con REDIS_URL se comparte por Redis
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# Tiempo de vida de los resultados cacheados de las vistas de análisis
+CACHE_ANALITICA_TIMEOUT = int(os.getenv('CACHE_ANALITICA_TIMEOUT', 60 * 15))
 
 LOGIN_URL = 'login_usuario'  
+
+# Gráficos PNG renderizados en disco, por versión de los datos
+GRAFICOS_DIR = os.getenv('GRAFICOS_DIR', str(BASE_DIR / '.cache' / 'graficos'))
+GRAFICOS_PROCESOS = int(os.getenv('GRAFICOS_PROCESOS', 2))  # 0 = dibujar en el propio proceso
+GRAFICOS_TIMEOUT = 60
+GRAFICOS_CONSERVAR = 20
+GRAFICOS_PUNTOS = 1000  # puntos del PNG, reducidos con LTTB (ver ventas/series.py)
+
+# Cola de exportaciones e informes (ventas/trabajos.py), procesada por
+# `manage.py procesar_trabajos`
+TRABAJOS_DIR = os.getenv('TRABAJOS_DIR', str(BASE_DIR / '.cache' / 'trabajos'))
+TRABAJOS_PROCESOS = int(os.getenv('TRABAJOS_PROCESOS', 2))  # 0 = ejecutar en el propio proceso
+TRABAJOS_TTL = int(os.getenv('TRABAJOS_TTL', 60 * 60 * 24))  # vida de los archivos generados
+TRABAJOS_TIMEOUT = 60 * 30  # en_proceso por más tiempo se vuelve a encolar
+TRABAJOS_INTERVALO = 2  # segundos entre consultas a la cola vacía
+
+# Instantáneas columnares de las ventas (ventas/instantaneas.py). Con
+# ANALITICA_FUENTE='instantaneas' las agregaciones y el gráfico leen de ahí
+# en vez de la base; `manage.py actualizar_instantaneas` las pone al día
+INSTANTANEAS_DIR = os.getenv('INSTANTANEAS_DIR', str(BASE_DIR / '.cache' / 'instantaneas'))
+ANALITICA_FUENTE = os.getenv('ANALITICA_FUENTE', 'resumen')
+
+# Retención de ventas (ventas/archivo.py): `manage.py archivar_ventas` mueve
+# a VentaArchivada las ventas anteriores a este horizonte, en meses
+ARCHIVO_HORIZONTE_MESES = int(os.getenv('ARCHIVO_HORIZONTE_MESES', 24))
+
+# Instrumentación por petición (ventas/middleware.py), visible en /metricas/
+# para staff y en /metricas/prometheus/ también con METRICAS_TOKEN
+INSTRUMENTACION_ACTIVA = os.getenv('INSTRUMENTACION_ACTIVA', '1') == '1'
+INSTRUMENTACION_BUFFER = 500  # últimas peticiones que se guardan completas
+INSTRUMENTACION_MUESTRAS = 1000  # duraciones por vista para los percentiles
+INSTRUMENTACION_UMBRAL_N_MAS_1 = 10  # repeticiones de un mismo SQL que se avisan
+INSTRUMENTACION_CABECERAS = DEBUG  # cabecera Server-Timing en las respuestas
+INSTRUMENTACION_PERFIL = os.getenv('INSTRUMENTACION_PERFIL', '0') == '1'  # cProfile con ?perfil=1
+INSTRUMENTACION_PERFIL_MUESTREO = float(os.getenv('INSTRUMENTACION_PERFIL_MUESTREO', 0))
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')